@@ -0,0 +1,187 @@
+"""
+Накладные расходы Python на частые запросы crud. Три варианта:
+  - select(), собираемый на каждый вызов (как было);
+  - lambda_stmt (для сравнения: в ORM-запросах подстановка параметров
+    копирует выражение, и полный вызов выходит дороже);
+  - выражение, собранное один раз, с bindparam (как сейчас в crud).
+
+Два замера на --calls вызовов каждого запроса:
+  - построение выражения и ключа кеша компиляции (без БД) - то, что
+    SQLAlchemy делает до поиска готового SQL в кеше;
+  - полный вызов через AsyncSession.execute.
+В конце - время на 10 000 вызовов, то есть одну секунду нагрузки при 10 000 вызовов/с
+(на SQLite в нем заметна доля потока aiosqlite, на PostgreSQL - сети).
+
+    python -m benchmarks.bench_crud_statements
+    python -m benchmarks.bench_crud_statements --calls 50000 --url postgresql+asyncpg://...
+
+Без --url используется временная SQLite-база. Скрипт создает таблицы сам,
+не запускайте его на рабочей базе.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, lambda_stmt, select
+
+from core.database import crud
+from core.database.database import init_engine, dispose_engine, async_session
+from core.database.model import Base, User, PurchasedSubscription
+
+FIRST_TELEGRAM_ID = 4_000_000
+TARGET_RATE = 10_000
+
+
+# Прежние версии запросов: выражение собирается заново на каждый вызов
+def legacy_user(telegram_id):
+    return select(User).where(User.telegram_id == telegram_id), None
+
+def legacy_balance(telegram_id):
+    return select(User.current_balance).where(User.telegram_id == telegram_id), None
+
+def legacy_subscription(sub_uuid):
+    return select(PurchasedSubscription).where(PurchasedSubscription.sub_uuid == sub_uuid), None
+
+def legacy_subscriptions(telegram_id):
+    return (
+        select(PurchasedSubscription)
+        .where(PurchasedSubscription.telegram_id == telegram_id)
+        .order_by(PurchasedSubscription.expired_at.desc())
+    ), None
+
+
+def lambda_user(telegram_id):
+    return lambda_stmt(lambda: select(User).where(User.telegram_id == telegram_id)), None
+
+def lambda_balance(telegram_id):
+    return lambda_stmt(lambda: select(User.current_balance).where(User.telegram_id == telegram_id)), None
+
+def lambda_subscription(sub_uuid):
+    return lambda_stmt(lambda: select(PurchasedSubscription).where(PurchasedSubscription.sub_uuid == sub_uuid)), None
+
+def lambda_subscriptions(telegram_id):
+    return lambda_stmt(
+        lambda: select(PurchasedSubscription)
+        .where(PurchasedSubscription.telegram_id == telegram_id)
+        .order_by(PurchasedSubscription.expired_at.desc())
+    ), None
+
+
+# Те же запросы, что сейчас в crud
+def prebuilt_user(telegram_id):
+    return crud._USER_BY_TELEGRAM_ID, {"telegram_id": telegram_id}
+
+def prebuilt_balance(telegram_id):
+    return crud._BALANCE_BY_TELEGRAM_ID, {"telegram_id": telegram_id}
+
+def prebuilt_subscription(sub_uuid):
+    return crud._SUBSCRIPTION_BY_UUID, {"sub_uuid": sub_uuid}
+
+def prebuilt_subscriptions(telegram_id):
+    return crud._SUBSCRIPTIONS_BY_TELEGRAM_ID, {"telegram_id": telegram_id}
+
+
+QUERIES = [
+    ("get_user_by_telegram_id", (legacy_user, lambda_user, prebuilt_user), "user"),
+    ("get_balance", (legacy_balance, lambda_balance, prebuilt_balance), "user"),
+    ("get_purchased_subscription_by_uuid", (legacy_subscription, lambda_subscription, prebuilt_subscription), "uuid"),
+    ("get_purchased_subscriptions", (legacy_subscriptions, lambda_subscriptions, prebuilt_subscriptions), "user"),
+]
+VARIANTS = ("было", "lambda", "стало")
+
+
+async def prepare(users: int) -> None:
+    engine = init_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    expire = datetime.now() + timedelta(days=30)
+    async with async_session() as session:
+        await session.execute(insert(User), [
+            {"telegram_id": FIRST_TELEGRAM_ID + i, "username": f"user{i}"} for i in range(users)
+        ])
+        await session.execute(insert(PurchasedSubscription), [
+            {
+                "telegram_id": FIRST_TELEGRAM_ID + i,
+                "sub_uuid": f"00000000-0000-0000-0000-{i:012d}",
+                "username": f"breeze_{i}",
+                "expired_at": expire
+            } for i in range(users)
+        ])
+        await session.commit()
+
+
+def build_cost(build, args_list) -> float:
+    """Секунд на вызов: выражение + ключ кеша компиляции"""
+    started = time.perf_counter()
+    for arg in args_list:
+        build(arg)[0]._generate_cache_key()
+    return (time.perf_counter() - started) / len(args_list)
+
+
+async def execute_cost(build, args_list) -> float:
+    """Секунд на вызов: полный запрос через сессию"""
+    async with async_session() as session:
+        await session.execute(*build(args_list[0]))  # прогрев кеша компиляции
+        started = time.perf_counter()
+        for arg in args_list:
+            (await session.execute(*build(arg))).all()
+        return (time.perf_counter() - started) / len(args_list)
+
+
+async def run(args) -> bool:
+    await prepare(args.users)
+    rng = random.Random(args.seed)
+    ids = [FIRST_TELEGRAM_ID + rng.randrange(args.users) for _ in range(args.calls)]
+    uuids = [f"00000000-0000-0000-0000-{tid - FIRST_TELEGRAM_ID:012d}" for tid in ids]
+
+    print(f"{args.calls} вызовов каждого запроса, мкс на вызов ({' / '.join(VARIANTS)})\n")
+    print(f"{'запрос':<36} {'построение':>24} {'через сессию':>24}")
+    ok = True
+    totals = [0.0] * len(VARIANTS)
+    for name, builders, kind in QUERIES:
+        args_list = ids if kind == "user" else uuids
+        build = [build_cost(builder, args_list) for builder in builders]
+        execute = [await execute_cost(builder, args_list) for builder in builders]
+        totals = [total + cost for total, cost in zip(totals, execute)]
+        ok = ok and build[2] < build[0]
+        print(
+            f"{name:<36} {' / '.join(f'{cost * 1e6:.1f}' for cost in build):>24} "
+            f"{' / '.join(f'{cost * 1e6:.1f}' for cost in execute):>24}"
+        )
+
+    # Результаты совпадают с прежними запросами
+    async with async_session() as session:
+        for tid in ids[:100]:
+            user = await crud.get_user_by_telegram_id(session, tid)
+            subs = await crud.get_purchased_subscriptions(session, tid)
+            balance = await crud.get_balance(session, tid)
+            ok = ok and user is not None and user.telegram_id == tid and len(subs) == 1 and balance == 0
+    await dispose_engine()
+
+    print(
+        f"\nЧетыре запроса подряд, {TARGET_RATE} вызовов, с ({' / '.join(VARIANTS)}): "
+        + " / ".join(f"{total * TARGET_RATE:.2f}" for total in totals)
+    )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="DATABASE_URL тестовой базы (по умолчанию временная SQLite)")
+    parser.add_argument("--calls", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_crud.db')}"
+    init_engine(url)
+    raise SystemExit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Микро-бенчмарк кеша клавиатур (core/render_cache.py).
+
+Сравнивает сборку разметки через InlineKeyboardBuilder на каждый вызов
+(исходная функция, __wrapped__) с готовой/закешированной разметкой:
+время вызова и объем памяти, выделяемой за один вызов (tracemalloc).
+
+    python -m benchmarks.bench_keyboards
+"""
+import timeit
+import tracemalloc
+import uuid
+
+from modules.common import keyboards as common_kb
+from modules.user.profile import keyboards as profile_kb
+from modules.user.subscription import keyboards as subscription_kb
+from modules.user.control_subscription import keyboards as control_kb
+
+SUB_UUID = str(uuid.uuid4())
+
+CASES = [
+    ("common.get_main_menu", common_kb.get_main_menu, ("ADMIN",)),
+    ("profile.get_profile_kb", profile_kb.get_profile_kb, ()),
+    ("subscription.get_no_subscriptions_kb", subscription_kb.get_no_subscriptions_kb, ()),
+    (
+        "subscription.get_subscription_detail_kb",
+        subscription_kb.get_subscription_detail_kb,
+        (SUB_UUID, "https://example.com/sub/abc")
+    ),
+    ("control.get_manage_subscription_kb", control_kb.get_manage_subscription_kb, (SUB_UUID,)),
+    ("control.get_device_details_kb", control_kb.get_device_details_kb, (SUB_UUID, "a1b2c3d4e5f6")),
+    ("control.get_back_to_devices_kb", control_kb.get_back_to_devices_kb, (SUB_UUID,)),
+]
+
+CALLS = 10_000
+
+
+def allocated_per_call(func, args, repeat: int = 200) -> float:
+    """Средний объем памяти (байт), выделяемой за вызов, включая временные объекты"""
+    func(*args)  # прогрев (и заполнение кеша)
+    tracemalloc.start()
+    total = 0
+    for _ in range(repeat):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        total += peak - before
+    tracemalloc.stop()
+    return total / repeat
+
+
+def time_per_call(func, args) -> float:
+    """Время вызова в микросекундах"""
+    return timeit.timeit(lambda: func(*args), number=CALLS) / CALLS * 1e6
+
+
+def main():
+    header = f"{'keyboard':42} {'build us':>9} {'cached us':>10} {'build B':>9} {'cached B':>9}"
+    print(header)
+    print("-" * len(header))
+
+    total_build_bytes = total_cached_bytes = 0.0
+    for name, cached, args in CASES:
+        build = cached.__wrapped__
+        build_us, cached_us = time_per_call(build, args), time_per_call(cached, args)
+        build_bytes, cached_bytes = allocated_per_call(build, args), allocated_per_call(cached, args)
+        total_build_bytes += build_bytes
+        total_cached_bytes += cached_bytes
+        print(f"{name:42} {build_us:>9.1f} {cached_us:>10.2f} {build_bytes:>9.0f} {cached_bytes:>9.0f}")
+
+    # Одно нажатие кнопки = одна отрисованная клавиатура
+    saved = (total_build_bytes - total_cached_bytes) / len(CASES)
+    print()
+    print(f"В среднем экономится {saved:.0f} байт выделений на апдейт")
+
+
+if __name__ == "__main__":
+    main()
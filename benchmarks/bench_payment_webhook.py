@@ -0,0 +1,139 @@
+"""
+Нагрузочный прогон вебхука платежей (POST /api/payments/webhook).
+
+Поднимает роутер bot_api в памяти (httpx.ASGITransport, без сети), отправляет
+callback с заданной частотой, часть - повторы уже отправленных платежей,
+и печатает задержки ответа (p50/p95/p99), размер пачек LedgerBatcher
+и проверку итоговых балансов.
+
+    python -m benchmarks.bench_payment_webhook
+    python -m benchmarks.bench_payment_webhook --rate 500 --seconds 5 --url postgresql+asyncpg://...
+
+Без --url используется временная SQLite-база. Скрипт создает таблицы сам,
+не запускайте его на рабочей базе.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+
+SECRET = "bench-secret"
+os.environ.setdefault("PAYMENT_WEBHOOK_SECRET", SECRET)
+os.environ.setdefault("API_KEY", "bench")
+
+import httpx
+from fastapi import FastAPI
+
+from core.api.bot_api import router
+from core.database import crud
+from core.database.database import init_engine, dispose_engine, async_session
+from core.database.model import Base, User
+from core.payments import ledger_batcher
+
+
+def sign(body: bytes) -> str:
+    return hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+async def prepare(users: int) -> None:
+    engine = init_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as session:
+        session.add_all(User(telegram_id=2_000_000 + i) for i in range(users))
+        await session.commit()
+
+
+async def run(args) -> bool:
+    await prepare(args.users)
+    ledger_batcher.start()
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    transport = httpx.ASGITransport(app=app)
+
+    latencies = []
+    statuses = {}
+    expected = {}
+    sent_payments = []
+
+    async def send(client, payload):
+        body = json.dumps(payload).encode()
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/payments/webhook",
+            content=body,
+            headers={"X-Signature": sign(body), "Content-Type": "application/json"}
+        )
+        latencies.append(time.perf_counter() - started)
+        key = response.json().get("status", response.status_code)
+        statuses[key] = statuses.get(key, 0) + 1
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tasks = []
+        total = int(args.rate * args.seconds)
+        interval = 1 / args.rate
+        started = time.perf_counter()
+        for i in range(total):
+            if sent_payments and random.random() < args.duplicates:
+                payload = random.choice(sent_payments)
+            else:
+                telegram_id = 2_000_000 + random.randrange(args.users)
+                payload = {
+                    "payment_id": f"pay-{i}",
+                    "telegram_id": telegram_id,
+                    "amount": "10.00",
+                    "status": "succeeded"
+                }
+                sent_payments.append(payload)
+                expected[telegram_id] = expected.get(telegram_id, Decimal(0)) + Decimal("10.00")
+            tasks.append(asyncio.create_task(send(client, payload)))
+            # Равномерная подача с заданной частотой
+            delay = started + (i + 1) * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await asyncio.gather(*tasks)
+
+    await ledger_batcher.stop()
+
+    async with async_session() as session:
+        mismatched = 0
+        for telegram_id, amount in expected.items():
+            if await crud.get_balance(session, telegram_id) != amount:
+                mismatched += 1
+    await dispose_engine()
+
+    latencies.sort()
+    ms = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000
+    print(f"Запросов: {len(latencies)} ({args.rate}/с), ответы: {statuses}")
+    print(f"Задержка, мс: p50 {ms(0.5):.1f}  p95 {ms(0.95):.1f}  p99 {ms(0.99):.1f}  "
+          f"среднее {statistics.mean(latencies) * 1000:.1f}")
+    print(f"LedgerBatcher: {ledger_batcher.stats()}")
+    print(f"Балансы: {len(expected) - mismatched}/{len(expected)} совпадают с ожидаемыми")
+    return mismatched == 0 and statuses.get("credited", 0) == len(sent_payments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="DATABASE_URL тестовой базы (по умолчанию временная SQLite)")
+    parser.add_argument("--rate", type=int, default=300, help="callback в секунду")
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="доля повторных callback")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_payments.db')}"
+    init_engine(url)
+    raise SystemExit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Сравнение профилей запуска (core/runtime.py): development и production.
+
+Для каждого профиля в отдельном процессе с циклом событий этого профиля:
+- HTTP: uvicorn с роутером bot_api (http/backlog/keep-alive профиля), нагрузка -
+  GET /api/users/{id} по keep-alive соединениям, результат - запросов/с;
+- бот: Dispatcher с middleware и роутерами приложения, апдейты callback_query
+  ("Мои подписки" / "Главное меню") через dp.feed_update, Bot API подменен
+  сессией без сети, результат - апдейтов/с.
+
+    python -m benchmarks.bench_run_profiles
+    python -m benchmarks.bench_run_profiles --seconds 10 --connections 100 --url postgresql+asyncpg://...
+
+Без --url используется временная SQLite-база. Скрипт создает таблицы сам,
+не запускайте его на рабочей базе. Нагрузку дает один процесс, поэтому при
+быстром сервере упор может быть в генератор нагрузки, а не в профиль.
+Без установленных uvloop/httptools production работает на asyncio/h11
+(в таблице видно, что реально использовалось).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("API_KEY", "bench")
+
+from core import runtime
+from core.database.database import init_engine, dispose_engine, async_session
+from core.database.model import Base, User
+
+FIRST_ID = 2_000_000
+CALLBACKS = ("subscriptions", "menu:main")
+
+
+async def prepare(users: int) -> None:
+    engine = init_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as session:
+        session.add_all(User(telegram_id=FIRST_ID + i, username=f"bench{i}") for i in range(users))
+        await session.commit()
+    await dispose_engine()
+
+
+# ==================== ДОЧЕРНИЕ ПРОЦЕССЫ ====================
+
+def serve(profile: runtime.RunProfile, port: int) -> None:
+    import uvicorn
+    from fastapi import FastAPI
+    from core.api.bot_api import router
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, **runtime.uvicorn_options(profile))
+    runtime.run(uvicorn.Server(config).serve(), profile)
+
+
+async def dispatch(args) -> dict:
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.session.base import BaseSession
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from aiogram.types import Update
+    from core.middleware import RoleMiddleware, InFlightMiddleware
+    from modules.common.router import main_menu_router
+
+    class OfflineSession(BaseSession):
+        """Bot API без сети: любой метод сразу возвращает True"""
+        async def make_request(self, bot, method, timeout=None):
+            return True
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+        async def close(self):
+            pass
+
+    bot = Bot(token="123456:bench-token", session=OfflineSession())
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.update.outer_middleware(InFlightMiddleware())
+    dp.update.outer_middleware(RoleMiddleware(session_pool=async_session))
+    dp.include_router(main_menu_router)
+
+    def update(n: int) -> Update:
+        telegram_id = FIRST_ID + n % args.users
+        sender = {"id": telegram_id, "is_bot": False, "first_name": "bench", "username": f"bench{n % args.users}"}
+        return Update.model_validate({
+            "update_id": n,
+            "callback_query": {
+                "id": str(n),
+                "from": sender,
+                "chat_instance": "bench",
+                "data": CALLBACKS[n % len(CALLBACKS)],
+                "message": {
+                    "message_id": n,
+                    "date": int(datetime.now().timestamp()),
+                    "chat": {"id": telegram_id, "type": "private"},
+                    "text": "bench"
+                }
+            }
+        }, context={"bot": bot})
+
+    init_engine()
+    semaphore = asyncio.Semaphore(args.connections)
+    handled = 0
+
+    async def feed(n: int) -> None:
+        nonlocal handled
+        async with semaphore:
+            await dp.feed_update(bot, update(n))
+            handled += 1
+
+    # Прогрев: импорты хендлеров, кеш запросов, соединения
+    await asyncio.gather(*(feed(n) for n in range(args.connections)))
+    handled = 0
+    started = time.perf_counter()
+    n = args.connections
+    while time.perf_counter() - started < args.seconds:
+        await asyncio.gather(*(feed(n + i) for i in range(args.connections * 10)))
+        n += args.connections * 10
+    elapsed = time.perf_counter() - started
+
+    await dispose_engine()
+    return {"updates": handled, "updates_per_s": handled / elapsed}
+
+
+# ==================== НАГРУЗКА ====================
+
+async def wait_port(port: int, timeout: float = 20) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            await writer.wait_closed()
+            return True
+        except OSError:
+            await asyncio.sleep(0.1)
+    return False
+
+
+async def http_load(port: int, args) -> dict:
+    """Каждое соединение отправляет запросы последовательно (keep-alive)"""
+    statuses = {}
+    deadline = time.perf_counter() + args.seconds
+
+    async def client(number: int) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        i = number
+        try:
+            while time.perf_counter() < deadline:
+                telegram_id = FIRST_ID + i % args.users
+                i += args.connections
+                writer.write(
+                    f"GET /api/users/{telegram_id} HTTP/1.1\r\n"
+                    f"Host: bench\r\nX-API-Key: bench\r\n\r\n".encode()
+                )
+                head = await reader.readuntil(b"\r\n\r\n")
+                status = int(head.split(b" ", 2)[1])
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(args.connections)))
+    elapsed = time.perf_counter() - started
+    total = sum(statuses.values())
+    return {"requests": total, "requests_per_s": total / elapsed, "statuses": statuses}
+
+
+def child_args(args, *extra: str) -> list:
+    return [
+        sys.executable, "-m", "benchmarks.bench_run_profiles", "--url", args.url,
+        "--seconds", str(args.seconds), "--connections", str(args.connections),
+        "--users", str(args.users), *extra
+    ]
+
+
+def bench_profile(name: str, args, log_path: str) -> dict:
+    profile = runtime.get_run_profile(name)
+    result = {
+        "profile": name,
+        "loop": runtime.loop_name(profile),
+        "http": runtime.http_implementation(profile),
+    }
+
+    with open(log_path, "a") as log:
+        server = subprocess.Popen(child_args(args, "--serve", name, "--port", str(args.port)), stdout=log, stderr=log)
+        try:
+            async def load():
+                if not await wait_port(args.port):
+                    raise RuntimeError(f"server did not start, see {log_path}")
+                return await http_load(args.port, args)
+            result.update(runtime.run(load(), runtime.get_run_profile("production")))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+        output = subprocess.run(
+            child_args(args, "--dispatch", name), stdout=subprocess.PIPE, stderr=log, text=True, check=True
+        ).stdout
+    result.update(json.loads(output.strip().splitlines()[-1]))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="DATABASE_URL тестовой базы (по умолчанию временная SQLite)")
+    parser.add_argument("--seconds", type=float, default=5, help="длительность каждого замера")
+    parser.add_argument("--connections", type=int, default=50, help="соединений / одновременных апдейтов")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=18899)
+    parser.add_argument("--profiles", nargs="+", default=["development", "production"], choices=sorted(runtime.PROFILES))
+    parser.add_argument("--serve", choices=sorted(runtime.PROFILES), help=argparse.SUPPRESS)
+    parser.add_argument("--dispatch", choices=sorted(runtime.PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        init_engine(args.url)
+        serve(runtime.get_run_profile(args.serve), args.port)
+        return
+    if args.dispatch:
+        profile = runtime.get_run_profile(args.dispatch)
+        init_engine(args.url)
+        print(json.dumps(runtime.run(dispatch(args), profile)))
+        return
+
+    workdir = tempfile.mkdtemp()
+    args.url = args.url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench_profiles.db')}"
+    init_engine(args.url)
+    asyncio.run(prepare(args.users))
+
+    log_path = os.path.join(workdir, "children.log")
+    results = [bench_profile(name, args, log_path) for name in args.profiles]
+
+    print(f"{'profile':12} {'loop':8} {'http':10} {'API req/s':>10} {'bot upd/s':>10}  ответы API")
+    for r in results:
+        print(f"{r['profile']:12} {r['loop']:8} {r['http']:10} {r['requests_per_s']:>10.0f} "
+              f"{r['updates_per_s']:>10.0f}  {r['statuses']}")
+    print(f"Логи дочерних процессов: {log_path}")
+
+    ok = all(r["statuses"] and set(r["statuses"]) == {200} and r["updates"] for r in results)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Поиск пользователей по username: индекс (pg_trgm / SQLite FTS5 trigram)
+против полного скана LIKE '%...%'.
+
+Заполняет базу пользователями и подписками, выполняет search_users и тот же
+запрос сканом по случайным подстрокам существующих имен, печатает задержки
+(p50/p95) обоих вариантов и проверяет, что индекс находит то же, что скан.
+
+    python -m benchmarks.bench_user_search
+    python -m benchmarks.bench_user_search --users 1000000 --queries 200 --url postgresql+asyncpg://...
+
+Без --url используется временная SQLite-база. Скрипт создает таблицы сам,
+не запускайте его на рабочей базе.
+"""
+import argparse
+import asyncio
+import os
+import random
+import string
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+
+from core.config import SEARCH_RESULT_LIMIT
+from core.database.database import init_engine, dispose_engine, async_session
+from core.database.model import Base, User, PurchasedSubscription
+from core.database.search import ensure_search_indexes, search_users
+
+FIRST_TELEGRAM_ID = 3_000_000
+CHUNK = 10_000
+SYLLABLES = ["ka", "ri", "to", "ne", "mo", "la", "vi", "sa", "du", "pe", "xo", "zy", "bre", "eze", "net"]
+
+
+def random_username(rng: random.Random) -> str:
+    name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+    return name + "".join(rng.choice(string.digits) for _ in range(rng.randint(0, 4)))
+
+
+async def prepare(users: int, subscriptions: float, rng: random.Random) -> list:
+    engine = init_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.execute(text("DROP TABLE IF EXISTS search_index"))
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_search_indexes(conn)
+
+    names = []
+    expire = datetime.now() + timedelta(days=30)
+    sub_id = 0
+    for start in range(0, users, CHUNK):
+        user_rows, sub_rows = [], []
+        for telegram_id in range(FIRST_TELEGRAM_ID + start, FIRST_TELEGRAM_ID + min(start + CHUNK, users)):
+            username = random_username(rng) if rng.random() > 0.1 else None
+            user_rows.append({"telegram_id": telegram_id, "username": username})
+            if username:
+                names.append(username)
+            if rng.random() < subscriptions:
+                sub_id += 1
+                sub_rows.append({
+                    "telegram_id": telegram_id,
+                    "sub_uuid": f"00000000-0000-0000-0000-{sub_id:012d}",
+                    "username": f"breeze_{telegram_id}_{sub_id}",
+                    "expired_at": expire
+                })
+        async with async_session() as session:
+            await session.execute(insert(User), user_rows)
+            if sub_rows:
+                await session.execute(insert(PurchasedSubscription), sub_rows)
+            await session.commit()
+    return names
+
+
+async def scan(session, query: str) -> set:
+    """Тот же поиск без индекса: LIKE по обеим таблицам"""
+    pattern = f"%{query.lower()}%"
+    users = await session.execute(
+        text("SELECT telegram_id FROM users WHERE lower(username) LIKE :pattern"), {"pattern": pattern}
+    )
+    subs = await session.execute(
+        text("SELECT sub_uuid FROM purchased_subscriptions WHERE lower(username) LIKE :pattern"), {"pattern": pattern}
+    )
+    return {("user", tid) for tid, in users.all()} | {("subscription", uuid) for uuid, in subs.all()}
+
+
+async def run(args) -> bool:
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    names = await prepare(args.users, args.subscriptions, rng)
+    print(f"Заполнение: {args.users} пользователей за {time.perf_counter() - started:.1f} с")
+
+    queries = []
+    for _ in range(args.queries):
+        if rng.random() < 0.2:
+            queries.append(str(FIRST_TELEGRAM_ID + rng.randrange(args.users))[-5:])
+        else:
+            name = rng.choice(names)
+            length = rng.randint(3, min(len(name), 8))
+            offset = rng.randrange(len(name) - length + 1)
+            queries.append(name[offset:offset + length])
+
+    indexed, scanned = [], []
+    mismatched = 0
+    async with async_session() as session:
+        for query in queries:
+            begin = time.perf_counter()
+            hits = await search_users(session, query, SEARCH_RESULT_LIMIT)
+            indexed.append(time.perf_counter() - begin)
+
+            begin = time.perf_counter()
+            expected = await scan(session, query)
+            scanned.append(time.perf_counter() - begin)
+
+            found = {
+                ("subscription", hit.sub_uuid) if hit.kind == "subscription" else ("user", hit.telegram_id)
+                for hit in hits
+            }
+            # Индекс возвращает не больше limit лучших: все найденное должно быть
+            # в результате скана, а при малом числе совпадений - весь скан
+            complete = len(expected) > len(found) or found == expected
+            if not found <= expected or (len(found) < SEARCH_RESULT_LIMIT and not complete):
+                mismatched += 1
+    await dispose_engine()
+
+    def ms(values, q):
+        values = sorted(values)
+        return values[min(int(len(values) * q), len(values) - 1)] * 1000
+
+    print(f"Запросов: {len(queries)}")
+    print(f"Индекс, мс: p50 {ms(indexed, 0.5):.2f}  p95 {ms(indexed, 0.95):.2f}")
+    print(f"Скан,   мс: p50 {ms(scanned, 0.5):.2f}  p95 {ms(scanned, 0.95):.2f}")
+    print(f"Совпадение с полным сканом: {len(queries) - mismatched}/{len(queries)}")
+    return mismatched == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="DATABASE_URL тестовой базы (по умолчанию временная SQLite)")
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--subscriptions", type=float, default=0.5, help="доля пользователей с подпиской")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_search.db')}"
+    init_engine(url)
+    raise SystemExit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
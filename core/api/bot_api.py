@@ -1,26 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from decimal import Decimal
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, status
 from fastapi.security import APIKeyHeader
-from core.database.database import async_session
+from pydantic import BaseModel, Field, ValidationError
+from core.database.database import async_session, read_session
 from core.database.crud import (
     get_user_by_telegram_id,
     get_purchased_subscriptions,
-    get_purchased_subscription_by_uuid
+    get_purchased_subscription_by_uuid,
+    get_subscription_history,
+    get_balance,
+    count_outbox_by_status
 )
 from core.api.remnawave_client import remnawave_service
-import os
+from core.payments import ledger_batcher, verify_signature, CreditResult
+from core.database.search import search_users
+from core.config import API_KEY, SEARCH_RESULT_LIMIT
 import logging
-from dotenv import load_dotenv
-# Настройка логгера
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
 
-# Загрузка переменных окружения
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 # Аутентификация
-API_KEY = os.getenv("API_KEY")
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 async def validate_api_key(api_key: str = Depends(api_key_header)):
@@ -38,15 +40,71 @@ async def get_db():
     async with async_session() as session:
         yield session
 
+# GET-эндпоинты только читают: запросы могут уйти на реплику
+async def get_read_db():
+    async with read_session() as session:
+        yield session
+
 @router.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@router.get("/metrics")
+async def get_metrics(_: bool = Depends(validate_api_key)):
+    """Счетчики кешей рендеринга, сэкономленных запросов и исходящей очереди Bot API"""
+    from core.messaging import edit_cache
+    from core.render_cache import cache_stats
+    from core.outbound import outbound_sender
+    from core.promocodes import promocode_cache
+    from core.jobs import job_runner
+    from core.provisioning import provisioner
+    from core.outbox import outbox_dispatcher
+    from core import reconcile
+    from core.database.replicas import replica_monitor
+
+    async with async_session() as session:
+        outbox_backlog = await count_outbox_by_status(session)
+
+    return {
+        "edits": edit_cache.stats(),
+        "keyboards": cache_stats(),
+        "outbound": outbound_sender.stats(),
+        "promocodes": promocode_cache.stats(),
+        "jobs": job_runner.stats(),
+        "payments": ledger_batcher.stats(),
+        "provisioning": provisioner.stats(),
+        "outbox": {**outbox_dispatcher.stats(), "entries": outbox_backlog},
+        "reconcile": reconcile.last_report.as_dict() if reconcile.last_report else None,
+        "remnawave": remnawave_service.stats(),
+        "replicas": replica_monitor.stats()
+    }
+
+@router.get("/search")
+async def search(
+    q: str,
+    limit: int = SEARCH_RESULT_LIMIT,
+    _: bool = Depends(validate_api_key),
+    db=Depends(get_read_db)
+):
+    """Поиск пользователей и подписок по части username (или telegram_id)"""
+    hits = await search_users(db, q, limit)
+    return {
+        "query": q,
+        "results": [
+            {
+                "kind": hit.kind,
+                "telegram_id": hit.telegram_id,
+                "username": hit.username,
+                "sub_uuid": hit.sub_uuid
+            } for hit in hits
+        ]
+    }
+
 @router.get("/users/{telegram_id}")
 async def get_user(
     telegram_id: int,
     _: bool = Depends(validate_api_key),
-    db=Depends(get_db)
+    db=Depends(get_read_db)
 ):
     try:
         user = await get_user_by_telegram_id(db, telegram_id)
@@ -57,7 +115,7 @@ async def get_user(
             "telegram_id": user.telegram_id,
             "username": user.username,
             "role": user.role,
-            "balance": float(user.balance) if user.balance else 0.0
+            "balance": float(await get_balance(db, telegram_id))
         }
     except Exception as e:
         logger.error(f"Error fetching user {telegram_id}: {str(e)}")
@@ -67,7 +125,7 @@ async def get_user(
 async def get_user_subscriptions(
     telegram_id: int,
     _: bool = Depends(validate_api_key),
-    db=Depends(get_db)
+    db=Depends(get_read_db)
 ):
     try:
         # Локальные подписки из БД
@@ -92,11 +150,37 @@ async def get_user_subscriptions(
         logger.error(f"Error fetching subscriptions for {telegram_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/users/{telegram_id}/subscriptions/history")
+async def get_user_subscription_history(
+    telegram_id: int,
+    limit: int = 20,
+    _: bool = Depends(validate_api_key),
+    db=Depends(get_read_db)
+):
+    """Архивные (давно истекшие) подписки пользователя"""
+    try:
+        history = await get_subscription_history(db, telegram_id, limit=max(1, min(limit, 100)))
+        return {
+            "telegram_id": telegram_id,
+            "archived_subscriptions": [
+                {
+                    "sub_uuid": sub.sub_uuid,
+                    "username": sub.username,
+                    "expired_at": sub.expired_at.isoformat(),
+                    "archived_at": sub.archived_at.isoformat(),
+                    "purchase_price": float(sub.purchase_price) if sub.purchase_price else None
+                } for sub in history
+            ]
+        }
+    except Exception as e:
+        logger.error(f"Error fetching subscription history for {telegram_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.get("/subscriptions/{sub_uuid}/devices")
 async def get_subscription_devices(
     sub_uuid: str,
     _: bool = Depends(validate_api_key),
-    db=Depends(get_db)
+    db=Depends(get_read_db)
 ):
     try:
         sub = await get_purchased_subscription_by_uuid(db, sub_uuid)
@@ -112,3 +196,57 @@ async def get_subscription_devices(
     except Exception as e:
         logger.error(f"Error fetching devices for {sub_uuid}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
+
+# ==================== PAYMENTS ====================
+
+# Статусы платежа, при которых баланс пополняется
+PAID_STATUSES = {"succeeded", "paid", "success"}
+
+class PaymentWebhook(BaseModel):
+    payment_id: str = Field(..., min_length=1, max_length=100)
+    telegram_id: int
+    amount: Decimal = Field(..., gt=0, max_digits=10, decimal_places=2)
+    status: str
+    provider: str = Field("default", max_length=20)
+
+@router.post("/payments/webhook")
+async def payment_webhook(
+    request: Request,
+    x_signature: Optional[str] = Header(None)
+):
+    """
+    Callback платежной системы. Подпись - hex HMAC-SHA256 тела в заголовке X-Signature.
+    Повторные callback с тем же payment_id не зачисляются повторно (уникальный
+    idempotency_key в balance_ledger) и получают ответ "duplicate".
+    """
+    body = await request.body()
+    if not verify_signature(body, x_signature):
+        logger.warning("Payment webhook with invalid signature")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid signature")
+
+    try:
+        payment = PaymentWebhook.model_validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors())
+
+    if payment.status.lower() not in PAID_STATUSES:
+        return {"status": "ignored"}
+
+    try:
+        result = await ledger_batcher.credit(
+            telegram_id=payment.telegram_id,
+            amount=payment.amount,
+            idempotency_key=f"{payment.provider}:{payment.payment_id}",
+            reference=payment.payment_id
+        )
+    except Exception as e:
+        logger.error(f"Error crediting payment {payment.payment_id}: {str(e)}")
+        # 5xx - платежная система повторит callback
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    if result == CreditResult.UNKNOWN_USER:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if result == CreditResult.CREDITED:
+        logger.info(f"Payment {payment.payment_id}: +{payment.amount} to {payment.telegram_id}")
+    return {"status": result.value}
@@ -1,41 +1,173 @@
-import os
+import asyncio
+import importlib.util
 import logging
-from typing import Dict, Any, List, Optional
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, List, Optional, TYPE_CHECKING
 from uuid import UUID
-from remnawave_api import RemnawaveSDK
-from remnawave_api.models import (
-    TelegramUserResponseDto,
-    UpdateUserRequestDto,
-    UserResponseDto,
-    UserActiveInboundsDto,
-    UserLastConnectedNodeDto,
-    HWIDUserResponseDtoList,
-    HWIDDeleteRequest,
-    HWIDUserResponseDto
+from core.config import (
+    REMNAWAVE_BASE_URL, REMNAWAVE_TOKEN,
+    REMNAWAVE_MAX_CONNECTIONS, REMNAWAVE_MAX_KEEPALIVE, REMNAWAVE_KEEPALIVE_EXPIRY,
+    REMNAWAVE_HTTP2, REMNAWAVE_CONNECT_TIMEOUT, REMNAWAVE_READ_TIMEOUT,
+    REMNAWAVE_WRITE_TIMEOUT, REMNAWAVE_BULK_TIMEOUT, REMNAWAVE_WARMUP_CONNECTIONS
 )
-from remnawave_api.exceptions import (
-    ApiError,
-    NotFoundError,
-    BadRequestError,
-    ForbiddenError,
-    UnauthorizedError,
-    ConflictError,
-    ServerError
-)
-from pydantic import ValidationError
+from core.lazy import LazyModule
+
+if TYPE_CHECKING:
+    from remnawave_api.models import (
+        TelegramUserResponseDto,
+        UserResponseDto,
+        UsersResponseDto,
+        HWIDUserResponseDtoList
+    )
+
+# SDK тянет httpx и десятки pydantic-моделей, поэтому грузим его лениво:
+# при импорте хендлеров ничего не загружается, клиент создается в start()
+sdk = LazyModule("remnawave_api")
+models = LazyModule("remnawave_api.models")
+errors = LazyModule("remnawave_api.exceptions")
+httpx = LazyModule("httpx")
 
 logger = logging.getLogger(__name__)
 
+# Запросы, которым нужен увеличенный таймаут (списки пользователей большими страницами)
+BULK_PATHS = ("/api/users",)
+
+
+def _panel_time(moment):
+    """
+    Дата для панели. В БД даты - локальное время без зоны, а панель дату без зоны
+    считает UTC: добавляем локальную зону (обратное преобразование - _as_local в reconcile)
+    """
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment)
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return moment
+
 class RemnawaveService:
     def __init__(self, base_url: str, token: str):
         """
-        Инициализация клиента Remnawave API
+        Инициализация клиента Remnawave API.
+        Сам SDK-клиент создается в start() (из Application.startup)
         :param base_url: Базовый URL API
         :param token: Токен авторизации
         """
-        self.client = RemnawaveSDK(base_url=base_url, token=token)
+        self.base_url = base_url
+        self.token = token
+        self._client = None
+        self._http = None
+
+        # Счетчики переиспользования соединений
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+
+    def _api_url(self) -> str:
+        url = self.base_url.rstrip("/")
+        return url if url.endswith("/api") else f"{url}/api"
+
+    def _build_http_client(self, transport=None):
+        """
+        Собственный httpx-клиент вместо создаваемого SDK по умолчанию:
+        пул и keep-alive из конфигурации, HTTP/2 (если установлен h2),
+        таймаут по типу операции и учет новых соединений.
+        transport - подмена сети (httpx.MockTransport в проверочных скриптах)
+        """
+        http2 = REMNAWAVE_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("REMNAWAVE_HTTP2 включен, но пакет h2 не установлен - используется HTTP/1.1")
+            http2 = False
+
+        timeouts = {
+            "read": httpx.Timeout(REMNAWAVE_READ_TIMEOUT, connect=REMNAWAVE_CONNECT_TIMEOUT).as_dict(),
+            "write": httpx.Timeout(REMNAWAVE_WRITE_TIMEOUT, connect=REMNAWAVE_CONNECT_TIMEOUT).as_dict(),
+            "bulk": httpx.Timeout(REMNAWAVE_BULK_TIMEOUT, connect=REMNAWAVE_CONNECT_TIMEOUT).as_dict()
+        }
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == "connection.connect_tcp.complete":
+                self.connections_opened += 1
+            elif event_name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+
+        async def on_request(request) -> None:
+            self.requests += 1
+            if request.method == "GET":
+                kind = "bulk" if request.url.path.endswith(BULK_PATHS) else "read"
+            else:
+                kind = "write"
+            request.extensions["timeout"] = timeouts[kind]
+            request.extensions["trace"] = trace
+
+        token = self.token if self.token.startswith("Bearer ") else f"Bearer {self.token}"
+        return httpx.AsyncClient(
+            base_url=self._api_url(),
+            headers={"Authorization": token},
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=REMNAWAVE_MAX_CONNECTIONS,
+                max_keepalive_connections=REMNAWAVE_MAX_KEEPALIVE,
+                keepalive_expiry=REMNAWAVE_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(REMNAWAVE_READ_TIMEOUT, connect=REMNAWAVE_CONNECT_TIMEOUT),
+            event_hooks={"request": [on_request]},
+            transport=transport
+        )
+
+    def start(self, transport=None) -> None:
+        """Создание HTTP- и SDK-клиента (импорт SDK происходит здесь)"""
+        if self._client is None:
+            self._http = self._build_http_client(transport)
+            self._client = sdk.RemnawaveSDK(client=self._http)
+            logger.info("Remnawave SDK клиент создан")
+
+    async def warm_up(self, connections: int = REMNAWAVE_WARMUP_CONNECTIONS) -> int:
+        """
+        Открыть соединения заранее (TCP + TLS), чтобы первые запросы пользователей
+        не платили за рукопожатие. Параллельные запросы по HTTP/1.1 открывают
+        отдельные соединения, после ответа они остаются в пуле keep-alive
+        """
+        if connections <= 0:
+            return 0
+        self.start()
+        opened_before = self.connections_opened
+
+        async def ping():
+            try:
+                await self._http.head("/")
+            except Exception as e:
+                logger.debug(f"Прогрев соединения с панелью: {str(e)}")
+
+        await asyncio.gather(*(ping() for _ in range(connections)))
+        opened = self.connections_opened - opened_before
+        logger.info(f"Соединения с Remnawave прогреты: {opened}")
+        return opened
+
+    async def close(self) -> None:
+        """Закрытие HTTP-клиента (из Application.shutdown)"""
+        if self._client is None:
+            return
+        await self._http.aclose()
+        self._client = None
+        self._http = None
+        logger.info("Remnawave SDK клиент закрыт")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+            "reuse_rate": round(1 - self.connections_opened / self.requests, 4) if self.requests else None
+        }
+
+    @property
+    def client(self):
+        """SDK-клиент; если start() не вызывался (скрипты, консоль), создается при первом обращении"""
+        if self._client is None:
+            self.start()
+        return self._client
     
-    async def _transform_user_response(self, user: UserResponseDto) -> Dict[str, Any]:
+    async def _transform_user_response(self, user: "UserResponseDto") -> Dict[str, Any]:
         """Преобразование объекта UserResponseDto в словарь"""
         # Вспомогательная функция для безопасного форматирования даты
         def format_date(date_field):
@@ -169,22 +301,22 @@ class RemnawaveService:
             logger.info(f"Успешно получено {len(subscriptions)} подписок для {telegram_id}")
             return subscriptions
 
-        except NotFoundError:
+        except errors.NotFoundError:
             logger.warning(f"Пользователь {telegram_id} не найден")
             return [{"error": "Пользователь не найден"}]
-        except BadRequestError as e:
+        except errors.BadRequestError as e:
             logger.error(f"Ошибка запроса для {telegram_id}: {str(e)}")
             return [{"error": "Некорректный запрос"}]
-        except ForbiddenError:
+        except errors.ForbiddenError:
             logger.error(f"Доступ запрещен для {telegram_id}")
             return [{"error": "Доступ запрещен"}]
-        except UnauthorizedError:
+        except errors.UnauthorizedError:
             logger.error("Невалидный API токен")
             return [{"error": "Ошибка авторизации API"}]
-        except ServerError as e:
+        except errors.ServerError as e:
             logger.error(f"Ошибка сервера: {str(e)}")
             return [{"error": "Внутренняя ошибка сервера"}]
-        except ApiError as e:
+        except errors.ApiError as e:
             logger.error(f"Ошибка API: {str(e)}")
             return [{"error": f"Ошибка API: {str(e)}"}]
         except Exception as e:
@@ -213,22 +345,22 @@ class RemnawaveService:
             logger.info(f"Успешно получена подписка {subscription_uuid}")
             return subscription
 
-        except NotFoundError:
+        except errors.NotFoundError:
             logger.warning(f"Подписка {subscription_uuid} не найдена")
             return {"error": "Подписка не найдена"}
-        except BadRequestError as e:
+        except errors.BadRequestError as e:
             logger.error(f"Ошибка запроса для UUID {subscription_uuid}: {str(e)}")
             return {"error": "Некорректный запрос"}
-        except ForbiddenError:
+        except errors.ForbiddenError:
             logger.error(f"Доступ запрещен для UUID {subscription_uuid}")
             return {"error": "Доступ запрещен"}
-        except UnauthorizedError:
+        except errors.UnauthorizedError:
             logger.error("Невалидный API токен")
             return {"error": "Ошибка авторизации API"}
-        except ServerError as e:
+        except errors.ServerError as e:
             logger.error(f"Ошибка сервера: {str(e)}")
             return {"error": "Внутренняя ошибка сервера"}
-        except ApiError as e:
+        except errors.ApiError as e:
             logger.error(f"Ошибка API: {str(e)}")
             return {"error": f"Ошибка API: {str(e)}"}
         except Exception as e:
@@ -254,13 +386,15 @@ class RemnawaveService:
             logger.debug(f"Обновление пользователя с UUID {user_uuid}: {update_data}")
 
             # Формируем DTO для запроса на обновление
-            update_request = UpdateUserRequestDto(
+            if update_data.get("expire_at") is not None:
+                update_data = {**update_data, "expire_at": _panel_time(update_data["expire_at"])}
+            update_request = models.UpdateUserRequestDto(
                 uuid=user_uuid,
                 **update_data
             )
 
-            # Делаем запрос к API
-            response: UserResponseDto = await self.client.users.update_user(user_uuid, update_request)
+            # Делаем запрос к API (PATCH /users, UUID передается в теле)
+            response: UserResponseDto = await self.client.users.update_user(update_request)
 
             # Преобразуем ответ API
             updated_user = await self._transform_user_response(response)
@@ -268,25 +402,25 @@ class RemnawaveService:
             logger.info(f"Успешно обновлен пользователь с UUID {user_uuid}")
             return updated_user
 
-        except NotFoundError:
+        except errors.NotFoundError:
             logger.warning(f"Пользователь с UUID {user_uuid} не найден")
             return {"error": "Пользователь не найден"}
-        except BadRequestError as e:
+        except errors.BadRequestError as e:
             logger.error(f"Ошибка запроса для UUID {user_uuid}: {str(e)}")
             return {"error": "Некорректный запрос"}
-        except ForbiddenError:
+        except errors.ForbiddenError:
             logger.error(f"Доступ запрещен для UUID {user_uuid}")
             return {"error": "Доступ запрещен"}
-        except UnauthorizedError:
+        except errors.UnauthorizedError:
             logger.error("Невалидный API токен")
             return {"error": "Ошибка авторизации API"}
-        except ConflictError:
+        except errors.ConflictError:
             logger.error(f"Конфликт при обновлении пользователя с UUID {user_uuid}")
             return {"error": "Конфликт данных"}
-        except ServerError as e:
+        except errors.ServerError as e:
             logger.error(f"Ошибка сервера: {str(e)}")
             return {"error": "Внутренняя ошибка сервера"}
-        except ApiError as e:
+        except errors.ApiError as e:
             logger.error(f"Ошибка API: {str(e)}")
             return {"error": f"Ошибка API: {str(e)}"}
         except Exception as e:
@@ -322,6 +456,134 @@ class RemnawaveService:
             logger.critical(f"Неизвестная ошибка при обновлении по Telegram ID {telegram_id}: {str(e)}", exc_info=True)
             return {"error": "Неизвестная ошибка"}
 
+    async def create_user(self, username: str, expire_at: datetime, telegram_id: int) -> Dict[str, Any]:
+        """
+        Создание пользователя (подписки) в панели.
+        Повторный вызов с тем же username (повтор после сбоя) возвращает уже созданного
+        пользователя, поэтому операция идемпотентна по username
+        :param username: Имя пользователя в панели (^[a-zA-Z0-9_-]{6,36}$)
+        :param expire_at: Дата окончания подписки
+        :param telegram_id: Идентификатор владельца в Telegram
+        :return: Данные созданного пользователя или словарь с ошибкой
+        """
+        try:
+            logger.debug(f"Создание пользователя {username} для Telegram ID {telegram_id}")
+
+            request = models.CreateUserRequestDto(
+                username=username,
+                expire_at=_panel_time(expire_at),
+                telegram_id=telegram_id,
+                activate_all_inbounds=True
+            )
+            response: UserResponseDto = await self.client.users.create_user(request)
+
+            created_user = await self._transform_user_response(response)
+            logger.info(f"Успешно создан пользователь {username} ({created_user['uuid']})")
+            return created_user
+
+        except errors.ConflictError:
+            logger.warning(f"Пользователь {username} уже существует, используем его")
+            try:
+                response: UserResponseDto = await self.client.users.get_user_by_username(username)
+                return await self._transform_user_response(response)
+            except Exception as e:
+                logger.error(f"Не удалось получить существующего пользователя {username}: {str(e)}")
+                return {"error": "Конфликт данных"}
+        except errors.BadRequestError as e:
+            logger.error(f"Ошибка запроса при создании {username}: {str(e)}")
+            return {"error": "Некорректный запрос"}
+        except errors.ForbiddenError:
+            logger.error(f"Доступ запрещен при создании {username}")
+            return {"error": "Доступ запрещен"}
+        except errors.UnauthorizedError:
+            logger.error("Невалидный API токен")
+            return {"error": "Ошибка авторизации API"}
+        except errors.ServerError as e:
+            logger.error(f"Ошибка сервера: {str(e)}")
+            return {"error": "Внутренняя ошибка сервера"}
+        except errors.ApiError as e:
+            logger.error(f"Ошибка API: {str(e)}")
+            return {"error": f"Ошибка API: {str(e)}"}
+        except Exception as e:
+            logger.critical(f"Неизвестная ошибка: {str(e)}", exc_info=True)
+            return {"error": "Неизвестная ошибка"}
+
+    @staticmethod
+    def _compact_user(user: "UserResponseDto") -> Dict[str, Any]:
+        """Только поля для массовой обработки (без форматирования _transform_user_response)"""
+        status = user.status.value if hasattr(user.status, "value") else user.status
+        return {
+            "uuid": str(user.uuid),
+            "username": user.username,
+            "telegram_id": user.telegram_id,
+            "status": status,
+            "expire_at": user.expire_at,
+            "used_traffic_bytes": user.used_traffic_bytes or 0,
+            "lifetime_used_traffic_bytes": user.lifetime_used_traffic_bytes or 0
+        }
+
+    async def get_users_page(self, start: int, size: int) -> Dict[str, Any]:
+        """
+        Страница списка всех пользователей панели
+        :param start: Смещение
+        :param size: Размер страницы
+        :return: {"users": [...], "total": N} или словарь с ошибкой
+        """
+        try:
+            response: UsersResponseDto = await self.client.users.get_all_users_v2(start=start, size=size)
+            return {
+                "users": [self._compact_user(user) for user in response.users],
+                "total": int(response.total)  # в SDK total - float
+            }
+        except errors.UnauthorizedError:
+            logger.error("Невалидный API токен")
+            return {"error": "Ошибка авторизации API"}
+        except errors.ServerError as e:
+            logger.error(f"Ошибка сервера: {str(e)}")
+            return {"error": "Внутренняя ошибка сервера"}
+        except errors.ApiError as e:
+            logger.error(f"Ошибка API: {str(e)}")
+            return {"error": f"Ошибка API: {str(e)}"}
+        except Exception as e:
+            logger.critical(f"Неизвестная ошибка при загрузке пользователей ({start}, {size}): {str(e)}", exc_info=True)
+            return {"error": "Неизвестная ошибка"}
+
+    async def iter_user_pages(self, page_size: int, concurrency: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Все пользователи панели страницами. Первая страница сообщает total,
+        остальные запрашиваются параллельно (не больше concurrency запросов
+        одновременно) и отдаются по мере готовности, не по порядку.
+        Ошибка любой страницы прерывает обход (RuntimeError)
+        """
+        first = await self.get_users_page(0, page_size)
+        if "error" in first:
+            raise RuntimeError(f"Страница пользователей 0: {first['error']}")
+        yield first["users"]
+        # Панель может ограничить размер страницы - шаг берем по фактической первой
+        page_size = len(first["users"])
+        if not page_size:
+            return
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(start: int) -> Dict[str, Any]:
+            async with semaphore:
+                page = await self.get_users_page(start, page_size)
+            if "error" in page:
+                raise RuntimeError(f"Страница пользователей {start}: {page['error']}")
+            return page
+
+        tasks = [
+            asyncio.create_task(fetch(start))
+            for start in range(page_size, first["total"], page_size)
+        ]
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                yield (await next_page)["users"]
+        finally:
+            for task in tasks:
+                task.cancel()
+
     async def get_connected_devices(self, user_uuid: str) -> List[Dict]:
         """
         Получение списка подключённых устройств для подписки.
@@ -350,22 +612,22 @@ class RemnawaveService:
             ]
             logger.debug(f"Получено {len(devices)} устройств для подписки {user_uuid}")
             return devices
-        except NotFoundError:
+        except errors.NotFoundError:
             logger.warning(f"Устройства для подписки {user_uuid} не найдены")
             return []
-        except BadRequestError as e:
+        except errors.BadRequestError as e:
             logger.error(f"Ошибка запроса для {user_uuid}: {str(e)}")
             return []
-        except ForbiddenError:
+        except errors.ForbiddenError:
             logger.error(f"Доступ запрещен для {user_uuid}")
             return []
-        except UnauthorizedError:
+        except errors.UnauthorizedError:
             logger.error("Невалидный API токен")
             return []
-        except ServerError as e:
+        except errors.ServerError as e:
             logger.error(f"Ошибка сервера: {str(e)}")
             return []
-        except ApiError as e:
+        except errors.ApiError as e:
             logger.error(f"Ошибка API: {str(e)}")
             return []
         except Exception as e:
@@ -385,34 +647,35 @@ class RemnawaveService:
         """
         try:
             logger.debug(f"Удаление устройства {hwid} для подписки {user_uuid}")
-            body = HWIDDeleteRequest(hwid=hwid, userUuid=UUID(user_uuid))
+            body = models.HWIDDeleteRequest(hwid=hwid, userUuid=UUID(user_uuid))
             response: HWIDUserResponseDtoList = await self.client.hwid.delete_hwid_to_user(body)
             logger.info(f"Устройство {hwid} удалено для подписки {user_uuid}")
             return True
-        except NotFoundError:
+        except errors.NotFoundError:
+            # Устройства уже нет - результат тот же, повтор из outbox не нужен
             logger.warning(f"Устройство {hwid} для подписки {user_uuid} не найдено")
-            return False
-        except BadRequestError as e:
+            return True
+        except errors.BadRequestError as e:
             logger.error(f"Ошибка запроса для удаления устройства {hwid}: {str(e)}")
             return False
-        except ForbiddenError:
+        except errors.ForbiddenError:
             logger.error(f"Доступ запрещен для удаления устройства {hwid}")
             return False
-        except UnauthorizedError:
+        except errors.UnauthorizedError:
             logger.error("Невалидный API токен")
             return False
-        except ServerError as e:
+        except errors.ServerError as e:
             logger.error(f"Ошибка сервера: {str(e)}")
             return False
-        except ApiError as e:
+        except errors.ApiError as e:
             logger.error(f"Ошибка API: {str(e)}")
             return False
         except Exception as e:
             logger.critical(f"Неизвестная ошибка при удалении устройства {hwid} для {user_uuid}: {str(e)}", exc_info=True)
             return False
 
-# Инициализация сервиса с параметрами из переменных окружения
+# Экземпляр сервиса; конструктор ничего не импортирует и не открывает соединений
 remnawave_service = RemnawaveService(
-    base_url=os.getenv("REMNAWAVE_BASE_URL", "https://api.remnawave.com"),
-    token=os.getenv("REMNAWAVE_TOKEN", "your_api_token_here")
+    base_url=REMNAWAVE_BASE_URL,
+    token=REMNAWAVE_TOKEN
 )
@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from core.config import (
+    LOG_LEVEL, LOG_FORMAT,
+    WORKER_HEARTBEAT_INTERVAL, WORKER_IDLE_SECONDS, WORKER_QUEUE_SIZE,
+    UPDATE_DEDUP_RETENTION_HOURS, SHUTDOWN_DRAIN_TIMEOUT
+)
+from core import runtime
+
+logger = logging.getLogger(__name__)
+
+# Процессы создаются через spawn: форк процесса с работающим event loop,
+# пулом соединений БД и aiohttp-сессией небезопасен
+mp = multiprocessing.get_context("spawn")
+
+# Индексы в общей таблице статистики воркеров
+STAT_HEARTBEAT = 0      # последний heartbeat (time.time())
+STAT_LAST_UPDATE = 1    # время завершения последнего апдейта
+STAT_PROCESSED = 2      # сколько апдейтов обработано
+STAT_IN_PROGRESS = 3    # сколько апдейтов в работе сейчас
+STAT_READY = 4          # 1 после завершения startup воркера
+STAT_FIELDS = 5
+
+# Сколько даем воркеру на startup, прежде чем считать его зависшим (сек)
+WORKER_STARTUP_TIMEOUT = 120
+
+
+def shard_key(update) -> int:
+    """
+    Ключ шардирования апдейта: ID пользователя, иначе ID чата, иначе update_id.
+    Все апдейты одного пользователя попадают в один воркер, поэтому порядок сохраняется.
+    """
+    try:
+        event = update.event
+    except Exception:
+        return update.update_id
+
+    from_user = getattr(event, "from_user", None) or getattr(event, "user", None)
+    if from_user is not None:
+        return from_user.id
+
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return chat.id
+
+    return update.update_id
+
+
+class WorkerStats:
+    """Статистика воркеров в разделяемой памяти (пишут воркеры, читает ingress)"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._values = mp.Array("d", workers * STAT_FIELDS)
+
+    def set(self, worker_id: int, field: int, value: float) -> None:
+        self._values[worker_id * STAT_FIELDS + field] = value
+
+    def add(self, worker_id: int, field: int, delta: float) -> None:
+        with self._values.get_lock():
+            self._values[worker_id * STAT_FIELDS + field] += delta
+
+    def get(self, worker_id: int, field: int) -> float:
+        return self._values[worker_id * STAT_FIELDS + field]
+
+
+class Cluster:
+    """
+    Многопроцессный режим: текущий процесс (ingress) получает апдейты
+    из Telegram и раскладывает их по очередям воркеров по ключу шардирования,
+    воркеры обрабатывают апдейты своим Dispatcher.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.stats = WorkerStats(workers)
+        self.queues = [mp.Queue(maxsize=WORKER_QUEUE_SIZE) for _ in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.started_at = time.time()
+        self._stopping = False
+        self._supervisor_task: Optional[asyncio.Task] = None
+
+    # ---------- процессы воркеров ----------
+
+    def _spawn(self, worker_id: int) -> None:
+        now = time.time()
+        self.stats.set(worker_id, STAT_HEARTBEAT, now)
+        self.stats.set(worker_id, STAT_LAST_UPDATE, now)
+        self.stats.set(worker_id, STAT_IN_PROGRESS, 0)
+        self.stats.set(worker_id, STAT_READY, 0)
+        process = mp.Process(
+            target=worker_main,
+            args=(worker_id, self.queues[worker_id], self.stats),
+            name=f"bot-worker-{worker_id}",
+            daemon=False
+        )
+        process.start()
+        self.processes[worker_id] = process
+        logger.info(f"Worker {worker_id} started (pid {process.pid})")
+
+    def start(self) -> None:
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        self._supervisor_task = asyncio.create_task(self._supervise())
+
+    async def stop(self) -> None:
+        """Остановка воркеров: каждый дорабатывает свою очередь и завершается"""
+        self._stopping = True
+        if self._supervisor_task:
+            self._supervisor_task.cancel()
+
+        for worker_queue in self.queues:
+            worker_queue.put(None)
+
+        loop = asyncio.get_running_loop()
+        for worker_id, process in enumerate(self.processes):
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, SHUTDOWN_DRAIN_TIMEOUT + 5)
+            if process.is_alive():
+                logger.error(f"Worker {worker_id} did not stop in time, terminating")
+                process.terminate()
+            else:
+                logger.info(f"Worker {worker_id} stopped (exit code {process.exitcode})")
+
+    # ---------- ingress ----------
+
+    def dispatch(self, update) -> None:
+        key = shard_key(update)
+        worker_id = key % self.workers
+        raw = update.model_dump(mode="json", exclude_none=True, by_alias=True)
+        # put с блокировкой = backpressure: если воркер не успевает, ingress ждет
+        self.queues[worker_id].put((key, raw))
+
+    async def run_ingress(self, bot, polling_timeout: int = 10) -> None:
+        """Long polling в ingress-процессе с раздачей апдейтов воркерам"""
+        loop = asyncio.get_running_loop()
+        offset = None
+        backoff = 1.0
+
+        logger.info(f"Ingress polling started, workers: {self.workers}")
+        while not self._stopping:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=polling_timeout)
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingress polling error: {str(e)}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+
+            for update in updates:
+                await loop.run_in_executor(None, self.dispatch, update)
+                offset = update.update_id + 1
+        logger.info("Ingress polling stopped")
+
+    def stop_ingress(self) -> None:
+        self._stopping = True
+
+    # ---------- наблюдение ----------
+
+    def worker_states(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        states = []
+        for worker_id, process in enumerate(self.processes):
+            heartbeat_age = now - self.stats.get(worker_id, STAT_HEARTBEAT)
+            idle_for = now - self.stats.get(worker_id, STAT_LAST_UPDATE)
+            alive = process is not None and process.is_alive()
+            in_progress = int(self.stats.get(worker_id, STAT_IN_PROGRESS))
+
+            ready = bool(self.stats.get(worker_id, STAT_READY))
+
+            if not alive:
+                state = "dead"
+            elif not ready:
+                state = "starting" if heartbeat_age < WORKER_STARTUP_TIMEOUT else "unresponsive"
+            elif heartbeat_age > WORKER_HEARTBEAT_INTERVAL * 3:
+                state = "unresponsive"
+            elif in_progress == 0 and idle_for > WORKER_IDLE_SECONDS:
+                state = "idle"
+            else:
+                state = "busy" if in_progress else "ready"
+
+            try:
+                queued = self.queues[worker_id].qsize()
+            except NotImplementedError:  # macOS
+                queued = -1
+
+            states.append({
+                "worker_id": worker_id,
+                "pid": process.pid if process else None,
+                "state": state,
+                "processed": int(self.stats.get(worker_id, STAT_PROCESSED)),
+                "in_progress": in_progress,
+                "queued": queued,
+                "idle_seconds": round(idle_for, 1),
+                "heartbeat_age": round(heartbeat_age, 1)
+            })
+        return states
+
+    async def _supervise(self) -> None:
+        """Перезапуск упавших воркеров, отчет о зависших/простаивающих, чистка дедупликации"""
+        last_purge = 0.0
+        while not self._stopping:
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+            for state in self.worker_states():
+                worker_id = state["worker_id"]
+                if state["state"] == "dead" and not self._stopping:
+                    process = self.processes[worker_id]
+                    logger.error(
+                        f"Worker {worker_id} died (exit code {process.exitcode if process else None}), restarting"
+                    )
+                    self._spawn(worker_id)
+                elif state["state"] == "unresponsive":
+                    logger.warning(f"Worker {worker_id} heartbeat is {state['heartbeat_age']}s old")
+                elif state["state"] == "idle":
+                    logger.debug(f"Worker {worker_id} idle for {state['idle_seconds']}s")
+
+            if time.time() - last_purge > 3600:
+                last_purge = time.time()
+                await self._purge_processed_updates()
+
+    async def _purge_processed_updates(self) -> None:
+        from core.database.database import async_session
+        from core.database.crud import purge_processed_updates
+
+        older_than = datetime.now() - timedelta(hours=UPDATE_DEDUP_RETENTION_HOURS)
+        async with async_session() as session:
+            removed = await purge_processed_updates(session, older_than)
+        if removed:
+            logger.info(f"Purged {removed} processed update records")
+
+
+# ==================== WORKER PROCESS ====================
+
+def worker_main(worker_id: int, updates: "multiprocessing.Queue", stats: WorkerStats) -> None:
+    """Точка входа процесса-воркера"""
+    # force: при spawn main.py импортируется первым и уже настроил корневой логгер
+    logging.basicConfig(level=LOG_LEVEL, format=f"[worker {worker_id}] {LOG_FORMAT}", force=True)
+    try:
+        profile = runtime.get_run_profile()
+        runtime.run(_run_worker(worker_id, updates, stats), profile)
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_worker(worker_id: int, updates: "multiprocessing.Queue", stats: WorkerStats) -> None:
+    from main import Application
+
+    application = Application(worker_id=worker_id, workers=stats.workers)
+    await application.startup()
+
+    loop = asyncio.get_running_loop()
+    locks: Dict[int, asyncio.Lock] = {}
+    pending: Dict[int, int] = {}
+    tasks = set()
+
+    async def heartbeat():
+        while True:
+            stats.set(worker_id, STAT_HEARTBEAT, time.time())
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+    async def process(key: int, raw: Dict[str, Any]):
+        # Lock на пользователя: апдейты одного пользователя обрабатываются строго по очереди
+        lock = locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                stats.add(worker_id, STAT_IN_PROGRESS, 1)
+                try:
+                    await application.dp.feed_raw_update(application.bot, raw)
+                except Exception as e:
+                    logger.error(f"Update {raw.get('update_id')} failed: {str(e)}", exc_info=True)
+                finally:
+                    stats.add(worker_id, STAT_IN_PROGRESS, -1)
+                    stats.add(worker_id, STAT_PROCESSED, 1)
+                    stats.set(worker_id, STAT_LAST_UPDATE, time.time())
+        finally:
+            pending[key] -= 1
+            if not pending[key]:
+                del pending[key]
+                locks.pop(key, None)
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    stats.set(worker_id, STAT_READY, 1)
+    logger.info(f"Worker {worker_id} ready")
+
+    while True:
+        try:
+            item = await loop.run_in_executor(None, updates.get, True, WORKER_HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            continue
+        if item is None:
+            break
+
+        key, raw = item
+        pending[key] = pending.get(key, 0) + 1
+        task = asyncio.create_task(process(key, raw))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    logger.info(f"Worker {worker_id} stopping, {len(tasks)} updates pending")
+    if tasks:
+        await asyncio.wait(set(tasks), timeout=SHUTDOWN_DRAIN_TIMEOUT)
+    heartbeat_task.cancel()
+    await application.shutdown()
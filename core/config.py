@@ -0,0 +1,141 @@
+import os
+from dotenv import load_dotenv
+
+# Загрузка переменных окружения (единственное место, где вызывается load_dotenv)
+load_dotenv()
+
+# Telegram
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+
+# HTTP API
+API_KEY = os.getenv("API_KEY")
+API_PORT = int(os.getenv("API_PORT", 8899))
+SSL_CERT_PATH = os.getenv("SSL_CERT_PATH")
+# Профиль запуска (production / development, см. core/runtime.py), очередь
+# входящих соединений и keep-alive (сек, дольше простоя соединений у reverse proxy)
+RUN_PROFILE = os.getenv("RUN_PROFILE", "production").lower()
+API_BACKLOG = int(os.getenv("API_BACKLOG", 4096))
+API_KEEPALIVE_TIMEOUT = int(os.getenv("API_KEEPALIVE_TIMEOUT", 75))
+
+# База данных
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Реплики для чтения (URL через запятую), допустимое отставание (сек),
+# интервал и таймаут проверки реплик (сек)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", 10))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 5))
+REPLICA_CHECK_TIMEOUT = float(os.getenv("REPLICA_CHECK_TIMEOUT", 2))
+# Кеш скомпилированных запросов SQLAlchemy и подготовленных выражений asyncpg
+# на соединение (0 - без подготовленных выражений, для pgbouncer в режиме transaction)
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", 1000))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 500))
+
+# Remnawave
+REMNAWAVE_BASE_URL = os.getenv("REMNAWAVE_BASE_URL", "https://api.remnawave.com")
+REMNAWAVE_TOKEN = os.getenv("REMNAWAVE_TOKEN", "your_api_token_here")
+# Пул соединений с панелью: максимум соединений, сколько держать открытыми
+# между запросами и сколько (сек), HTTP/2 (нужен пакет h2)
+REMNAWAVE_MAX_CONNECTIONS = int(os.getenv("REMNAWAVE_MAX_CONNECTIONS", 50))
+REMNAWAVE_MAX_KEEPALIVE = int(os.getenv("REMNAWAVE_MAX_KEEPALIVE", 20))
+REMNAWAVE_KEEPALIVE_EXPIRY = float(os.getenv("REMNAWAVE_KEEPALIVE_EXPIRY", 60))
+REMNAWAVE_HTTP2 = os.getenv("REMNAWAVE_HTTP2", "false").lower() in ("1", "true", "yes")
+# Таймауты (сек): установка соединения, чтение, изменения, списки пользователей
+REMNAWAVE_CONNECT_TIMEOUT = float(os.getenv("REMNAWAVE_CONNECT_TIMEOUT", 3))
+REMNAWAVE_READ_TIMEOUT = float(os.getenv("REMNAWAVE_READ_TIMEOUT", 5))
+REMNAWAVE_WRITE_TIMEOUT = float(os.getenv("REMNAWAVE_WRITE_TIMEOUT", 10))
+REMNAWAVE_BULK_TIMEOUT = float(os.getenv("REMNAWAVE_BULK_TIMEOUT", 30))
+# Сколько соединений открыть при старте (0 - без прогрева)
+REMNAWAVE_WARMUP_CONNECTIONS = int(os.getenv("REMNAWAVE_WARMUP_CONNECTIONS", 2))
+
+# Завершение работы: сколько ждать обрабатываемые апдейты (сек)
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 25))
+SHUTDOWN_REPORT_INTERVAL = float(os.getenv("SHUTDOWN_REPORT_INTERVAL", 2))
+
+# Многопроцессный режим (1 = один процесс с обычным polling)
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", 1))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", 1000))
+WORKER_HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", 5))
+WORKER_IDLE_SECONDS = float(os.getenv("WORKER_IDLE_SECONDS", 300))
+UPDATE_DEDUP_RETENTION_HOURS = int(os.getenv("UPDATE_DEDUP_RETENTION_HOURS", 48))
+
+# Сколько последних сообщений помнить для пропуска одинаковых правок
+EDIT_CACHE_SIZE = int(os.getenv("EDIT_CACHE_SIZE", 10000))
+
+# Исходящая очередь Bot API (лимиты Telegram: ~30 сообщений/с на бота,
+# ~1/с в личный чат, ~20/мин в группу). В многопроцессном режиме
+# глобальный лимит делится между воркерами
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", 30))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", 1))
+OUTBOUND_GROUP_RATE = float(os.getenv("OUTBOUND_GROUP_RATE", 20 / 60))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", 3))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+
+# Кеш промокодов: интервал пересборки фильтра известных кодов (сек), как часто
+# сверять набор действующих кодов с БД (сек, дешевый агрегат; изменился - пересборка),
+# размер отрицательного кеша и доля ложных срабатываний Bloom filter
+PROMO_CACHE_REFRESH_SECONDS = float(os.getenv("PROMO_CACHE_REFRESH_SECONDS", 300))
+PROMO_CACHE_CHECK_SECONDS = float(os.getenv("PROMO_CACHE_CHECK_SECONDS", 5))
+PROMO_NEGATIVE_CACHE_SIZE = int(os.getenv("PROMO_NEGATIVE_CACHE_SIZE", 10000))
+PROMO_BLOOM_ERROR_RATE = float(os.getenv("PROMO_BLOOM_ERROR_RATE", 0.01))
+
+# Журнал баланса: как часто сворачивать записи в снимок users.balance (сек),
+# минимальный возраст сворачиваемых записей (сек) и размер пачки пользователей
+BALANCE_COMPACTION_INTERVAL = float(os.getenv("BALANCE_COMPACTION_INTERVAL", 300))
+BALANCE_COMPACTION_LAG = float(os.getenv("BALANCE_COMPACTION_LAG", 60))
+BALANCE_COMPACTION_BATCH = int(os.getenv("BALANCE_COMPACTION_BATCH", 1000))
+
+# Вебхук платежной системы: секрет подписи (HMAC-SHA256 тела запроса),
+# окно группировки зачислений в одну транзакцию (мс) и максимум записей в пачке
+PAYMENT_WEBHOOK_SECRET = os.getenv("PAYMENT_WEBHOOK_SECRET")
+PAYMENT_BATCH_WINDOW_MS = float(os.getenv("PAYMENT_BATCH_WINDOW_MS", 5))
+PAYMENT_BATCH_MAX_SIZE = int(os.getenv("PAYMENT_BATCH_MAX_SIZE", 200))
+
+# Покупка подписок: кеш тарифов (сек), параллельность создания подписок в панели,
+# число попыток и пауза между ними (сек)
+PLANS_CACHE_SECONDS = float(os.getenv("PLANS_CACHE_SECONDS", 60))
+PROVISIONING_CONCURRENCY = int(os.getenv("PROVISIONING_CONCURRENCY", 4))
+PROVISIONING_MAX_ATTEMPTS = int(os.getenv("PROVISIONING_MAX_ATTEMPTS", 5))
+PROVISIONING_RETRY_DELAY = float(os.getenv("PROVISIONING_RETRY_DELAY", 30))
+
+# Outbox изменений в панели Remnawave: интервал опроса (сек), размер пачки,
+# сколько подписок обрабатывать параллельно, число попыток, задержка повтора
+# (база экспоненты и максимум, сек) и срок хранения примененных записей (ч)
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 2))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", 8))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 10))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", 5))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", 900))
+OUTBOX_RETENTION_HOURS = int(os.getenv("OUTBOX_RETENTION_HOURS", 72))
+
+# Статистика трафика: интервал снятия показаний (сек), размер страницы списка
+# пользователей панели и сколько дней хранить 5-минутные, часовые и суточные данные
+TRAFFIC_SAMPLE_INTERVAL = float(os.getenv("TRAFFIC_SAMPLE_INTERVAL", 300))
+TRAFFIC_PAGE_SIZE = int(os.getenv("TRAFFIC_PAGE_SIZE", 500))
+TRAFFIC_RAW_RETENTION_DAYS = int(os.getenv("TRAFFIC_RAW_RETENTION_DAYS", 2))
+TRAFFIC_HOURLY_RETENTION_DAYS = int(os.getenv("TRAFFIC_HOURLY_RETENTION_DAYS", 31))
+TRAFFIC_DAILY_RETENTION_DAYS = int(os.getenv("TRAFFIC_DAILY_RETENTION_DAYS", 400))
+
+# Сверка с панелью: интервал (сек), размер страницы списка пользователей,
+# сколько страниц запрашивать одновременно, допустимое расхождение даты
+# окончания (сек) и исправлять ли расхождения автоматически
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", 6 * 3600))
+RECONCILE_PAGE_SIZE = int(os.getenv("RECONCILE_PAGE_SIZE", 1000))
+REMNAWAVE_PAGE_CONCURRENCY = int(os.getenv("REMNAWAVE_PAGE_CONCURRENCY", 4))
+RECONCILE_EXPIRY_TOLERANCE = float(os.getenv("RECONCILE_EXPIRY_TOLERANCE", 300))
+RECONCILE_AUTOFIX = os.getenv("RECONCILE_AUTOFIX", "false").lower() in ("1", "true", "yes")
+
+# Поиск пользователей: максимум результатов и минимальная длина подстроки
+# (короче - поиск по началу имени)
+SEARCH_RESULT_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", 20))
+SEARCH_MIN_SUBSTRING = int(os.getenv("SEARCH_MIN_SUBSTRING", 3))
+
+# Архив подписок: через сколько дней после окончания подписка переносится
+# в archived_subscriptions, размер пачки (одна короткая транзакция) и интервал (сек)
+SUBSCRIPTION_ARCHIVE_AFTER_DAYS = int(os.getenv("SUBSCRIPTION_ARCHIVE_AFTER_DAYS", 90))
+SUBSCRIPTION_ARCHIVE_BATCH = int(os.getenv("SUBSCRIPTION_ARCHIVE_BATCH", 500))
+SUBSCRIPTION_ARCHIVE_INTERVAL = float(os.getenv("SUBSCRIPTION_ARCHIVE_INTERVAL", 3600))
+
+# Логирование
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
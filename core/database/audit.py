@@ -0,0 +1,603 @@
+"""
+Аудит планов запросов crud.py и набора индексов.
+
+Создает тестовую базу, заполняет ее, вызывает функции crud (и поиск) на
+сценариях, перехватывает выполненный SQL и получает план каждого запроса:
+EXPLAIN QUERY PLAN в SQLite, EXPLAIN (FORMAT JSON) в PostgreSQL
+(с enable_seqscan = off: на небольшой базе PostgreSQL иначе предпочитает
+скан, а так скан остается только там, где подходящего индекса нет).
+
+Отчет:
+  - полные сканы таблиц;
+  - дублирующие индексы и индексы, покрытые префиксом другого;
+  - индексы, которых нет ни в одном плане (только предупреждение: они
+    могут быть нужны для каскадного удаления).
+
+Планы сравниваются с core/database/query_plans.json. Новый скан таблицы
+в запросе, дублирующий индекс или ошибка в сценарии - код выхода 1.
+
+    python -m core.database.audit
+    python -m core.database.audit --verbose                 # + все планы
+    python -m core.database.audit --update-baseline         # принять текущие планы
+    python -m core.database.audit --url postgresql+asyncpg://...
+
+Без --url используется временная SQLite-база. Скрипт создает таблицы сам,
+не запускайте его на рабочей базе.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect, insert, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from core.database import crud
+from core.database.database import init_engine, dispose_engine, async_session
+from core.database.model import (
+    Base, User, PurchasedSubscription, SubscriptionPlan, SubscriptionOrder,
+    Promocode, UsedPromocode, ProcessedUpdate, SupportTicket, TicketMessage,
+    BalanceLedger, RemnawaveOutbox, TrafficSeries
+)
+from core.database.search import ensure_search_indexes, search_users
+
+logger = logging.getLogger(__name__)
+
+BASELINE_PATH = Path(__file__).with_name("query_plans.json")
+
+# Размер тестовой базы: достаточно, чтобы планировщик SQLite после ANALYZE
+# выбирал индексы так же, как на рабочих данных
+SEED_USERS = 2000
+FIRST_TELEGRAM_ID = 5_000_000
+AGENT_ID = 1_000
+AUDIT_USER = FIRST_TELEGRAM_ID + 8      # с подписками, журналом и обращением
+AUDIT_SUB = f"audit-sub-{AUDIT_USER}-0"
+NEW_USER = FIRST_TELEGRAM_ID + SEED_USERS + 1
+
+# План нужен только запросам, которые что-то ищут в таблицах
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE)\b", re.IGNORECASE)
+# SQLite: "SCAN users", "SCAN users USING COVERING INDEX ..." - полный проход;
+# виртуальные таблицы (FTS5), подзапросы и константы - не сканы таблиц
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)\b(?! VIRTUAL TABLE)")
+_SQLITE_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+
+
+@dataclass
+class CapturedQuery:
+    key: str               # "<сценарий>#<номер запроса в сценарии>"
+    sql: str
+    params: Any
+    plan: List[str] = field(default_factory=list)
+    scans: List[str] = field(default_factory=list)
+    indexes: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class IndexDef:
+    table: str
+    name: str
+    columns: Tuple[str, ...]
+    unique: bool
+    primary: bool = False
+
+
+class QueryRecorder:
+    """Запоминает SQL, выполненный внутри сценария (событие before_cursor_execute)"""
+
+    def __init__(self):
+        self.queries: Dict[str, CapturedQuery] = {}
+        self.errors: List[str] = []
+        self._scenario: Optional[str] = None
+        self._counter = 0
+
+    def attach(self, engine: AsyncEngine) -> None:
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+        # Ошибки crud попадают в отчет, а не в консоль
+        database_logger = logging.getLogger("core.database")
+        database_logger.setLevel(logging.ERROR)
+        database_logger.propagate = False
+        database_logger.addHandler(_ErrorCollector(self))
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._scenario is None or executemany or not _EXPLAINABLE.match(statement):
+            return
+        self._counter += 1
+        key = f"{self._scenario}#{self._counter}"
+        self.queries[key] = CapturedQuery(key, " ".join(statement.split()), parameters)
+
+    @contextmanager
+    def scenario(self, name: str):
+        self._scenario, self._counter = name, 0
+        try:
+            yield
+        finally:
+            self._scenario = None
+
+    def on_error(self, message: str) -> None:
+        if self._scenario is not None:
+            self.errors.append(f"{self._scenario}: {message}")
+
+
+class _ErrorCollector(logging.Handler):
+    """crud перехватывает исключения и пишет их в лог - сценарий с ошибкой не проверен"""
+
+    def __init__(self, recorder: QueryRecorder):
+        super().__init__(logging.ERROR)
+        self.recorder = recorder
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.recorder.on_error(record.getMessage())
+
+
+# ==================== ТЕСТОВЫЕ ДАННЫЕ ====================
+
+async def seed(engine: AsyncEngine) -> None:
+    from core.traffic import RAW, HOURLY, DAILY, SLOTS, pack, day_start, month_start
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.execute(text("DROP TABLE IF EXISTS search_index"))
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_search_indexes(conn)
+
+    now = datetime.now()
+    today = day_start(now)
+    users, ledger, subs, tickets, messages, traffic = [], [], [], [], [], []
+    for i in range(SEED_USERS):
+        telegram_id = FIRST_TELEGRAM_ID + i
+        users.append({"telegram_id": telegram_id, "username": f"user{i:05d}", "balance": Decimal("100")})
+        ledger += [
+            {"telegram_id": telegram_id, "amount": Decimal("10"), "reason": "topup",
+             "idempotency_key": f"seed:{telegram_id}:{n}"}
+            for n in range(3)
+        ]
+        for n in range(i % 3):
+            sub_uuid = f"audit-sub-{telegram_id}-{n}"
+            subs.append({
+                "telegram_id": telegram_id, "sub_uuid": sub_uuid, "username": f"sub{i:05d}_{n}",
+                "purchase_price": Decimal("50"), "renewal_price": Decimal("50"),
+                "expired_at": now + timedelta(days=(i % 60) - 20)
+            })
+            if i % 4 == 0:
+                for day in range(3):
+                    traffic.append({
+                        "sub_uuid": sub_uuid, "resolution": RAW, "period_start": today - timedelta(days=day),
+                        "data": pack([0] * SLOTS[RAW]), "last_total": 0
+                    })
+                traffic.append({
+                    "sub_uuid": sub_uuid, "resolution": HOURLY, "period_start": today - timedelta(days=2),
+                    "data": pack([0] * SLOTS[HOURLY]), "last_total": None
+                })
+                traffic.append({
+                    "sub_uuid": sub_uuid, "resolution": DAILY, "period_start": month_start(today),
+                    "data": pack([0] * SLOTS[DAILY]), "last_total": None
+                })
+        if i % 2 == 0:
+            tickets.append({
+                "id": len(tickets) + 1, "telegram_id": telegram_id,
+                "status": ("OPEN", "IN_PROGRESS", "CLOSED", "CLOSED")[(i // 2) % 4],
+                "priority": (i // 2) % 2, "assigned_to": AGENT_ID + i % 5 if (i // 2) % 4 else None,
+                "created_at": now - timedelta(minutes=i)
+            })
+            messages += [
+                {"ticket_id": len(tickets), "author_id": telegram_id, "text": f"message {n}"}
+                for n in range(3)
+            ]
+
+    plans = [
+        {"id": n + 1, "name": f"Plan {n + 1}", "price": Decimal(10 * (n + 1)),
+         "end_date": now + timedelta(days=30 * (n + 1))}
+        for n in range(5)
+    ]
+    promocodes = [
+        {"id": n + 1, "code": f"CODE{n}", "total_uses": 100, "remaining_uses": 50, "uses_per_user": 2,
+         "discount_value": Decimal("5"), "is_active": n % 10 != 0, "valid_until": now + timedelta(days=10)}
+        for n in range(200)
+    ]
+    used = [
+        {"telegram_id": FIRST_TELEGRAM_ID + n, "promo_id": n % 200 + 1, "use_number": 1}
+        for n in range(SEED_USERS // 2)
+    ]
+    orders = [
+        {"telegram_id": FIRST_TELEGRAM_ID + n, "plan_id": n % 5 + 1, "price": Decimal("10"),
+         "expires_at": now + timedelta(days=30),
+         "status": ("COMPLETED", "COMPLETED", "COMPLETED", "FAILED", "PENDING")[n % 5]}
+        for n in range(SEED_USERS // 2)
+    ]
+    outbox = [
+        {"sub_uuid": subs[n % len(subs)]["sub_uuid"], "operation": crud.OUTBOX_UPDATE_USER,
+         "payload": {"expire_at": now.isoformat()},
+         "status": crud.OUTBOX_PENDING if n % 10 == 0 else crud.OUTBOX_DONE,
+         "next_attempt_at": now - timedelta(seconds=n), "processed_at": None if n % 10 == 0 else now}
+        for n in range(2000)
+    ]
+    updates = [
+        {"update_id": n, "worker_id": n % 4, "processed_at": now - timedelta(minutes=n)}
+        for n in range(5000)
+    ]
+
+    async with engine.begin() as conn:
+        for model, rows in (
+            (User, users), (BalanceLedger, ledger), (PurchasedSubscription, subs),
+            (SubscriptionPlan, plans), (Promocode, promocodes), (UsedPromocode, used),
+            (SubscriptionOrder, orders), (SupportTicket, tickets), (TicketMessage, messages),
+            (RemnawaveOutbox, outbox), (TrafficSeries, traffic), (ProcessedUpdate, updates)
+        ):
+            await conn.execute(insert(model), rows)
+        if engine.dialect.name == "postgresql":
+            # id заданы явно - последовательности нужно сдвинуть для новых строк
+            for table in ("subscriptions_plan", "promocodes", "support_tickets"):
+                await conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+                ))
+        await conn.execute(text("ANALYZE"))
+
+
+# ==================== СЦЕНАРИИ ====================
+
+Scenario = Callable[[AsyncSession], Awaitable[Any]]
+
+
+async def _commit_after(session: AsyncSession, call: Awaitable[Any]) -> Any:
+    """Для функций, которые оставляют commit вызывающему"""
+    result = await call
+    await session.commit()
+    return result
+
+
+async def _paid_order(session: AsyncSession) -> Optional[SubscriptionOrder]:
+    plans = await crud.get_available_plans(session)
+    return await crud.create_paid_order(session, AUDIT_USER, plans[0])
+
+
+async def _order_lifecycle(session: AsyncSession) -> None:
+    order = await crud.create_paid_order(session, AUDIT_USER, await session.get(SubscriptionPlan, 1))
+    order = await crud.claim_order(session, order.id)
+    await crud.release_order(session, order.id, "panel timeout")
+    await crud.complete_order(session, order, f"audit-order-{order.id}", "audit_order")
+
+
+async def _failed_order(session: AsyncSession) -> None:
+    order = await crud.create_paid_order(session, AUDIT_USER, await session.get(SubscriptionPlan, 1))
+    await crud.fail_order(session, order, "panel error")
+
+
+async def _outbox_roundtrip(session: AsyncSession) -> None:
+    entries = await crud.claim_outbox_batch(session, 50, timedelta(minutes=2))
+    ids = [entry.id for entry in entries]
+    await crud.complete_outbox_entries(session, ids[:25])
+    await crud.retry_outbox_entries(session, ids[25:], "timeout", timedelta(seconds=5), 10)
+
+
+async def _ticket_workflow(session: AsyncSession) -> None:
+    ticket_id = await crud.claim_next_ticket(session, AGENT_ID)
+    await crud.add_ticket_message(session, ticket_id, AGENT_ID, "answer", is_staff=True)
+    await crud.close_ticket(session, ticket_id, AGENT_ID)
+
+
+async def _promocode_cache_rebuild(session: AsyncSession) -> None:
+    # Единственный запрос к промокодам вне crud: фильтр известных кодов
+    from core.promocodes import promocode_cache
+    await promocode_cache.rebuild(session)
+
+
+def _traffic_scenarios() -> List[Tuple[str, Scenario]]:
+    from core.traffic import RAW, DAILY, day_start, month_start
+
+    today = day_start(datetime.now())
+    some = [f"audit-sub-{FIRST_TELEGRAM_ID + i}-0" for i in range(4, 200, 4)]
+    return [
+        ("get_traffic_rows", lambda s: crud.get_traffic_rows(s, RAW, today, some)),
+        ("get_traffic_rows_all", lambda s: crud.get_traffic_rows(s, RAW, today - timedelta(days=1))),
+        ("get_traffic_periods", lambda s: crud.get_traffic_periods(s, RAW, today)),
+        ("get_subscription_traffic", lambda s: crud.get_subscription_traffic(
+            s, AUDIT_SUB, month_start(today), today - timedelta(days=2))),
+        ("delete_traffic_before", lambda s: crud.delete_traffic_before(s, DAILY, month_start(today))),
+    ]
+
+
+def scenarios() -> List[Tuple[str, Scenario]]:
+    now = datetime.now()
+    user, other = AUDIT_USER, AUDIT_USER + 3
+    return [
+        # Пользователи и баланс
+        ("create_user", lambda s: crud.create_user(s, NEW_USER, "audit_new")),
+        ("upsert_user", lambda s: _commit_after(s, crud.upsert_user(s, user, "audit_renamed"))),
+        ("get_user_by_telegram_id", lambda s: crud.get_user_by_telegram_id(s, user)),
+        ("get_existing_telegram_ids", lambda s: crud.get_existing_telegram_ids(s, [user, other, 1])),
+        ("get_balance", lambda s: crud.get_balance(s, user)),
+        ("update_user_balance", lambda s: crud.update_user_balance(s, user, Decimal("5"))),
+        ("add_balance_entry", lambda s: _commit_after(s, crud.add_balance_entry(s, user, Decimal("1"), "topup"))),
+        ("insert_balance_entries", lambda s: crud.insert_balance_entries(s, [
+            {"telegram_id": user, "amount": Decimal("3"), "reason": "topup", "idempotency_key": "audit:1"}
+        ])),
+        ("debit_balance", lambda s: _commit_after(s, crud.debit_balance(s, user, Decimal("1"), "purchase"))),
+        ("compact_balance_ledger", lambda s: crud.compact_balance_ledger(s, timedelta(0), 100)),
+        ("get_profile_summary", lambda s: crud.get_profile_summary(s, user)),
+        # Подписки
+        ("get_purchased_subscription_by_uuid", lambda s: crud.get_purchased_subscription_by_uuid(s, AUDIT_SUB)),
+        ("get_purchased_subscriptions", lambda s: crud.get_purchased_subscriptions(s, user)),
+        ("create_or_update_subscription", lambda s: crud.create_or_update_subscription(
+            s, user, AUDIT_SUB, "audit_sub", now + timedelta(days=30))),
+        ("update_subscription_transfer", lambda s: _commit_after(
+            s, crud.update_subscription_transfer(s, AUDIT_SUB, other))),
+        ("transfer_subscription_ownership", lambda s: crud.transfer_subscription_ownership(s, AUDIT_SUB, user)),
+        ("update_subscription_expiration", lambda s: crud.update_subscription_expiration(
+            s, AUDIT_SUB, now + timedelta(days=60))),
+        ("update_device_removal_count", lambda s: crud.update_device_removal_count(s, AUDIT_SUB)),
+        ("archive_expired_subscriptions", lambda s: crud.archive_expired_subscriptions(
+            s, now - timedelta(days=10), 100)),
+        ("get_subscription_history", lambda s: crud.get_subscription_history(s, FIRST_TELEGRAM_ID + 1)),
+        ("get_active_subscription_uuids", crud.get_active_subscription_uuids),
+        ("get_subscription_index", crud.get_subscription_index),
+        ("get_existing_subscription_uuids", lambda s: crud.get_existing_subscription_uuids(
+            s, [AUDIT_SUB, "missing-uuid"])),
+        # Outbox
+        ("outbox_roundtrip", _outbox_roundtrip),
+        ("count_outbox_by_status", crud.count_outbox_by_status),
+        ("get_pending_outbox_uuids", crud.get_pending_outbox_uuids),
+        ("lock_subscriptions_for_fix", lambda s: crud.lock_subscriptions_for_fix(s, [AUDIT_SUB, "missing-uuid"])),
+        ("delete_processed_outbox", lambda s: crud.delete_processed_outbox(s, now - timedelta(minutes=10))),
+        # Трафик
+        *_traffic_scenarios(),
+        # Заказы
+        ("create_paid_order", _paid_order),
+        ("order_lifecycle", _order_lifecycle),
+        ("fail_order", _failed_order),
+        ("get_unfinished_order_ids", lambda s: crud.get_unfinished_order_ids(s, now)),
+        # Промокоды
+        ("get_active_promocode", lambda s: crud.get_active_promocode(s, "CODE7")),
+        ("create_used_promocode", lambda s: _commit_after(s, crud.create_used_promocode(s, other, 8))),
+        ("redeem_promocode", lambda s: crud.redeem_promocode(s, user, "CODE7")),
+        ("promocode_cache_rebuild", _promocode_cache_rebuild),
+        # Дедупликация апдейтов
+        ("mark_update_processed", lambda s: crud.mark_update_processed(s, 10 ** 9, 1)),
+        ("purge_processed_updates", lambda s: crud.purge_processed_updates(s, now - timedelta(hours=48))),
+        # Поддержка
+        ("get_user_active_ticket", lambda s: crud.get_user_active_ticket(s, user)),
+        ("create_ticket", lambda s: crud.create_ticket(s, other, "help")),
+        ("ticket_workflow", _ticket_workflow),
+        ("get_ticket_inbox", lambda s: crud.get_ticket_inbox(s)),
+        ("get_ticket_inbox_assigned", lambda s: crud.get_ticket_inbox(s, crud.TICKET_IN_PROGRESS, AGENT_ID)),
+        ("count_tickets_by_status", crud.count_tickets_by_status),
+        ("count_tickets_by_status_assigned", lambda s: crud.count_tickets_by_status(s, AGENT_ID)),
+        ("get_ticket_by_id", lambda s: crud.get_ticket_by_id(s, 1)),
+        ("get_ticket_view", lambda s: crud.get_ticket_view(s, 1)),
+        # Поиск
+        ("search_users_substring", lambda s: search_users(s, "ser012")),
+        ("search_users_prefix", lambda s: search_users(s, "us")),
+        ("search_users_telegram_id", lambda s: search_users(s, str(user))),
+    ]
+
+
+async def run_scenarios(recorder: QueryRecorder) -> None:
+    for name, scenario in scenarios():
+        async with async_session() as session:
+            with recorder.scenario(name):
+                try:
+                    await scenario(session)
+                except Exception as e:
+                    recorder.errors.append(f"{name}: {str(e)}")
+
+
+# ==================== ПЛАНЫ ====================
+
+def _walk_pg_plan(node: Dict[str, Any], query: CapturedQuery, depth: int = 0) -> None:
+    line = node["Node Type"]
+    if "Relation Name" in node:
+        line += f" on {node['Relation Name']}"
+    if "Index Name" in node:
+        line += f" using {node['Index Name']}"
+        query.indexes.add(node["Index Name"])
+    query.plan.append("  " * depth + line)
+    if node["Node Type"] == "Seq Scan":
+        query.scans.append(node["Relation Name"])
+    for child in node.get("Plans", []):
+        _walk_pg_plan(child, query, depth + 1)
+
+
+async def explain(engine: AsyncEngine, queries: List[CapturedQuery]) -> None:
+    dialect = engine.dialect.name
+    async with engine.connect() as conn:
+        if dialect == "postgresql":
+            await conn.execute(text("SET enable_seqscan = off"))
+        for query in queries:
+            if dialect == "postgresql":
+                result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {query.sql}", query.params)
+                plan = result.scalar()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                _walk_pg_plan(plan[0]["Plan"], query)
+            else:
+                rows = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {query.sql}", query.params)).all()
+                depth = {0: -1}
+                for node_id, parent, _, detail in rows:
+                    depth[node_id] = depth.get(parent, -1) + 1
+                    query.plan.append("  " * depth[node_id] + detail)
+                    scan = _SQLITE_SCAN.match(detail)
+                    if scan and scan.group(1) != "CONSTANT":
+                        query.scans.append(scan.group(1))
+                    query.indexes.update(_SQLITE_INDEX.findall(detail))
+        await conn.rollback()
+
+
+# ==================== ИНДЕКСЫ ====================
+
+def _index_definitions(sync_conn) -> List[IndexDef]:
+    inspector = inspect(sync_conn)
+    indexes: List[IndexDef] = []
+    for table in Base.metadata.sorted_tables:
+        name = table.name
+        primary = inspector.get_pk_constraint(name)
+        if primary["constrained_columns"]:
+            indexes.append(IndexDef(
+                name, primary.get("name") or f"{name}_pkey", tuple(primary["constrained_columns"]), True, True
+            ))
+        seen = set()
+        for constraint in inspector.get_unique_constraints(name):
+            columns = tuple(constraint["column_names"])
+            constraint_name = constraint.get("name") or f"unique({', '.join(columns)})"
+            seen.add(constraint_name)
+            indexes.append(IndexDef(name, constraint_name, columns, True))
+        for index in inspector.get_indexes(name):
+            if index["name"] in seen or index.get("duplicates_constraint"):
+                continue
+            # GIN (pg_trgm) и индексы по выражениям с btree не сравниваются
+            if index.get("dialect_options", {}).get("postgresql_using", "btree") != "btree":
+                continue
+            if None in index["column_names"]:
+                continue
+            indexes.append(IndexDef(name, index["name"], tuple(index["column_names"]), bool(index["unique"])))
+    return indexes
+
+
+def redundant_indexes(indexes: List[IndexDef]) -> List[str]:
+    """Индексы, которые повторяют другой индекс или являются его префиксом"""
+    problems = []
+    for index in indexes:
+        if index.primary:
+            continue
+        for other in indexes:
+            if other is index or other.table != index.table:
+                continue
+            if index.columns == other.columns:
+                # Из двух одинаковых лишний неуникальный; из равных - второй по списку
+                if index.unique == other.unique and indexes.index(other) > indexes.index(index):
+                    continue
+                if index.unique and not other.unique:
+                    continue
+                problems.append(f"{index.table}.{index.name} {index.columns} duplicates {other.name}")
+                break
+            if not index.unique and other.columns[:len(index.columns)] == index.columns:
+                problems.append(f"{index.table}.{index.name} {index.columns} is a prefix of {other.name}")
+                break
+    return problems
+
+
+def unused_indexes(indexes: List[IndexDef], queries: List[CapturedQuery]) -> List[str]:
+    used = set().union(*(query.indexes for query in queries)) if queries else set()
+    return [
+        f"{index.table}.{index.name} {index.columns}"
+        for index in indexes
+        if not index.unique and index.name not in used
+    ]
+
+
+# ==================== СРАВНЕНИЕ С БАЗОВЫМИ ПЛАНАМИ ====================
+
+def load_baseline(dialect: str) -> Dict[str, Dict[str, Any]]:
+    if not BASELINE_PATH.exists():
+        return {}
+    return json.loads(BASELINE_PATH.read_text(encoding="utf-8")).get(dialect, {})
+
+
+def save_baseline(dialect: str, queries: List[CapturedQuery]) -> None:
+    data = json.loads(BASELINE_PATH.read_text(encoding="utf-8")) if BASELINE_PATH.exists() else {}
+    data[dialect] = {
+        query.key: {"sql": query.sql, "plan": query.plan, "scans": sorted(set(query.scans))}
+        for query in queries
+    }
+    BASELINE_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def compare(
+    queries: List[CapturedQuery],
+    baseline: Dict[str, Dict[str, Any]]
+) -> Tuple[List[str], List[str]]:
+    """(регрессии, изменения): регрессия - скан таблицы, которого не было в базовом плане"""
+    regressions, changes = [], []
+    for query in queries:
+        known = baseline.get(query.key)
+        accepted = set(known["scans"]) if known else set()
+        new_scans = sorted(set(query.scans) - accepted)
+        if new_scans:
+            regressions.append(f"{query.key}: full scan of {', '.join(new_scans)}\n    {query.sql}")
+        elif known is None:
+            changes.append(f"{query.key}: new query")
+        elif known["sql"] != query.sql:
+            changes.append(f"{query.key}: SQL changed")
+        elif known["plan"] != query.plan:
+            changes.append(f"{query.key}: plan changed")
+    seen = {query.key for query in queries}
+    changes += [f"{key}: query no longer executed" for key in baseline if key not in seen]
+    return regressions, changes
+
+
+async def audit(update_baseline: bool, verbose: bool, engine: AsyncEngine) -> bool:
+    dialect = engine.dialect.name
+    await seed(engine)
+
+    recorder = QueryRecorder()
+    recorder.attach(engine)
+    await run_scenarios(recorder)
+    queries = list(recorder.queries.values())
+    await explain(engine, queries)
+
+    async with engine.connect() as conn:
+        indexes = await conn.run_sync(_index_definitions)
+
+    if verbose:
+        for query in queries:
+            print(f"{query.key}: {query.sql}")
+            for line in query.plan:
+                print(f"    {line}")
+
+    redundant = redundant_indexes(indexes)
+    unused = unused_indexes(indexes, queries)
+    scanning = sorted({f"{query.key} ({', '.join(sorted(set(query.scans)))})" for query in queries if query.scans})
+
+    print(f"Dialect: {dialect}, {len(queries)} queries, {len(indexes)} indexes")
+    for title, lines in (
+        ("Scenario errors", recorder.errors),
+        ("Redundant indexes", redundant),
+        ("Indexes not used by any plan", unused),
+        ("Queries with full scans", scanning),
+    ):
+        print(f"\n{title}: {len(lines)}")
+        for line in lines:
+            print(f"  {line}")
+
+    if update_baseline:
+        save_baseline(dialect, queries)
+        print(f"\nBaseline for {dialect} saved to {BASELINE_PATH}")
+        return not recorder.errors and not redundant
+
+    regressions, changes = compare(queries, load_baseline(dialect))
+    print(f"\nPlan changes: {len(changes)}")
+    for line in changes:
+        print(f"  {line}")
+    print(f"\nPlan regressions: {len(regressions)}")
+    for line in regressions:
+        print(f"  {line}")
+    return not recorder.errors and not redundant and not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="DATABASE_URL тестовой базы (по умолчанию временная SQLite)")
+    parser.add_argument("--update-baseline", action="store_true", help="записать текущие планы как базовые")
+    parser.add_argument("--verbose", action="store_true", help="напечатать планы всех запросов")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'audit.db')}"
+    engine = init_engine(url)
+
+    async def run() -> bool:
+        try:
+            return await audit(args.update_baseline, args.verbose, engine)
+        finally:
+            await dispose_engine()
+
+    raise SystemExit(0 if asyncio.run(run()) else 1)
+
+
+if __name__ == "__main__":
+    main()
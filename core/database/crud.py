@@ -1,14 +1,48 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_
-from sqlalchemy.orm import selectinload
-from core.database.model import User, PurchasedSubscription, SubscriptionPlan, Promocode, UsedPromocode
-from typing import Optional, List, Union, Dict, Any
+from sqlalchemy import select, insert, update, delete, and_, or_, func, bindparam, literal_column
+from sqlalchemy import text as sql_text
+from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from core.database.model import (
+    User, PurchasedSubscription, ArchivedSubscription, SubscriptionPlan, Promocode, UsedPromocode,
+    ProcessedUpdate, SupportTicket, TicketMessage, BalanceLedger, SubscriptionOrder,
+    RemnawaveOutbox, TrafficSeries
+)
+from core.database.database import read_only, KEEP_REPLICA
+from typing import Optional, List, Union, Dict, Any, Tuple
+from enum import Enum
 from datetime import datetime, timedelta
 from decimal import Decimal
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Функции ниже при ошибке (а часть - и при отказе) делают session.rollback().
+# Откат сбрасывает все объекты сессии, в том числе загруженные вызывающим
+# (data["user"] из RoleMiddleware): после неудачного вызова их атрибуты
+# не читаются - в асинхронной сессии повторная загрузка падает с MissingGreenlet.
+
+# Самые частые запросы собраны один раз, значения передаются параметрами:
+# select() и ключ кеша компиляции не строятся заново на каждый вызов,
+# а одинаковый SQL asyncpg берет из кеша подготовленных выражений
+_USER_BY_TELEGRAM_ID = select(User).where(User.telegram_id == bindparam("telegram_id"))
+_BALANCE_BY_TELEGRAM_ID = select(User.current_balance).where(User.telegram_id == bindparam("telegram_id"))
+_SUBSCRIPTION_BY_UUID = select(PurchasedSubscription).where(PurchasedSubscription.sub_uuid == bindparam("sub_uuid"))
+_SUBSCRIPTIONS_BY_TELEGRAM_ID = (
+    select(PurchasedSubscription)
+    .where(PurchasedSubscription.telegram_id == bindparam("telegram_id"))
+    .order_by(PurchasedSubscription.expired_at.desc())
+)
+
+def _insert(session: AsyncSession, model):
+    """INSERT с поддержкой ON CONFLICT для диалекта текущей БД (PostgreSQL / SQLite)"""
+    if session.get_bind().dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
 # ==================== USER OPERATIONS ====================
 
 async def create_user(
@@ -36,16 +70,39 @@ async def create_user(
         await session.rollback()
         return None
 
+async def upsert_user(
+    session: AsyncSession,
+    telegram_id: int,
+    username: Optional[str] = None
+) -> Optional[User]:
+    """
+    Пользователь по Telegram ID за один запрос: INSERT ... ON CONFLICT (telegram_id)
+    DO UPDATE ... RETURNING. Новый пользователь создается, у существующего
+    обновляется username. Одновременные первые апдейты не конфликтуют. Не коммитит
+    """
+    try:
+        stmt = _insert(session, User).values(telegram_id=telegram_id, username=username)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={"username": stmt.excluded.username}
+        ).returning(User)
+        # Запись служебная: сессия может дальше читать с реплики
+        result = await session.execute(
+            stmt.execution_options(populate_existing=True, **{KEEP_REPLICA: True})
+        )
+        return result.scalars().first()
+    except Exception as e:
+        logger.error(f"Error upserting user {telegram_id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return None
+
 async def get_user_by_telegram_id(
     session: AsyncSession,
     telegram_id: int
 ) -> Optional[User]:
     """Get user by Telegram ID"""
     try:
-        result = await session.execute(
-            select(User)
-            .where(User.telegram_id == telegram_id)
-        )
+        result = await session.execute(_USER_BY_TELEGRAM_ID, {"telegram_id": telegram_id})
         return result.scalars().first()
     except Exception as e:
         logger.error(f"Error getting user {telegram_id}: {str(e)}", exc_info=True)
@@ -54,21 +111,224 @@ async def get_user_by_telegram_id(
 async def update_user_balance(
     session: AsyncSession,
     telegram_id: int,
-    amount: Decimal
+    amount: Decimal,
+    reason: str = "adjustment",
+    reference: Optional[str] = None
 ) -> bool:
-    """Update user balance"""
+    """Update user balance (запись в журнал, строка users не изменяется)"""
+    entry = await add_balance_entry(session, telegram_id, amount, reason, reference)
+    return entry is not None
+
+# ==================== BALANCE LEDGER ====================
+
+async def add_balance_entry(
+    session: AsyncSession,
+    telegram_id: int,
+    amount: Decimal,
+    reason: str,
+    reference: Optional[str] = None
+) -> Optional[BalanceLedger]:
+    """Пополнение/корректировка баланса: одна вставка в журнал (commit - на вызывающем)"""
     try:
-        user = await get_user_by_telegram_id(session, telegram_id)
-        if not user:
-            return False
-            
-        user.balance += amount
+        entry = BalanceLedger(
+            telegram_id=telegram_id,
+            amount=amount,
+            reason=reason,
+            reference=reference
+        )
+        session.add(entry)
         await session.flush()
-        return True
+        return entry
     except Exception as e:
-        logger.error(f"Error updating balance for {telegram_id}: {str(e)}", exc_info=True)
+        logger.error(f"Error adding balance entry for {telegram_id}: {str(e)}", exc_info=True)
         await session.rollback()
-        return False
+        return None
+
+async def insert_balance_entries(
+    session: AsyncSession,
+    entries: List[Dict[str, Any]]
+) -> Optional[set]:
+    """
+    Пакетная вставка записей журнала с idempotency_key одной транзакцией.
+    Дубликаты пропускаются по уникальному индексу (ON CONFLICT DO NOTHING).
+    Возвращает множество реально вставленных ключей или None при ошибке
+    """
+    try:
+        result = await session.execute(
+            _insert(session, BalanceLedger)
+            .values(entries)
+            .on_conflict_do_nothing(index_elements=["idempotency_key"])
+            .returning(BalanceLedger.idempotency_key)
+        )
+        inserted = set(result.scalars().all())
+        await session.commit()
+        return inserted
+    except Exception as e:
+        logger.error(f"Error inserting {len(entries)} balance entries: {str(e)}", exc_info=True)
+        await session.rollback()
+        return None
+
+async def get_existing_telegram_ids(
+    session: AsyncSession,
+    telegram_ids: List[int]
+) -> Optional[set]:
+    """Какие из переданных telegram_id есть в users (None - ошибка БД)"""
+    try:
+        result = await session.execute(
+            select(User.telegram_id)
+            .where(User.telegram_id.in_(telegram_ids))
+        )
+        return set(result.scalars().all())
+    except Exception as e:
+        logger.error(f"Error checking users: {str(e)}", exc_info=True)
+        return None
+
+async def get_balance(
+    session: AsyncSession,
+    telegram_id: int
+) -> Decimal:
+    """Текущий баланс: снимок users.balance + записи журнала после курсора"""
+    try:
+        balance = await session.scalar(_BALANCE_BY_TELEGRAM_ID, {"telegram_id": telegram_id})
+        return Decimal(balance or 0)
+    except Exception as e:
+        logger.error(f"Error getting balance for {telegram_id}: {str(e)}", exc_info=True)
+        return Decimal('0')
+
+async def _lock_balance(session: AsyncSession, telegram_id: int) -> None:
+    """
+    Сериализация списаний одного пользователя до конца транзакции.
+    На PostgreSQL - advisory lock по telegram_id: строка users не блокируется,
+    пополнения и чтения идут параллельно. В SQLite блокировка на всю базу,
+    поэтому достаточно сразу взять блокировку записи пустым UPDATE
+    (иначе транзакция начнется только на INSERT, после чтения остатка).
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        await session.execute(select(func.pg_advisory_xact_lock(telegram_id)))
+    else:
+        await session.execute(
+            update(User)
+            .where(User.telegram_id == telegram_id)
+            .values(balance_ledger_id=User.balance_ledger_id)
+            .execution_options(synchronize_session=False)
+        )
+
+async def debit_balance(
+    session: AsyncSession,
+    telegram_id: int,
+    amount: Decimal,
+    reason: str,
+    reference: Optional[str] = None
+) -> Optional[BalanceLedger]:
+    """
+    Списание с проверкой остатка. Возвращает запись журнала или None,
+    если средств недостаточно. Commit - на вызывающем (вместе с оплачиваемым изменением),
+    откат при None - тоже (он снимает блокировку баланса); при ошибке откатывает сама
+    """
+    try:
+        await _lock_balance(session, telegram_id)
+        balance = await get_balance(session, telegram_id)
+        if balance < amount:
+            return None
+        return await add_balance_entry(session, telegram_id, -amount, reason, reference)
+    except Exception as e:
+        logger.error(f"Error debiting balance for {telegram_id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return None
+
+# Транзакции, которые начались раньше :moment и могут держать незафиксированные
+# записи: уже пишут (есть xid) или выполняют запрос (nextval до вставки строки)
+_PG_OLDER_WRITERS = sql_text("""
+    SELECT count(*) FROM pg_stat_activity
+    WHERE datname = current_database()
+      AND pid <> pg_backend_pid()
+      AND xact_start < :moment
+      AND (backend_xid IS NOT NULL OR state = 'active')
+""")
+
+async def _wait_for_older_writers(session: AsyncSession, moment: datetime, timeout: float) -> bool:
+    """
+    Ожидание завершения транзакций PostgreSQL, начатых до moment.
+    Каждая проверка - отдельная транзакция: pg_stat_activity внутри транзакции не обновляется
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        running = await session.scalar(_PG_OLDER_WRITERS, {"moment": moment})
+        await session.rollback()
+        if not running:
+            return True
+        if loop.time() >= deadline:
+            return False
+        await asyncio.sleep(0.05)
+
+async def compact_balance_ledger(
+    session: AsyncSession,
+    lag: timedelta,
+    batch_size: int = 1000,
+    settle_timeout: float = 5.0
+) -> int:
+    """
+    Перенос записей журнала в снимок users.balance.
+
+    id выдаются до COMMIT, поэтому медленная транзакция может зафиксировать запись
+    с id меньше уже свернутых - такая запись выпала бы и из снимка, и из текущего
+    баланса. Поэтому граница (high_water) - максимальный зафиксированный id, а на
+    PostgreSQL свертка начинается только после завершения всех пишущих транзакций,
+    начатых до чтения границы: меньшие id могли выдать только они. Если они не
+    завершились за settle_timeout сек, проход откладывается. В SQLite писатель один,
+    и незафиксированная запись всегда получает id больше зафиксированных.
+    Дополнительно сворачиваются только записи старше lag.
+    Возвращает количество обновленных пользователей.
+    """
+    try:
+        high_water = await session.scalar(
+            select(func.max(BalanceLedger.id))
+            .where(BalanceLedger.created_at < datetime.now() - lag)
+        )
+        if high_water is None:
+            return 0
+
+        if session.get_bind().dialect.name == "postgresql":
+            read_at = await session.scalar(select(func.clock_timestamp()))
+            if not await _wait_for_older_writers(session, read_at, settle_timeout):
+                logger.warning(
+                    f"Balance ledger compaction postponed: transactions started before "
+                    f"{read_at} are still open after {settle_timeout}s"
+                )
+                return 0
+
+        pending = (
+            select(BalanceLedger.telegram_id)
+            .join(User, User.telegram_id == BalanceLedger.telegram_id)
+            .where(BalanceLedger.id > User.balance_ledger_id)
+            .where(BalanceLedger.id <= high_water)
+            .distinct()
+            .limit(batch_size)
+        )
+        telegram_ids = list((await session.execute(pending)).scalars().all())
+        if not telegram_ids:
+            return 0
+
+        delta = (
+            select(func.coalesce(func.sum(BalanceLedger.amount), 0))
+            .where(BalanceLedger.telegram_id == User.telegram_id)
+            .where(BalanceLedger.id > User.balance_ledger_id)
+            .where(BalanceLedger.id <= high_water)
+            .scalar_subquery()
+        )
+        await session.execute(
+            update(User)
+            .where(User.telegram_id.in_(telegram_ids))
+            .values(balance=User.balance + delta, balance_ledger_id=high_water)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return len(telegram_ids)
+    except Exception as e:
+        logger.error(f"Error compacting balance ledger: {str(e)}", exc_info=True)
+        await session.rollback()
+        return 0
 
 # ==================== SUBSCRIPTION OPERATIONS ====================
 
@@ -77,7 +337,7 @@ async def update_subscription_transfer(
     sub_uuid: str,
     new_telegram_id: int
 ) -> bool:
-    """Обновление владельца подписки при передаче"""
+    """Обновление владельца подписки при передаче (+ запись в outbox для панели)"""
     try:
         result = await session.execute(
             update(PurchasedSubscription)
@@ -87,8 +347,13 @@ async def update_subscription_transfer(
                 last_transfer_time=datetime.now()
             )
         )
+        if not result.rowcount:
+            await session.rollback()
+            return False
+        # Владелец в панели обновится фоном, но в той же транзакции
+        add_outbox_entry(session, sub_uuid, OUTBOX_UPDATE_USER, {"telegram_id": new_telegram_id})
         await session.commit()
-        return result.rowcount > 0
+        return True
     except Exception as e:
         logger.error(f"Error transferring subscription {sub_uuid}: {str(e)}", exc_info=True)
         await session.rollback()
@@ -142,26 +407,20 @@ async def get_purchased_subscription_by_uuid(
 ) -> Optional[PurchasedSubscription]:
     """Get subscription by UUID"""
     try:
-        result = await session.execute(
-            select(PurchasedSubscription)
-            .where(PurchasedSubscription.sub_uuid == sub_uuid)
-        )
+        result = await session.execute(_SUBSCRIPTION_BY_UUID, {"sub_uuid": sub_uuid})
         return result.scalars().first()
     except Exception as e:
         logger.error(f"Error getting subscription {sub_uuid}: {str(e)}", exc_info=True)
         return None
 
+@read_only
 async def get_purchased_subscriptions(
     session: AsyncSession, 
     telegram_id: int
 ) -> List[PurchasedSubscription]:
     """Get all user subscriptions"""
     try:
-        result = await session.execute(
-            select(PurchasedSubscription)
-            .where(PurchasedSubscription.telegram_id == telegram_id)
-            .order_by(PurchasedSubscription.expired_at.desc())
-        )
+        result = await session.execute(_SUBSCRIPTIONS_BY_TELEGRAM_ID, {"telegram_id": telegram_id})
         return list(result.scalars().all())
     except Exception as e:
         logger.error(f"Error getting subscriptions for {telegram_id}: {str(e)}", exc_info=True)
@@ -232,6 +491,584 @@ async def update_device_removal_count(
         await session.rollback()
         return False
 
+# ==================== SUBSCRIPTION ARCHIVE ====================
+
+async def archive_expired_subscriptions(
+    session: AsyncSession,
+    expired_before: datetime,
+    batch_size: int = 500
+) -> int:
+    """
+    Перенос одной пачки подписок, истекших до expired_before, в archived_subscriptions
+    одной короткой транзакцией. Пачка выбирается и удаляется одним DELETE ... RETURNING:
+    подписку, которую продлевают в этот момент, не перенести (SKIP LOCKED в PostgreSQL,
+    единственный писатель в SQLite). Возвращает число перенесенных подписок
+    """
+    try:
+        batch = (
+            select(PurchasedSubscription.id)
+            .where(PurchasedSubscription.expired_at < expired_before)
+            .order_by(PurchasedSubscription.expired_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        rows = (await session.execute(
+            delete(PurchasedSubscription)
+            .where(PurchasedSubscription.id.in_(batch))
+            .returning(*PurchasedSubscription.__table__.columns)
+            .execution_options(synchronize_session=False)
+        )).mappings().all()
+        if not rows:
+            await session.rollback()
+            return 0
+
+        await session.execute(insert(ArchivedSubscription), [dict(row) for row in rows])
+        await session.commit()
+        return len(rows)
+    except Exception as e:
+        logger.error(f"Error archiving subscriptions expired before {expired_before}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return 0
+
+@read_only
+async def get_subscription_history(
+    session: AsyncSession,
+    telegram_id: int,
+    limit: int = 20
+) -> List[ArchivedSubscription]:
+    """Архивные подписки пользователя, последние по дате окончания"""
+    try:
+        result = await session.execute(
+            select(ArchivedSubscription)
+            .where(ArchivedSubscription.telegram_id == telegram_id)
+            .order_by(ArchivedSubscription.expired_at.desc())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+    except Exception as e:
+        logger.error(f"Error getting subscription history for {telegram_id}: {str(e)}", exc_info=True)
+        return []
+
+# ==================== REMNAWAVE OUTBOX ====================
+
+OUTBOX_PENDING = "PENDING"
+OUTBOX_DONE = "DONE"
+OUTBOX_FAILED = "FAILED"
+
+OUTBOX_REMOVE_DEVICE = "remove_device"
+OUTBOX_UPDATE_USER = "update_user"
+
+def add_outbox_entry(
+    session: AsyncSession,
+    sub_uuid: str,
+    operation: str,
+    payload: Dict[str, Any]
+) -> RemnawaveOutbox:
+    """Изменение для панели в текущей транзакции (commit - на вызывающем)"""
+    entry = RemnawaveOutbox(sub_uuid=sub_uuid, operation=operation, payload=payload)
+    session.add(entry)
+    return entry
+
+async def claim_outbox_batch(
+    session: AsyncSession,
+    limit: int,
+    lease: timedelta
+) -> List[RemnawaveOutbox]:
+    """
+    Взять пачку готовых к отправке записей. next_attempt_at сдвигается на lease:
+    если диспетчер упадет посреди пачки, записи вернутся в работу после аренды,
+    а второй экземпляр их не возьмет (SKIP LOCKED)
+    """
+    try:
+        now = datetime.now()
+        entries = (await session.execute(
+            select(RemnawaveOutbox)
+            .where(RemnawaveOutbox.status == OUTBOX_PENDING)
+            .where(RemnawaveOutbox.next_attempt_at <= now)
+            .order_by(RemnawaveOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )).scalars().all()
+        if not entries:
+            await session.rollback()
+            return []
+
+        await session.execute(
+            update(RemnawaveOutbox)
+            .where(RemnawaveOutbox.id.in_([entry.id for entry in entries]))
+            .values(next_attempt_at=now + lease)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return list(entries)
+    except Exception as e:
+        logger.error(f"Error claiming outbox batch: {str(e)}", exc_info=True)
+        await session.rollback()
+        return []
+
+async def complete_outbox_entries(
+    session: AsyncSession,
+    entry_ids: List[int]
+) -> bool:
+    try:
+        await session.execute(
+            update(RemnawaveOutbox)
+            .where(RemnawaveOutbox.id.in_(entry_ids))
+            .values(status=OUTBOX_DONE, processed_at=datetime.now(), last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error completing outbox entries {entry_ids}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return False
+
+async def retry_outbox_entries(
+    session: AsyncSession,
+    entry_ids: List[int],
+    error: str,
+    delay: timedelta,
+    max_attempts: int
+) -> bool:
+    """Неудачная попытка: отложить на delay, после max_attempts - FAILED"""
+    try:
+        now = datetime.now()
+        await session.execute(
+            update(RemnawaveOutbox)
+            .where(RemnawaveOutbox.id.in_(entry_ids))
+            .values(
+                attempts=RemnawaveOutbox.attempts + 1,
+                last_error=error[:255],
+                next_attempt_at=now + delay
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(
+            update(RemnawaveOutbox)
+            .where(RemnawaveOutbox.id.in_(entry_ids))
+            .where(RemnawaveOutbox.attempts >= max_attempts)
+            .values(status=OUTBOX_FAILED, processed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error rescheduling outbox entries {entry_ids}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return False
+
+async def count_outbox_by_status(session: AsyncSession) -> Dict[str, int]:
+    try:
+        result = await session.execute(
+            select(RemnawaveOutbox.status, func.count())
+            .group_by(RemnawaveOutbox.status)
+        )
+        return {status: count for status, count in result.all()}
+    except Exception as e:
+        logger.error(f"Error counting outbox entries: {str(e)}", exc_info=True)
+        return {}
+
+async def delete_processed_outbox(
+    session: AsyncSession,
+    older_than: datetime
+) -> int:
+    """Чистка примененных записей (FAILED остаются для разбора)"""
+    try:
+        result = await session.execute(
+            delete(RemnawaveOutbox)
+            .where(RemnawaveOutbox.status == OUTBOX_DONE)
+            .where(RemnawaveOutbox.processed_at < older_than)
+        )
+        await session.commit()
+        return result.rowcount
+    except Exception as e:
+        logger.error(f"Error cleaning outbox: {str(e)}", exc_info=True)
+        await session.rollback()
+        return 0
+
+# ==================== TRAFFIC SERIES ====================
+
+async def get_active_subscription_uuids(session: AsyncSession) -> set:
+    try:
+        result = await session.execute(
+            select(PurchasedSubscription.sub_uuid)
+            .where(PurchasedSubscription.expired_at > datetime.now())
+        )
+        return set(result.scalars().all())
+    except Exception as e:
+        logger.error(f"Error getting active subscription uuids: {str(e)}", exc_info=True)
+        return set()
+
+async def get_traffic_rows(
+    session: AsyncSession,
+    resolution: str,
+    period_start: datetime,
+    sub_uuids: Optional[List[str]] = None
+) -> Dict[str, TrafficSeries]:
+    """Строки одного периода по UUID подписки (все или только sub_uuids)"""
+    try:
+        query = (
+            select(TrafficSeries)
+            .where(TrafficSeries.resolution == resolution)
+            .where(TrafficSeries.period_start == period_start)
+        )
+        rows: Dict[str, TrafficSeries] = {}
+        if sub_uuids is None:
+            for row in (await session.execute(query)).scalars():
+                rows[row.sub_uuid] = row
+            return rows
+        # IN частями, чтобы не упереться в лимит параметров
+        for i in range(0, len(sub_uuids), 1000):
+            chunk = sub_uuids[i:i + 1000]
+            for row in (await session.execute(query.where(TrafficSeries.sub_uuid.in_(chunk)))).scalars():
+                rows[row.sub_uuid] = row
+        return rows
+    except Exception as e:
+        logger.error(f"Error loading traffic rows {resolution}@{period_start}: {str(e)}", exc_info=True)
+        return {}
+
+async def get_traffic_periods(
+    session: AsyncSession,
+    resolution: str,
+    before: datetime
+) -> List[datetime]:
+    """Периоды, за которые есть строки данного разрешения (для прореживания)"""
+    try:
+        result = await session.execute(
+            select(TrafficSeries.period_start)
+            .where(TrafficSeries.resolution == resolution)
+            .where(TrafficSeries.period_start < before)
+            .distinct()
+            .order_by(TrafficSeries.period_start)
+        )
+        return list(result.scalars().all())
+    except Exception as e:
+        logger.error(f"Error listing traffic periods: {str(e)}", exc_info=True)
+        return []
+
+@read_only
+async def get_subscription_traffic(
+    session: AsyncSession,
+    sub_uuid: str,
+    monthly_since: datetime,
+    recent_since: datetime
+) -> List[TrafficSeries]:
+    """
+    Данные для графика: суточные (1d) строки с monthly_since и последние
+    5m/1h строки с recent_since (сутки, еще не свернутые в 1d). Сырые данные
+    за весь период не читаются
+    """
+    try:
+        result = await session.execute(
+            select(TrafficSeries)
+            .where(TrafficSeries.sub_uuid == sub_uuid)
+            .where(
+                or_(
+                    and_(TrafficSeries.resolution == "1d", TrafficSeries.period_start >= monthly_since),
+                    and_(TrafficSeries.resolution.in_(["5m", "1h"]), TrafficSeries.period_start >= recent_since)
+                )
+            )
+            .order_by(TrafficSeries.period_start)
+        )
+        return list(result.scalars().all())
+    except Exception as e:
+        logger.error(f"Error loading traffic of {sub_uuid}: {str(e)}", exc_info=True)
+        return []
+
+async def delete_traffic_before(
+    session: AsyncSession,
+    resolution: str,
+    before: datetime
+) -> int:
+    try:
+        result = await session.execute(
+            delete(TrafficSeries)
+            .where(TrafficSeries.resolution == resolution)
+            .where(TrafficSeries.period_start < before)
+        )
+        await session.commit()
+        return result.rowcount
+    except Exception as e:
+        logger.error(f"Error deleting {resolution} traffic before {before}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return 0
+
+# ==================== RECONCILIATION ====================
+
+async def get_subscription_index(session: AsyncSession) -> Dict[str, Tuple[int, datetime]]:
+    """sub_uuid -> (telegram_id, expired_at) для всех подписок, без загрузки ORM-объектов"""
+    try:
+        result = await session.execute(
+            select(
+                PurchasedSubscription.sub_uuid,
+                PurchasedSubscription.telegram_id,
+                PurchasedSubscription.expired_at
+            )
+        )
+        return {sub_uuid: (telegram_id, expired_at) for sub_uuid, telegram_id, expired_at in result.all()}
+    except Exception as e:
+        logger.error(f"Error loading subscription index: {str(e)}", exc_info=True)
+        return {}
+
+async def get_existing_subscription_uuids(
+    session: AsyncSession,
+    sub_uuids: List[str]
+) -> set:
+    """Какие из переданных UUID есть в БД (среди действующих или архивных подписок)"""
+    try:
+        existing = set()
+        for model in (PurchasedSubscription, ArchivedSubscription):
+            for i in range(0, len(sub_uuids), 1000):
+                result = await session.execute(
+                    select(model.sub_uuid)
+                    .where(model.sub_uuid.in_(sub_uuids[i:i + 1000]))
+                )
+                existing.update(result.scalars().all())
+        return existing
+    except Exception as e:
+        logger.error(f"Error checking subscription uuids: {str(e)}", exc_info=True)
+        return set()
+
+async def get_pending_outbox_uuids(session: AsyncSession) -> set:
+    """Подписки с неприменёнными изменениями: их расхождение с панелью ожидаемо"""
+    try:
+        result = await session.execute(
+            select(RemnawaveOutbox.sub_uuid)
+            .where(RemnawaveOutbox.status == OUTBOX_PENDING)
+            .distinct()
+        )
+        return set(result.scalars().all())
+    except Exception as e:
+        logger.error(f"Error loading pending outbox uuids: {str(e)}", exc_info=True)
+        return set()
+
+async def lock_subscriptions_for_fix(
+    session: AsyncSession,
+    sub_uuids: List[str]
+) -> Optional[Tuple[Dict[str, Tuple[int, datetime]], set]]:
+    """
+    Текущие (telegram_id, expired_at) переданных подписок и те из них, что ждут
+    применения в outbox. Строки подписок блокируются до конца транзакции:
+    изменение, начатое раньше, успевает записать свою запись outbox, а новые ждут.
+    None - ошибка БД (исправлять нельзя)
+    """
+    try:
+        current = {}
+        pending = set()
+        for i in range(0, len(sub_uuids), 1000):
+            chunk = sub_uuids[i:i + 1000]
+            result = await session.execute(
+                select(
+                    PurchasedSubscription.sub_uuid,
+                    PurchasedSubscription.telegram_id,
+                    PurchasedSubscription.expired_at
+                )
+                .where(PurchasedSubscription.sub_uuid.in_(chunk))
+                .with_for_update()
+            )
+            current.update({sub_uuid: (telegram_id, expired_at) for sub_uuid, telegram_id, expired_at in result.all()})
+            result = await session.execute(
+                select(RemnawaveOutbox.sub_uuid)
+                .where(
+                    RemnawaveOutbox.status == OUTBOX_PENDING,
+                    RemnawaveOutbox.sub_uuid.in_(chunk)
+                )
+                .distinct()
+            )
+            pending.update(result.scalars().all())
+        return current, pending
+    except Exception as e:
+        logger.error(f"Error locking {len(sub_uuids)} subscriptions for fix: {str(e)}", exc_info=True)
+        await session.rollback()
+        return None
+
+# ==================== PLANS & ORDERS ====================
+
+ORDER_PENDING = "PENDING"
+ORDER_PROVISIONING = "PROVISIONING"
+ORDER_COMPLETED = "COMPLETED"
+ORDER_FAILED = "FAILED"
+
+async def get_available_plans(
+    session: AsyncSession
+) -> List[SubscriptionPlan]:
+    """Тарифы, доступные для покупки"""
+    try:
+        result = await session.execute(
+            select(SubscriptionPlan)
+            .where(SubscriptionPlan.end_date > datetime.now())
+            .order_by(SubscriptionPlan.price)
+        )
+        return list(result.scalars().all())
+    except Exception as e:
+        logger.error(f"Error getting subscription plans: {str(e)}", exc_info=True)
+        return []
+
+async def create_paid_order(
+    session: AsyncSession,
+    telegram_id: int,
+    plan: SubscriptionPlan,
+    chat_id: Optional[int] = None,
+    message_id: Optional[int] = None
+) -> Optional[SubscriptionOrder]:
+    """
+    Заказ + списание стоимости одной транзакцией.
+    None - недостаточно средств или ошибка (заказ при этом не создается,
+    транзакция откатывается вместе с объектами сессии вызывающего)
+    """
+    try:
+        order = SubscriptionOrder(
+            telegram_id=telegram_id,
+            plan_id=plan.id,
+            price=plan.price,
+            expires_at=plan.end_date,
+            chat_id=chat_id,
+            message_id=message_id
+        )
+        session.add(order)
+        await session.flush()
+
+        debit = await debit_balance(session, telegram_id, plan.price, reason="purchase", reference=f"order:{order.id}")
+        if debit is None:
+            await session.rollback()
+            return None
+
+        await session.commit()
+        return order
+    except Exception as e:
+        logger.error(f"Error creating order for {telegram_id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return None
+
+async def claim_order(
+    session: AsyncSession,
+    order_id: int
+) -> Optional[SubscriptionOrder]:
+    """Атомарно перевести заказ PENDING -> PROVISIONING (обработает только один исполнитель)"""
+    try:
+        result = await session.execute(
+            update(SubscriptionOrder)
+            .where(SubscriptionOrder.id == order_id)
+            .where(SubscriptionOrder.status == ORDER_PENDING)
+            .values(status=ORDER_PROVISIONING, attempts=SubscriptionOrder.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        if not result.rowcount:
+            return None
+        return await session.get(SubscriptionOrder, order_id, populate_existing=True)
+    except Exception as e:
+        logger.error(f"Error claiming order {order_id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return None
+
+async def complete_order(
+    session: AsyncSession,
+    order: SubscriptionOrder,
+    sub_uuid: str,
+    username: str
+) -> bool:
+    """Подписка создана в панели: локальная запись PurchasedSubscription + статус заказа"""
+    try:
+        session.add(PurchasedSubscription(
+            telegram_id=order.telegram_id,
+            sub_uuid=sub_uuid,
+            username=username,
+            purchase_price=order.price,
+            renewal_price=order.price,
+            expired_at=order.expires_at
+        ))
+        await session.execute(
+            update(SubscriptionOrder)
+            .where(SubscriptionOrder.id == order.id)
+            .values(status=ORDER_COMPLETED, sub_uuid=sub_uuid, error=None)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error completing order {order.id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return False
+
+async def release_order(
+    session: AsyncSession,
+    order_id: int,
+    error: str
+) -> bool:
+    """Вернуть заказ в очередь для повторной попытки"""
+    try:
+        await session.execute(
+            update(SubscriptionOrder)
+            .where(SubscriptionOrder.id == order_id)
+            .values(status=ORDER_PENDING, error=error[:255])
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error releasing order {order_id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return False
+
+async def fail_order(
+    session: AsyncSession,
+    order: SubscriptionOrder,
+    error: str
+) -> bool:
+    """Заказ не выполнен: статус FAILED и возврат средств одной транзакцией"""
+    try:
+        await session.execute(
+            update(SubscriptionOrder)
+            .where(SubscriptionOrder.id == order.id)
+            .values(status=ORDER_FAILED, error=error[:255])
+            .execution_options(synchronize_session=False)
+        )
+        session.add(BalanceLedger(
+            telegram_id=order.telegram_id,
+            amount=order.price,
+            reason="refund",
+            reference=f"order:{order.id}",
+            idempotency_key=f"refund:order:{order.id}"
+        ))
+        await session.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error failing order {order.id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return False
+
+async def get_unfinished_order_ids(
+    session: AsyncSession,
+    stale_before: datetime
+) -> List[int]:
+    """
+    Заказы для восстановления после перезапуска: PENDING и PROVISIONING,
+    не обновлявшиеся с stale_before (обработчик упал посреди запроса к панели).
+    Зависшие PROVISIONING возвращаются в PENDING
+    """
+    try:
+        await session.execute(
+            update(SubscriptionOrder)
+            .where(SubscriptionOrder.status == ORDER_PROVISIONING)
+            .where(SubscriptionOrder.updated_at < stale_before)
+            .values(status=ORDER_PENDING)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        result = await session.execute(
+            select(SubscriptionOrder.id)
+            .where(SubscriptionOrder.status == ORDER_PENDING)
+            .order_by(SubscriptionOrder.id)
+        )
+        return list(result.scalars().all())
+    except Exception as e:
+        logger.error(f"Error getting unfinished orders: {str(e)}", exc_info=True)
+        await session.rollback()
+        return []
+
 # ==================== PROMOCODE OPERATIONS ====================
 
 async def get_active_promocode(
@@ -273,26 +1110,436 @@ async def create_used_promocode(
         await session.rollback()
         return None
 
+def _is_constraint_violation(error: IntegrityError, name: str, sqlite_column: str) -> bool:
+    """
+    Нарушено ли именно это ограничение: asyncpg сообщает имя ограничения,
+    SQLite - только столбцы ("UNIQUE constraint failed: table.column, ...")
+    """
+    constraint = getattr(getattr(error.orig, "__cause__", None), "constraint_name", None)
+    if constraint is not None:
+        return constraint == name
+    return sqlite_column in str(error.orig)
+
+class RedeemResult(str, Enum):
+    SUCCESS = "success"
+    NOT_FOUND = "not_found"          # нет такого кода, выключен или истек
+    EXHAUSTED = "exhausted"          # закончились общие активации
+    LIMIT_REACHED = "limit_reached"  # пользователь исчерпал uses_per_user
+    ERROR = "error"
+
+async def redeem_promocode(
+    session: AsyncSession,
+    telegram_id: int,
+    code: str,
+    promo: Optional[Any] = None
+) -> Tuple[RedeemResult, Optional[UsedPromocode]]:
+    """
+    Атомарное применение промокода в одной короткой транзакции:
+
+    1. Запись UsedPromocode со следующим use_number - лимит на пользователя
+       держит уникальный индекс (telegram_id, promo_id, use_number). Если номер
+       занят параллельным применением, попытка повторяется со следующим.
+    2. Зачисление discount_value на баланс записью журнала (ключ идемпотентности -
+       промокод, пользователь и use_number).
+    3. Условный UPDATE remaining_uses = remaining_uses - 1 WHERE remaining_uses > 0
+       RETURNING - счетчик не уходит в минус без SELECT ... FOR UPDATE.
+
+    UPDATE идет последним, сразу перед COMMIT, поэтому блокировка строки промокода
+    держится минимальное время; сетевых вызовов внутри транзакции нет.
+
+    promo - уже найденный промокод (id, uses_per_user, discount_value, valid_until),
+    например из кеша; актуальность и остаток все равно проверяются условным UPDATE.
+    Любой результат, кроме SUCCESS и NOT_FOUND, - после отката транзакции.
+    """
+    try:
+        now = datetime.now()
+        if promo is None:
+            promo = (await session.execute(
+                select(Promocode.id, Promocode.uses_per_user, Promocode.discount_value, Promocode.valid_until)
+                .where(Promocode.code == code)
+                .where(Promocode.is_active == True)
+                .where(Promocode.valid_until >= now)
+            )).first()
+        if promo is None:
+            return RedeemResult.NOT_FOUND, None
+
+        while True:
+            used = await session.scalar(
+                select(func.count(UsedPromocode.id))
+                .where(UsedPromocode.telegram_id == telegram_id)
+                .where(UsedPromocode.promo_id == promo.id)
+            )
+            if used >= promo.uses_per_user:
+                await session.rollback()
+                return RedeemResult.LIMIT_REACHED, None
+
+            used_promo = UsedPromocode(
+                telegram_id=telegram_id,
+                promo_id=promo.id,
+                use_number=used + 1,
+                valid_until=promo.valid_until
+            )
+            session.add(used_promo)
+            try:
+                await session.flush()
+                break
+            except IntegrityError as e:
+                await session.rollback()
+                if not _is_constraint_violation(e, "uq_used_promo_user_use", "used_promocodes.use_number"):
+                    raise
+                # Параллельное применение тем же пользователем заняло этот use_number
+
+        session.add(BalanceLedger(
+            telegram_id=telegram_id,
+            amount=promo.discount_value,
+            reason="promocode",
+            reference=code,
+            idempotency_key=f"promo:{promo.id}:{telegram_id}:{used_promo.use_number}"
+        ))
+        await session.flush()
+
+        decremented = await session.scalar(
+            update(Promocode)
+            .where(Promocode.id == promo.id)
+            .where(Promocode.remaining_uses > 0)
+            .where(Promocode.is_active == True)
+            .where(Promocode.valid_until >= now)
+            .values(remaining_uses=Promocode.remaining_uses - 1)
+            .returning(Promocode.remaining_uses)
+        )
+        if decremented is None:
+            await session.rollback()
+            return RedeemResult.EXHAUSTED, None
+
+        await session.commit()
+        return RedeemResult.SUCCESS, used_promo
+    except Exception as e:
+        logger.error(f"Error redeeming promocode {code} for {telegram_id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return RedeemResult.ERROR, None
+
+# ==================== UPDATE DEDUPLICATION ====================
+
+async def mark_update_processed(
+    session: AsyncSession,
+    update_id: int,
+    worker_id: int
+) -> bool:
+    """
+    Регистрация апдейта в таблице дедупликации.
+    True - апдейт новый и его нужно обработать, False - уже обрабатывался
+    """
+    try:
+        result = await session.execute(
+            _insert(session, ProcessedUpdate)
+            .values(update_id=update_id, worker_id=worker_id)
+            .on_conflict_do_nothing(index_elements=["update_id"])
+            .returning(ProcessedUpdate.update_id)
+        )
+        await session.commit()
+        return result.scalar_one_or_none() is not None
+    except Exception as e:
+        logger.error(f"Error marking update {update_id} as processed: {str(e)}", exc_info=True)
+        await session.rollback()
+        # При недоступности таблицы лучше обработать апдейт, чем потерять его
+        return True
+
+async def purge_processed_updates(
+    session: AsyncSession,
+    older_than: datetime
+) -> int:
+    """Удаление старых записей дедупликации"""
+    try:
+        result = await session.execute(
+            delete(ProcessedUpdate)
+            .where(ProcessedUpdate.processed_at < older_than)
+        )
+        await session.commit()
+        return result.rowcount
+    except Exception as e:
+        logger.error(f"Error purging processed updates: {str(e)}", exc_info=True)
+        await session.rollback()
+        return 0
+
+# ==================== SUPPORT TICKETS ====================
+
+TICKET_OPEN = "OPEN"
+TICKET_IN_PROGRESS = "IN_PROGRESS"
+TICKET_CLOSED = "CLOSED"
+
+async def get_user_active_ticket(
+    session: AsyncSession,
+    telegram_id: int
+) -> Optional[SupportTicket]:
+    """Незакрытое обращение пользователя (новые сообщения дописываются в него)"""
+    try:
+        result = await session.execute(
+            select(SupportTicket)
+            .where(SupportTicket.telegram_id == telegram_id)
+            # Литерал, а не параметр: иначе планировщик не докажет условие частичного индекса
+            .where(SupportTicket.status != literal_column(f"'{TICKET_CLOSED}'"))
+            .order_by(SupportTicket.created_at.desc())
+            .limit(1)
+        )
+        return result.scalars().first()
+    except Exception as e:
+        logger.error(f"Error getting active ticket for {telegram_id}: {str(e)}", exc_info=True)
+        return None
+
+async def create_ticket(
+    session: AsyncSession,
+    telegram_id: int,
+    text: str
+) -> Optional[SupportTicket]:
+    """
+    Создание обращения с первым сообщением. Клиенты с активной подпиской идут выше в очереди.
+    None - ошибка или у пользователя уже есть открытое обращение (после отката)
+    """
+    try:
+        active_subscriptions = await session.scalar(
+            select(func.count(PurchasedSubscription.id))
+            .where(PurchasedSubscription.telegram_id == telegram_id)
+            .where(PurchasedSubscription.expired_at > datetime.now())
+        )
+        ticket = SupportTicket(
+            telegram_id=telegram_id,
+            priority=1 if active_subscriptions else 0,
+            messages=[TicketMessage(author_id=telegram_id, text=text)]
+        )
+        session.add(ticket)
+        await session.commit()
+        return ticket
+    except IntegrityError:
+        # Параллельная отправка уже открыла обращение (uq_ticket_user_open)
+        logger.info(f"User {telegram_id} already has an open ticket")
+        await session.rollback()
+        return None
+    except Exception as e:
+        logger.error(f"Error creating ticket for {telegram_id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return None
+
+async def add_ticket_message(
+    session: AsyncSession,
+    ticket_id: int,
+    author_id: int,
+    text: str,
+    is_staff: bool = False
+) -> Optional[TicketMessage]:
+    """Добавление сообщения в обращение"""
+    try:
+        message = TicketMessage(
+            ticket_id=ticket_id,
+            author_id=author_id,
+            text=text,
+            is_staff=is_staff
+        )
+        session.add(message)
+        await session.commit()
+        return message
+    except Exception as e:
+        logger.error(f"Error adding message to ticket {ticket_id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return None
+
+async def claim_next_ticket(
+    session: AsyncSession,
+    agent_id: int
+) -> Optional[int]:
+    """
+    Атомарно взять в работу следующее открытое обращение.
+
+    SELECT ... FOR UPDATE SKIP LOCKED: строки, которые сейчас берет другой сотрудник,
+    пропускаются без ожидания, поэтому параллельные агенты не блокируют друг друга
+    и не получают одно и то же обращение. UPDATE дополнительно проверяет статус -
+    это защищает БД без SKIP LOCKED (SQLite), где FOR UPDATE игнорируется.
+    Проигранная гонка означает, что обращение ушло из очереди, поэтому попытки
+    повторяются, пока SELECT что-то находит.
+    Возвращает ID обращения или None, если очередь пуста (транзакция при этом
+    откатывается).
+    """
+    try:
+        while True:
+            ticket_id = await session.scalar(
+                select(SupportTicket.id)
+                .where(SupportTicket.status == TICKET_OPEN)
+                .order_by(SupportTicket.priority.desc(), SupportTicket.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            if ticket_id is None:
+                await session.rollback()
+                return None
+
+            result = await session.execute(
+                update(SupportTicket)
+                .where(SupportTicket.id == ticket_id)
+                .where(SupportTicket.status == TICKET_OPEN)
+                .values(
+                    status=TICKET_IN_PROGRESS,
+                    assigned_to=agent_id,
+                    claimed_at=datetime.now()
+                )
+            )
+            await session.commit()
+            if result.rowcount:
+                return ticket_id
+    except Exception as e:
+        logger.error(f"Error claiming ticket for agent {agent_id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return None
+
+@read_only
+async def get_ticket_inbox(
+    session: AsyncSession,
+    status: str = TICKET_OPEN,
+    assigned_to: Optional[int] = None,
+    limit: int = 10,
+    offset: int = 0
+) -> List[SupportTicket]:
+    """Список обращений по статусу в порядке очереди (индекс status, priority, created_at)"""
+    try:
+        query = (
+            select(SupportTicket)
+            .where(SupportTicket.status == status)
+            .order_by(SupportTicket.priority.desc(), SupportTicket.created_at)
+            .limit(limit)
+            .offset(offset)
+        )
+        if assigned_to is not None:
+            query = query.where(SupportTicket.assigned_to == assigned_to)
+        result = await session.execute(query)
+        return list(result.scalars().all())
+    except Exception as e:
+        logger.error(f"Error getting ticket inbox ({status}): {str(e)}", exc_info=True)
+        return []
+
+@read_only
+async def count_tickets_by_status(
+    session: AsyncSession,
+    assigned_to: Optional[int] = None
+) -> Dict[str, int]:
+    """Количество незакрытых обращений по статусам"""
+    try:
+        query = (
+            select(SupportTicket.status, func.count(SupportTicket.id))
+            .where(SupportTicket.status != TICKET_CLOSED)
+            .group_by(SupportTicket.status)
+        )
+        if assigned_to is not None:
+            query = query.where(SupportTicket.assigned_to == assigned_to)
+        result = await session.execute(query)
+        return {status: count for status, count in result.all()}
+    except Exception as e:
+        logger.error(f"Error counting tickets: {str(e)}", exc_info=True)
+        return {}
+
+async def get_ticket_by_id(
+    session: AsyncSession,
+    ticket_id: int
+) -> Optional[SupportTicket]:
+    """Get ticket by ID (without relationships)"""
+    try:
+        return await session.get(SupportTicket, ticket_id)
+    except Exception as e:
+        logger.error(f"Error getting ticket {ticket_id}: {str(e)}", exc_info=True)
+        return None
+
+async def get_ticket_view(
+    session: AsyncSession,
+    ticket_id: int
+) -> Optional[SupportTicket]:
+    """
+    Обращение вместе с перепиской, пользователем и его подписками одним запросом
+    (joinedload вместо отдельных SELECT на каждую связь)
+    """
+    try:
+        result = await session.execute(
+            select(SupportTicket)
+            .where(SupportTicket.id == ticket_id)
+            .options(
+                joinedload(SupportTicket.messages),
+                joinedload(SupportTicket.user).joinedload(User.purchased_subscriptions),
+                joinedload(SupportTicket.user).undefer(User.current_balance)
+            )
+        )
+        return result.unique().scalars().first()
+    except Exception as e:
+        logger.error(f"Error getting ticket {ticket_id}: {str(e)}", exc_info=True)
+        return None
+
+async def close_ticket(
+    session: AsyncSession,
+    ticket_id: int,
+    agent_id: int
+) -> bool:
+    """Закрытие обращения (только взявшим его сотрудником или незакрепленного)"""
+    try:
+        result = await session.execute(
+            update(SupportTicket)
+            .where(SupportTicket.id == ticket_id)
+            .where(SupportTicket.status != TICKET_CLOSED)
+            .where((SupportTicket.assigned_to == agent_id) | (SupportTicket.assigned_to.is_(None)))
+            .values(
+                status=TICKET_CLOSED,
+                assigned_to=agent_id,
+                closed_at=datetime.now()
+            )
+        )
+        await session.commit()
+        return result.rowcount > 0
+    except Exception as e:
+        logger.error(f"Error closing ticket {ticket_id}: {str(e)}", exc_info=True)
+        await session.rollback()
+        return False
+
 # ==================== UTILITY FUNCTIONS ====================
 
-async def get_user_full_data(
+# Списания за подписки (возвраты по неудавшимся заказам уменьшают сумму)
+SPENDING_REASONS = ("purchase", "renewal", "refund")
+
+def _user_subscriptions(*columns):
+    return (
+        select(*columns)
+        .select_from(PurchasedSubscription)
+        .where(PurchasedSubscription.telegram_id == User.telegram_id)
+        .where(PurchasedSubscription.expired_at > bindparam("now"))
+        .scalar_subquery()
+    )
+
+# Одна строка на пользователя; активные подписки считаются по индексу (telegram_id, expired_at)
+_PROFILE_SUMMARY = (
+    select(
+        User.current_balance,
+        _user_subscriptions(func.count()).label("active_count"),
+        _user_subscriptions(func.min(PurchasedSubscription.expired_at)).label("next_expiry"),
+        select(-func.coalesce(func.sum(BalanceLedger.amount), 0))
+        .where(BalanceLedger.telegram_id == User.telegram_id)
+        .where(BalanceLedger.reason.in_(SPENDING_REASONS))
+        .scalar_subquery()
+        .label("total_spent")
+    )
+    .where(User.telegram_id == bindparam("telegram_id"))
+)
+
+@read_only
+async def get_profile_summary(
     session: AsyncSession,
     telegram_id: int
 ) -> Optional[Dict[str, Any]]:
-    """Get complete user data"""
+    """Баланс, число активных подписок, ближайшее окончание и сумма покупок одним запросом"""
     try:
-        user = await get_user_by_telegram_id(session, telegram_id)
-        if not user:
+        row = (await session.execute(
+            _PROFILE_SUMMARY, {"telegram_id": telegram_id, "now": datetime.now()}
+        )).first()
+        if row is None:
             return None
-            
-        subscriptions = await get_purchased_subscriptions(session, telegram_id)
-        active_subscriptions = [s for s in subscriptions if s.expired_at > datetime.now()]
-        
         return {
-            "user": user,
-            "subscriptions": active_subscriptions,
-            "subscriptions_count": len(active_subscriptions)
+            "balance": Decimal(row.current_balance or 0),
+            "active_count": row.active_count,
+            "next_expiry": row.next_expiry,
+            "total_spent": Decimal(row.total_spent or 0)
         }
     except Exception as e:
-        logger.error(f"Error getting full data for {telegram_id}: {str(e)}", exc_info=True)
+        logger.error(f"Error getting profile summary for {telegram_id}: {str(e)}", exc_info=True)
         return None
@@ -1,21 +1,131 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import declarative_base
-from dotenv import load_dotenv
-import os  
+import itertools
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from typing import List, Optional
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, declarative_base
+from core.config import DATABASE_URL, DATABASE_REPLICA_URLS, DB_QUERY_CACHE_SIZE, DB_STATEMENT_CACHE_SIZE
 
-# Загрузка переменных окружения
-load_dotenv()
+# Движок создается в Application.startup (init_engine), а не при импорте:
+# драйвер БД подгружается только когда он действительно нужен
+engine: Optional[AsyncEngine] = None
 
-# Получаем URL БД из .env
-DATABASE_URL = os.getenv("DATABASE_URL")  # Добавляем эту строку
+Base = declarative_base()
 
-#Создаем асинхронный движок
-engine = create_async_engine(DATABASE_URL)
 
-Base = declarative_base()
+@dataclass
+class Replica:
+    engine: AsyncEngine
+    # Реплика получает запросы только после успешной проверки (core.database.replicas)
+    healthy: bool = False
+    lag: Optional[float] = None
+    queries: int = 0
+
+
+replicas: List[Replica] = []
+_round_robin = itertools.count()
+
+# Запросы внутри read_only-функций можно отправить на реплику
+_read_only: ContextVar[bool] = ContextVar("read_only", default=False)
+
+READ_ONLY = "read_only"
+# Опция выполнения: запись не привязывает сессию к основной БД
+# (служебные записи, от которых не зависит дальнейшее чтение)
+KEEP_REPLICA = "keep_replica"
+
+
+def read_only(func):
+    """Функция только читает: ее запросы уходят на реплику, если она есть и не отстала"""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+
+def _pick_replica() -> Optional[Replica]:
+    healthy = [replica for replica in replicas if replica.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_round_robin) % len(healthy)]
+
+
+class RoutingSession(Session):
+    """
+    Чтение из read_only-функций (или из сессии read_session()) - на реплику
+    по кругу, все остальное - на основную БД. Сессия, которая уже писала,
+    до конца работает только с основной БД: иначе она может не увидеть
+    собственные изменения. Одна сессия читает с одной и той же реплики
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wrote = False
+        self._replica: Optional[Replica] = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs) -> Engine:
+        if self._flushing or (
+            clause is not None and getattr(clause, "is_dml", False)
+            and not clause.get_execution_options().get(KEEP_REPLICA)
+        ):
+            self._wrote = True
+        if self._wrote or not (_read_only.get() or self.info.get(READ_ONLY)):
+            return super().get_bind(mapper, clause=clause, **kwargs)
+
+        if self._replica is None or not self._replica.healthy:
+            self._replica = _pick_replica()
+        if self._replica is None:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        self._replica.queries += 1
+        return self._replica.engine.sync_engine
+
 
 async_session = async_sessionmaker(
-    bind=engine,
     expire_on_commit=False,
-    class_=AsyncSession
+    class_=AsyncSession,
+    sync_session_class=RoutingSession
 )
+
+
+def read_session() -> AsyncSession:
+    """Сессия для запросов только на чтение (GET-эндпоинты API, отчеты)"""
+    return async_session(info={READ_ONLY: True})
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    """Движок с кешами запросов: компиляции SQLAlchemy и подготовленных выражений asyncpg"""
+    options = {"query_cache_size": DB_QUERY_CACHE_SIZE}
+    if url.startswith("postgresql+asyncpg"):
+        # 0 отключает кеш (нужно за pgbouncer в режиме transaction)
+        options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    return create_async_engine(url, **options)
+
+
+def init_engine(url: Optional[str] = None, replica_urls: Optional[List[str]] = None) -> AsyncEngine:
+    """
+    Создание асинхронного движка и привязка к нему фабрики сессий.
+    Реплики по умолчанию из DATABASE_REPLICA_URLS (только для базы из DATABASE_URL)
+    """
+    global engine
+    if engine is None:
+        engine = _create_engine(url or DATABASE_URL)
+        async_session.configure(bind=engine)
+        if replica_urls is None:
+            replica_urls = DATABASE_REPLICA_URLS if url is None else []
+        replicas[:] = [Replica(engine=_create_engine(replica_url)) for replica_url in replica_urls]
+    return engine
+
+async def dispose_engine() -> None:
+    """Закрытие пула соединений"""
+    global engine
+    if engine is not None:
+        for replica in replicas:
+            await replica.engine.dispose()
+        replicas.clear()
+        await engine.dispose()
+        engine = None
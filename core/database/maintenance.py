@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from core.config import (
+    BALANCE_COMPACTION_LAG, BALANCE_COMPACTION_BATCH, OUTBOX_RETENTION_HOURS,
+    SUBSCRIPTION_ARCHIVE_AFTER_DAYS, SUBSCRIPTION_ARCHIVE_BATCH
+)
+from core.database import crud
+from core.database.database import async_session
+
+logger = logging.getLogger(__name__)
+
+# Фоновые задачи обслуживания БД (регистрируются в core.jobs.job_runner)
+
+# Пауза между пачками архивации: между транзакциями успевают пройти запросы бота
+ARCHIVE_BATCH_PAUSE = 0.05
+
+
+async def compact_balances() -> int:
+    """Перенос журнала баланса в снимки users.balance пачками"""
+    total = 0
+    while True:
+        async with async_session() as session:
+            compacted = await crud.compact_balance_ledger(
+                session,
+                lag=timedelta(seconds=BALANCE_COMPACTION_LAG),
+                batch_size=BALANCE_COMPACTION_BATCH
+            )
+        total += compacted
+        if compacted < BALANCE_COMPACTION_BATCH:
+            break
+    if total:
+        logger.info(f"Balance ledger compacted for {total} users")
+    return total
+
+
+async def cleanup_outbox() -> int:
+    """Удаление примененных записей outbox старше OUTBOX_RETENTION_HOURS"""
+    async with async_session() as session:
+        deleted = await crud.delete_processed_outbox(
+            session, older_than=datetime.now() - timedelta(hours=OUTBOX_RETENTION_HOURS)
+        )
+    if deleted:
+        logger.info(f"Removed {deleted} processed outbox entries")
+    return deleted
+
+
+async def archive_subscriptions() -> int:
+    """Перенос подписок, истекших больше SUBSCRIPTION_ARCHIVE_AFTER_DAYS назад, в архив пачками"""
+    expired_before = datetime.now() - timedelta(days=SUBSCRIPTION_ARCHIVE_AFTER_DAYS)
+    total = 0
+    while True:
+        async with async_session() as session:
+            archived = await crud.archive_expired_subscriptions(
+                session, expired_before, batch_size=SUBSCRIPTION_ARCHIVE_BATCH
+            )
+        total += archived
+        if archived < SUBSCRIPTION_ARCHIVE_BATCH:
+            break
+        await asyncio.sleep(ARCHIVE_BATCH_PAUSE)
+    if total:
+        logger.info(f"Archived {total} expired subscriptions")
+    return total
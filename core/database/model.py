@@ -2,10 +2,11 @@ from datetime import datetime
 from sqlalchemy import (
     Column, Integer, BigInteger, String, DateTime, 
     Text, Index, func, ForeignKey, CheckConstraint,
-    UniqueConstraint, Boolean, Numeric
+    UniqueConstraint, Boolean, Numeric, JSON, LargeBinary, text
 )
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncAttrs
-from sqlalchemy.orm import DeclarativeBase, relationship
+from sqlalchemy.orm import DeclarativeBase, relationship, column_property
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
@@ -13,8 +14,8 @@ class Base(AsyncAttrs, DeclarativeBase):
 class User(Base):
     __tablename__ = "users"
     __table_args__ = (
-        Index('idx_user_telegram_id', 'telegram_id'),
-        Index('idx_user_username', 'username'),
+        # telegram_id - уникальный индекс из unique=True, index=True; username ищется
+        # только по подстроке (триграммные индексы в core/database/search.py)
         CheckConstraint(
             "role IN ('ADMIN', 'SUPPORT', 'USER', 'BANNED')", 
             name="check_user_role"
@@ -23,9 +24,12 @@ class User(Base):
 
     id = Column(Integer, primary_key=True)
     telegram_id = Column(BigInteger, unique=True, nullable=False, index=True)
-    username = Column(String(255), nullable=True, index=True)
+    username = Column(String(255), nullable=True)
     role = Column(String(20), nullable=False, server_default="USER")
+    # Снимок баланса: сумма всех записей balance_ledger с id <= balance_ledger_id.
+    # Текущий баланс = снимок + более новые записи (см. current_balance)
     balance = Column(Numeric(10, 2), default=0, nullable=False)
+    balance_ledger_id = Column(BigInteger, nullable=False, server_default="0")
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     last_sync_time = Column(DateTime, nullable=True)
@@ -33,20 +37,24 @@ class User(Base):
     # Relationships
     purchased_subscriptions = relationship("PurchasedSubscription", back_populates="user")
     used_promocodes = relationship("UsedPromocode", back_populates="user")
+    support_tickets = relationship("SupportTicket", back_populates="user")
 
 class PurchasedSubscription(Base):
     __tablename__ = "purchased_subscriptions"
     __table_args__ = (
-        Index('idx_purchased_sub_telegram_id', 'telegram_id'),
-        Index('idx_purchased_sub_uuid', 'sub_uuid'),
+        UniqueConstraint('sub_uuid', name='uq_purchased_sub_uuid'),
+        # Подписки пользователя, сводка профиля (активные и ближайшее окончание);
+        # по префиксу telegram_id - еще и каскад из users
+        Index('idx_purchased_sub_telegram_expired', 'telegram_id', 'expired_at'),
+        # Активные подписки (трафик) и отбор давно истекших в архив
+        Index('idx_purchased_sub_expired_at', 'expired_at'),
     )
 
     id = Column(Integer, primary_key=True)
     telegram_id = Column(
         BigInteger, 
         ForeignKey("users.telegram_id", ondelete="CASCADE"), 
-        nullable=False, 
-        index=True
+        nullable=False
     )
     sub_uuid = Column(String(255), nullable=False)
     username = Column(String(255), nullable=False)  # Новое поле
@@ -60,6 +68,34 @@ class PurchasedSubscription(Base):
     # Relationship
     user = relationship("User", back_populates="purchased_subscriptions")
 
+class ArchivedSubscription(Base):
+    """
+    Подписки, истекшие больше SUBSCRIPTION_ARCHIVE_AFTER_DAYS назад: фоновая задача
+    переносит их из purchased_subscriptions пачками (core/database/maintenance.py).
+    Видны только в истории подписок, рабочие запросы сюда не обращаются
+    """
+    __tablename__ = "archived_subscriptions"
+    __table_args__ = (
+        Index('idx_archived_sub_telegram_expired', 'telegram_id', 'expired_at'),
+        Index('idx_archived_sub_uuid', 'sub_uuid'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id из purchased_subscriptions
+    telegram_id = Column(
+        BigInteger,
+        ForeignKey("users.telegram_id", ondelete="CASCADE"),
+        nullable=False
+    )
+    sub_uuid = Column(String(255), nullable=False)
+    username = Column(String(255), nullable=False)
+    purchase_price = Column(Numeric(10, 2), nullable=True)
+    renewal_price = Column(Numeric(10, 2), nullable=True)
+    expired_at = Column(DateTime, nullable=False)
+    last_transfer_time = Column(DateTime, nullable=True)
+    device_removal_count = Column(Integer, default=0, nullable=False)
+    last_removal_reset = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, server_default=func.now(), nullable=False)
+
 class SubscriptionPlan(Base):
     __tablename__ = "subscriptions_plan"
     __table_args__ = (
@@ -67,10 +103,47 @@ class SubscriptionPlan(Base):
     )
 
     id = Column(Integer, primary_key=True)
-    name = Column(String(255), nullable=False, unique=True)
+    name = Column(String(255), nullable=False)
     price = Column(Numeric(10, 2), nullable=False)
     end_date = Column(DateTime, nullable=False)
 
+class SubscriptionOrder(Base):
+    """
+    Заказ подписки: создается вместе со списанием баланса, подписку в панели
+    создает фоновый provisioning (core/provisioning.py)
+    """
+    __tablename__ = "subscription_orders"
+    __table_args__ = (
+        # Восстановление после перезапуска: WHERE status = ? ORDER BY id
+        Index('idx_subscription_order_status_id', 'status', 'id'),
+        Index('idx_subscription_order_telegram_id', 'telegram_id'),
+        CheckConstraint(
+            "status IN ('PENDING', 'PROVISIONING', 'COMPLETED', 'FAILED')",
+            name="check_subscription_order_status"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(
+        BigInteger,
+        ForeignKey("users.telegram_id", ondelete="CASCADE"),
+        nullable=False
+    )
+    plan_id = Column(Integer, ForeignKey("subscriptions_plan.id", ondelete="SET NULL"), nullable=True)
+    price = Column(Numeric(10, 2), nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # дата окончания создаваемой подписки
+    status = Column(String(20), nullable=False, server_default="PENDING")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    error = Column(String(255), nullable=True)
+    sub_uuid = Column(String(255), nullable=True)
+    # Сообщение, которое нужно отредактировать по завершении
+    chat_id = Column(BigInteger, nullable=True)
+    message_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    plan = relationship("SubscriptionPlan")
+
 class Promocode(Base):
     __tablename__ = "promocodes"
     __table_args__ = (
@@ -79,7 +152,7 @@ class Promocode(Base):
     )
 
     id = Column(Integer, primary_key=True)
-    code = Column(String(50), nullable=False, unique=True)
+    code = Column(String(50), nullable=False)
     total_uses = Column(Integer, nullable=False)
     remaining_uses = Column(Integer, nullable=False)
     uses_per_user = Column(Integer, nullable=False)
@@ -90,26 +163,201 @@ class Promocode(Base):
 class UsedPromocode(Base):
     __tablename__ = "used_promocodes"
     __table_args__ = (
-        Index('idx_used_promo_telegram_id', 'telegram_id'),
         Index('idx_used_promo_promo_id', 'promo_id'),
+        # Лимит uses_per_user: каждое применение получает свой порядковый номер,
+        # два параллельных применения с одним номером не пройдут по уникальности
+        # Он же - индекс для поиска по telegram_id (префикс)
+        UniqueConstraint('telegram_id', 'promo_id', 'use_number', name='uq_used_promo_user_use'),
     )
 
     id = Column(Integer, primary_key=True)
     telegram_id = Column(
         BigInteger, 
         ForeignKey("users.telegram_id", ondelete="CASCADE"), 
-        nullable=False, 
-        index=True
+        nullable=False
     )
     promo_id = Column(
         Integer, 
         ForeignKey("promocodes.id", ondelete="CASCADE"), 
-        nullable=False, 
-        index=True
+        nullable=False
     )
+    use_number = Column(Integer, nullable=False, server_default="1")
     valid_until = Column(DateTime)
     use_status = Column(Boolean, default=True, nullable=False)
     
     # Relationships
     user = relationship("User", back_populates="used_promocodes")
     promocode = relationship("Promocode")
+
+class ProcessedUpdate(Base):
+    """Апдейты Telegram, уже взятые в обработку (дедупликация между воркерами)"""
+    __tablename__ = "processed_updates"
+    __table_args__ = (
+        Index('idx_processed_update_processed_at', 'processed_at'),
+    )
+
+    update_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    worker_id = Column(Integer, nullable=False)
+    processed_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class SupportTicket(Base):
+    """Обращение в поддержку"""
+    __tablename__ = "support_tickets"
+    __table_args__ = (
+        # Очередь и входящие: WHERE status = ? ORDER BY priority DESC, created_at
+        Index('idx_ticket_status_priority_created', 'status', 'priority', 'created_at'),
+        # Не больше одного незакрытого обращения на пользователя (двойная отправка
+        # не создаст второе); он же - индекс для поиска активного обращения
+        Index(
+            'uq_ticket_user_open', 'telegram_id', unique=True,
+            postgresql_where=text("status <> 'CLOSED'"),
+            sqlite_where=text("status <> 'CLOSED'")
+        ),
+        Index('idx_ticket_assigned_to', 'assigned_to', 'status'),
+        CheckConstraint(
+            "status IN ('OPEN', 'IN_PROGRESS', 'CLOSED')",
+            name="check_ticket_status"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(
+        BigInteger,
+        ForeignKey("users.telegram_id", ondelete="CASCADE"),
+        nullable=False
+    )
+    status = Column(String(20), nullable=False, server_default="OPEN")
+    priority = Column(Integer, nullable=False, server_default="0")  # больше = важнее
+    assigned_to = Column(BigInteger, nullable=True)  # telegram_id сотрудника
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    claimed_at = Column(DateTime, nullable=True)
+    closed_at = Column(DateTime, nullable=True)
+
+    # Relationships
+    user = relationship("User", back_populates="support_tickets")
+    messages = relationship(
+        "TicketMessage",
+        back_populates="ticket",
+        order_by="TicketMessage.created_at",
+        cascade="all, delete-orphan"
+    )
+
+class TicketMessage(Base):
+    """Сообщение в обращении (от пользователя или сотрудника)"""
+    __tablename__ = "ticket_messages"
+    __table_args__ = (
+        Index('idx_ticket_message_ticket_created', 'ticket_id', 'created_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    ticket_id = Column(
+        Integer,
+        ForeignKey("support_tickets.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    author_id = Column(BigInteger, nullable=False)
+    is_staff = Column(Boolean, default=False, nullable=False)
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    # Relationship
+    ticket = relationship("SupportTicket", back_populates="messages")
+
+
+class BalanceLedger(Base):
+    """
+    Журнал изменений баланса: каждое пополнение/списание - отдельная вставка,
+    строка users при этом не блокируется. Периодическая компактизация переносит
+    старые записи в снимок User.balance.
+    """
+    __tablename__ = "balance_ledger"
+    __table_args__ = (
+        Index('idx_balance_ledger_telegram_id', 'telegram_id', 'id'),
+        # Повторный callback платежной системы не создаст вторую запись
+        UniqueConstraint('idempotency_key', name='uq_balance_ledger_idempotency_key'),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    telegram_id = Column(
+        BigInteger,
+        ForeignKey("users.telegram_id", ondelete="CASCADE"),
+        nullable=False
+    )
+    amount = Column(Numeric(10, 2), nullable=False)  # > 0 пополнение, < 0 списание
+    reason = Column(String(32), nullable=False)       # topup, renewal, adjustment, ...
+    reference = Column(String(255), nullable=True)    # ID платежа, UUID подписки и т.п.
+    idempotency_key = Column(String(128), nullable=True)  # только для внешних операций (платежи)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+# Текущий баланс одним выражением: снимок + записи журнала после курсора.
+# deferred - не считается при каждой загрузке User, только по запросу (undefer / get_balance)
+User.current_balance = column_property(
+    User.balance + select(func.coalesce(func.sum(BalanceLedger.amount), 0))
+    .where(BalanceLedger.telegram_id == User.telegram_id)
+    .where(BalanceLedger.id > User.balance_ledger_id)
+    .correlate_except(BalanceLedger)
+    .scalar_subquery(),
+    deferred=True
+)
+
+
+class RemnawaveOutbox(Base):
+    """
+    Исходящие изменения в панели Remnawave. Запись добавляется в той же транзакции,
+    что и локальное изменение; применяет ее фоновый диспетчер (core/outbox.py)
+    """
+    __tablename__ = "remnawave_outbox"
+    __table_args__ = (
+        # Пачка диспетчера: WHERE status = 'PENDING' ... ORDER BY id - порядок из индекса,
+        # иначе SQLite выбирает полный проход по id (очередь копит DONE-записи)
+        Index('idx_remnawave_outbox_status_id', 'status', 'id'),
+        Index('idx_remnawave_outbox_sub_uuid', 'sub_uuid'),
+        CheckConstraint(
+            "status IN ('PENDING', 'DONE', 'FAILED')",
+            name="check_remnawave_outbox_status"
+        ),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    sub_uuid = Column(String(255), nullable=False)
+    operation = Column(String(32), nullable=False)   # remove_device, update_user
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), nullable=False, server_default="PENDING")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    next_attempt_at = Column(DateTime, default=datetime.now, nullable=False)
+    last_error = Column(String(255), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+
+
+class TrafficSeries(Base):
+    """
+    Расход трафика подписки: одна строка = один период, значения - упакованный
+    массив приращений (uint64 little-endian, см. core/traffic.py).
+    5m - сутки по 5 минут (288), 1h - сутки по часам (24), 1d - месяц по дням (31)
+    """
+    __tablename__ = "traffic_series"
+    __table_args__ = (
+        UniqueConstraint('sub_uuid', 'resolution', 'period_start', name='uq_traffic_series_period'),
+        Index('idx_traffic_series_resolution_period', 'resolution', 'period_start'),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    sub_uuid = Column(String(255), nullable=False)
+    resolution = Column(String(4), nullable=False)   # 5m, 1h, 1d
+    period_start = Column(DateTime, nullable=False)  # начало суток (5m, 1h) или месяца (1d)
+    data = Column(LargeBinary, nullable=False)
+    # Последнее значение счетчика панели (только 5m): от него считается следующее приращение
+    last_total = Column(BigInteger, nullable=True)
+
+
+class ReplicaHeartbeat(Base):
+    """
+    Метка времени, которую core.database.replicas пишет в основную БД
+    и читает с реплик: по ней считается отставание реплики
+    """
+    __tablename__ = "replica_heartbeat"
+
+    id = Column(Integer, primary_key=True)
+    beat_at = Column(DateTime, nullable=False)
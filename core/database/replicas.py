@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from core.config import REPLICA_MAX_LAG, REPLICA_CHECK_INTERVAL, REPLICA_CHECK_TIMEOUT
+from core.database import database
+from core.database.model import ReplicaHeartbeat
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_ID = 1
+
+
+class ReplicaMonitor:
+    """
+    Проверка реплик для чтения. Каждые REPLICA_CHECK_INTERVAL секунд монитор
+    читает метку replica_heartbeat с каждой реплики и пишет новую в основную БД.
+    Реплика, на которой уже есть прошлая метка, не отстает; иначе отставание -
+    возраст метки, которая на ней есть. Недоступная реплика или отставание
+    больше REPLICA_MAX_LAG - чтение идет в основную БД, пока реплика не догонит.
+    Способ не зависит от СУБД, поэтому работает и с двумя файлами SQLite
+    """
+
+    def __init__(
+        self,
+        max_lag: float = REPLICA_MAX_LAG,
+        interval: float = REPLICA_CHECK_INTERVAL,
+        timeout: float = REPLICA_CHECK_TIMEOUT
+    ):
+        self.max_lag = max_lag
+        self.interval = interval
+        self.timeout = timeout
+        self._last_beat: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self.checks = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running or not database.replicas:
+            return
+        await self._beat()
+        self._task = asyncio.create_task(self._run(), name="replica-monitor")
+        logger.info(f"Replica monitor started for {len(database.replicas)} replica(s)")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check_once()
+            except Exception as e:
+                logger.error(f"Replica check failed: {str(e)}", exc_info=True)
+
+    async def _beat(self) -> None:
+        """Новая метка в основной БД (строка одна на все процессы)"""
+        now = datetime.now()
+        try:
+            async with database.engine.begin() as conn:
+                result = await conn.execute(
+                    update(ReplicaHeartbeat).where(ReplicaHeartbeat.id == HEARTBEAT_ID).values(beat_at=now)
+                )
+                if result.rowcount == 0:
+                    await conn.execute(insert(ReplicaHeartbeat).values(id=HEARTBEAT_ID, beat_at=now))
+            self._last_beat = now
+        except IntegrityError:
+            # Строку одновременно создал другой процесс - его метка тоже подходит
+            self._last_beat = now
+        except Exception as e:
+            logger.error(f"Error writing replica heartbeat: {str(e)}", exc_info=True)
+
+    async def _replica_beat(self, replica: database.Replica) -> Optional[datetime]:
+        async with replica.engine.connect() as conn:
+            return await conn.scalar(
+                select(ReplicaHeartbeat.beat_at).where(ReplicaHeartbeat.id == HEARTBEAT_ID)
+            )
+
+    async def check_once(self) -> None:
+        expected = self._last_beat
+        for replica in database.replicas:
+            try:
+                beat = await asyncio.wait_for(self._replica_beat(replica), self.timeout)
+            except Exception as e:
+                if replica.healthy:
+                    logger.warning(f"Replica {replica.engine.url!r} unavailable: {str(e)}")
+                replica.healthy = False
+                replica.lag = None
+                continue
+
+            if beat is None:
+                lag = None
+            elif expected is not None and beat >= expected:
+                lag = 0.0
+            else:
+                lag = (datetime.now() - beat).total_seconds()
+
+            healthy = lag is not None and lag <= self.max_lag
+            if healthy != replica.healthy:
+                log = logger.info if healthy else logger.warning
+                log(f"Replica {replica.engine.url!r} {'in service' if healthy else 'out of service'}, lag {lag}")
+            replica.healthy = healthy
+            replica.lag = lag
+
+        self.checks += 1
+        await self._beat()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "checks": self.checks,
+            "replicas": [
+                {
+                    "url": repr(replica.engine.url),
+                    "healthy": replica.healthy,
+                    "lag": None if replica.lag is None else round(replica.lag, 2),
+                    "queries": replica.queries
+                } for replica in database.replicas
+            ]
+        }
+
+
+replica_monitor = ReplicaMonitor()
@@ -0,0 +1,206 @@
+"""
+Обновление схемы существующей БД до текущей модели.
+
+create_all создает только отсутствующие таблицы (с их индексами) и не трогает
+существующие. Недостающие столбцы, индексы и ограничения уникальности добавляются
+здесь при старте (фаза "database schema"), устаревшие индексы удаляются.
+Каждый шаг идемпотентен и выполняется в своей точке сохранения: если шаг не прошел
+(например, в данных есть дубликаты для нового уникального индекса), ошибка
+пишется в лог, а индекс, который он должен был заменить, остается.
+
+    python -m core.database.schema              # показать SQL, ничего не менять
+    python -m core.database.schema --apply      # применить (то же делает старт бота)
+    python -m core.database.schema --url postgresql+asyncpg://...
+
+На PostgreSQL CREATE INDEX блокирует запись в таблицу на время построения -
+на больших таблицах запускайте --apply заранее, в спокойное время.
+"""
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import UniqueConstraint, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from core.database.model import Base
+
+logger = logging.getLogger(__name__)
+
+# Индексы прежних версий: имя -> индекс или ограничение, который его заменяет
+# (None - индекс просто лишний). Удаляются только после создания замены
+REPLACED_INDEXES: Dict[str, Optional[str]] = {
+    "idx_user_telegram_id": "ix_users_telegram_id",
+    "idx_user_username": None,          # поиск по username - триграммные индексы (search.py)
+    "ix_users_username": None,
+    "idx_purchased_sub_telegram_id": "idx_purchased_sub_telegram_expired",
+    "ix_purchased_subscriptions_telegram_id": "idx_purchased_sub_telegram_expired",
+    "idx_purchased_sub_uuid": "uq_purchased_sub_uuid",
+    "idx_used_promo_telegram_id": "uq_used_promo_user_use",
+    "ix_used_promocodes_telegram_id": "uq_used_promo_user_use",
+    "ix_used_promocodes_promo_id": "idx_used_promo_promo_id",
+    "idx_remnawave_outbox_status_next": "idx_remnawave_outbox_status_id",
+    "idx_subscription_order_status_updated": "idx_subscription_order_status_id",
+    "idx_ticket_telegram_id": "uq_ticket_user_open",
+}
+
+# PostgreSQL: безымянные UNIQUE из unique=True дублировали именованные ограничения
+# (SQLite одинаковые ограничения схлопывает сам)
+PG_REPLACED_CONSTRAINTS = {
+    ("subscriptions_plan", "subscriptions_plan_name_key"): "uq_subscription_plan_name",
+    ("promocodes", "promocodes_code_key"): "uq_promocode_code",
+}
+
+# Исправление данных перед созданием ограничения: до use_number все применения
+# промокода пользователем были с номером 1
+DATA_FIXES = {
+    "uq_used_promo_user_use": """
+        UPDATE used_promocodes SET use_number = numbered.n
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY telegram_id, promo_id ORDER BY id) AS n
+            FROM used_promocodes
+        ) AS numbered
+        WHERE used_promocodes.id = numbered.id AND used_promocodes.use_number <> numbered.n
+    """,
+}
+
+
+@dataclass
+class Step:
+    description: str
+    sql: str
+    creates: Optional[str] = None    # имя создаваемого индекса/ограничения
+    replaced_by: Optional[str] = None  # для удаления: что должно существовать
+
+
+def plan_upgrade(conn: Connection) -> List[Step]:
+    """Шаги, которые приведут существующие таблицы к модели (пусто - схема актуальна)"""
+    dialect = conn.dialect
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+
+    columns: List[Step] = []
+    fixes: List[Step] = []
+    creates: List[Step] = []
+    drops: List[Step] = []
+    present = set()
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        uniques = {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+        present |= indexes | uniques
+        column_names = {column["name"] for column in inspector.get_columns(table.name)}
+
+        for column in table.columns:
+            if column.name not in column_names:
+                ddl = CreateColumn(column).compile(dialect=dialect)
+                columns.append(Step(
+                    f"add column {table.name}.{column.name}",
+                    f"ALTER TABLE {table.name} ADD COLUMN {ddl}"
+                ))
+
+        for constraint in table.constraints:
+            if not isinstance(constraint, UniqueConstraint) or constraint.name is None:
+                continue
+            if constraint.name in indexes | uniques:
+                continue
+            if constraint.name in DATA_FIXES:
+                fixes.append(Step(f"prepare data for {constraint.name}", DATA_FIXES[constraint.name]))
+            cols = ", ".join(column.name for column in constraint.columns)
+            if dialect.name == "sqlite":
+                sql = f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({cols})"
+            else:
+                sql = f"ALTER TABLE {table.name} ADD CONSTRAINT {constraint.name} UNIQUE ({cols})"
+            creates.append(Step(f"add unique {constraint.name}", sql, creates=constraint.name))
+
+        for index in table.indexes:
+            if index.name not in indexes:
+                creates.append(Step(
+                    f"create index {index.name}",
+                    str(CreateIndex(index).compile(dialect=dialect)),
+                    creates=index.name
+                ))
+
+        for name in sorted(indexes & set(REPLACED_INDEXES)):
+            drops.append(Step(f"drop index {name}", f"DROP INDEX {name}", replaced_by=REPLACED_INDEXES[name]))
+
+        if dialect.name == "postgresql":
+            for (table_name, name), replacement in PG_REPLACED_CONSTRAINTS.items():
+                if table_name == table.name and name in uniques:
+                    drops.append(Step(
+                        f"drop constraint {name}",
+                        f"ALTER TABLE {table.name} DROP CONSTRAINT {name}",
+                        replaced_by=replacement
+                    ))
+
+    # Замена, которая уже есть в БД, для удаления не нужна
+    for step in drops:
+        if step.replaced_by in present:
+            step.replaced_by = None
+    return columns + fixes + creates + drops
+
+
+def apply_upgrade(conn: Connection) -> int:
+    """Выполнение шагов plan_upgrade; возвращает число неудавшихся шагов"""
+    failed_creates = set()
+    failed = 0
+    for step in plan_upgrade(conn):
+        if step.replaced_by is not None and step.replaced_by in failed_creates:
+            logger.warning(f"Schema upgrade: skipped {step.description}, {step.replaced_by} was not created")
+            continue
+        try:
+            with conn.begin_nested():
+                conn.exec_driver_sql(step.sql)
+            logger.info(f"Schema upgrade: {step.description}")
+        except Exception as e:
+            failed += 1
+            if step.creates:
+                failed_creates.add(step.creates)
+            logger.error(f"Schema upgrade failed: {step.description}: {str(e)}", exc_info=True)
+    return failed
+
+
+async def upgrade_schema(conn: AsyncConnection) -> None:
+    """Вызывается при старте после create_all"""
+    failed = await conn.run_sync(apply_upgrade)
+    if failed:
+        logger.error(f"Schema upgrade finished with {failed} failed steps, see errors above")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="DATABASE_URL (по умолчанию из окружения)")
+    parser.add_argument("--apply", action="store_true", help="выполнить шаги, а не только показать")
+    args = parser.parse_args()
+
+    async def run():
+        from core.database.database import init_engine, dispose_engine
+
+        engine = init_engine(args.url)
+        try:
+            async with engine.begin() as conn:
+                if args.apply:
+                    logging.basicConfig(level=logging.INFO, format="%(message)s")
+                    from core.database.search import ensure_search_indexes
+                    await conn.run_sync(Base.metadata.create_all)
+                    await upgrade_schema(conn)
+                    await ensure_search_indexes(conn)
+                else:
+                    steps = await conn.run_sync(plan_upgrade)
+                    for step in steps:
+                        print(f"-- {step.description}\n{' '.join(step.sql.split())};")
+                    if not steps:
+                        print("-- schema is up to date")
+        finally:
+            await dispose_engine()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from core.config import SEARCH_RESULT_LIMIT, SEARCH_MIN_SUBSTRING
+from core.database.database import read_only
+
+logger = logging.getLogger(__name__)
+
+# Поиск по username пользователей и подписок для поддержки.
+#
+# PostgreSQL: GIN-индексы pg_trgm - ILIKE '%...%' идет по индексу, ранжирование similarity().
+# SQLite: FTS5-таблица search_index (токенизатор trigram), которую ведут триггеры.
+#   rowid = telegram_id для пользователей и -id для подписок, поэтому обновление
+#   и удаление записи - поиск по rowid, а не скан.
+
+_PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_user_username_trgm "
+    "ON users USING gin (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_purchased_sub_username_trgm "
+    "ON purchased_subscriptions USING gin (username gin_trgm_ops)",
+]
+
+_SQLITE_TABLE = "CREATE VIRTUAL TABLE search_index USING fts5(text, tokenize = 'trigram')"
+
+_SQLITE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS users_search_ai AFTER INSERT ON users
+    WHEN new.username IS NOT NULL BEGIN
+        INSERT INTO search_index(rowid, text) VALUES (new.telegram_id, new.username);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_search_au AFTER UPDATE OF username ON users BEGIN
+        DELETE FROM search_index WHERE rowid = old.telegram_id;
+        INSERT INTO search_index(rowid, text)
+        SELECT new.telegram_id, new.username WHERE new.username IS NOT NULL;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_search_ad AFTER DELETE ON users BEGIN
+        DELETE FROM search_index WHERE rowid = old.telegram_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS subs_search_ai AFTER INSERT ON purchased_subscriptions BEGIN
+        INSERT INTO search_index(rowid, text) VALUES (-new.id, new.username);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS subs_search_au AFTER UPDATE OF username ON purchased_subscriptions BEGIN
+        DELETE FROM search_index WHERE rowid = -old.id;
+        INSERT INTO search_index(rowid, text) VALUES (-new.id, new.username);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS subs_search_ad AFTER DELETE ON purchased_subscriptions BEGIN
+        DELETE FROM search_index WHERE rowid = -old.id;
+    END""",
+]
+
+_SQLITE_BACKFILL = [
+    "INSERT INTO search_index(rowid, text) "
+    "SELECT telegram_id, username FROM users WHERE username IS NOT NULL",
+    "INSERT INTO search_index(rowid, text) "
+    "SELECT -id, username FROM purchased_subscriptions",
+]
+
+
+@dataclass
+class SearchHit:
+    kind: str                 # user / subscription
+    telegram_id: int
+    username: Optional[str]
+    sub_uuid: Optional[str]
+    score: float
+
+
+async def ensure_search_indexes(conn: AsyncConnection) -> None:
+    """Индексы поиска для существующей БД (create_all не добавляет индексы к готовым таблицам)"""
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        for statement in _PG_DDL:
+            await conn.execute(text(statement))
+    elif dialect == "sqlite":
+        exists = await conn.scalar(text(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+        ))
+        if not exists:
+            await conn.execute(text(_SQLITE_TABLE))
+            for statement in _SQLITE_BACKFILL:
+                await conn.execute(text(statement))
+            logger.info("SQLite search index created")
+        for statement in _SQLITE_TRIGGERS:
+            await conn.execute(text(statement))
+    else:
+        logger.warning(f"Search indexes are not supported for {dialect}, search will scan")
+
+
+def _like_pattern(query: str, prefix_only: bool) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%" if prefix_only else f"%{escaped}%"
+
+
+async def _search_postgres(session: AsyncSession, query: str, limit: int, prefix_only: bool) -> List[SearchHit]:
+    # Кандидаты ограничены с каждой стороны: частая подстрока не сортирует всю таблицу
+    result = await session.execute(text("""
+        SELECT * FROM (
+            (SELECT 'user' AS kind, telegram_id, username, NULL AS sub_uuid,
+                    similarity(username, :query) AS score
+             FROM users WHERE username ILIKE :pattern ESCAPE '\\'
+             LIMIT :candidates)
+            UNION ALL
+            (SELECT 'subscription', telegram_id, username, sub_uuid,
+                    similarity(username, :query)
+             FROM purchased_subscriptions WHERE username ILIKE :pattern ESCAPE '\\'
+             LIMIT :candidates)
+        ) hits
+        ORDER BY score DESC, username
+        LIMIT :limit
+    """), {
+        "query": query,
+        "pattern": _like_pattern(query, prefix_only),
+        "candidates": limit * 20,
+        "limit": limit
+    })
+    return [SearchHit(*row) for row in result.all()]
+
+
+async def _search_sqlite(session: AsyncSession, query: str, limit: int, prefix_only: bool) -> List[SearchHit]:
+    if prefix_only or len(query) < 3:
+        # trigram не работает с подстроками короче 3 символов
+        rows = (await session.execute(text(
+            "SELECT rowid, 0.0 FROM search_index WHERE text LIKE :pattern ESCAPE '\\' LIMIT :limit"
+        ), {"pattern": _like_pattern(query, True), "limit": limit})).all()
+    else:
+        match = '"' + query.replace('"', '""') + '"'
+        rows = (await session.execute(text(
+            "SELECT rowid, -rank FROM search_index WHERE search_index MATCH :match ORDER BY rank LIMIT :limit"
+        ), {"match": match, "limit": limit})).all()
+
+    scores = {rowid: score for rowid, score in rows}
+    user_ids = [rowid for rowid in scores if rowid > 0]
+    sub_ids = [-rowid for rowid in scores if rowid < 0]
+
+    hits: List[SearchHit] = []
+    if user_ids:
+        result = await session.execute(
+            text("SELECT telegram_id, username FROM users WHERE telegram_id IN :ids")
+            .bindparams(bindparam("ids", expanding=True)),
+            {"ids": user_ids}
+        )
+        hits += [SearchHit("user", tid, name, None, scores[tid]) for tid, name in result.all()]
+    if sub_ids:
+        result = await session.execute(
+            text("SELECT id, telegram_id, username, sub_uuid FROM purchased_subscriptions WHERE id IN :ids")
+            .bindparams(bindparam("ids", expanding=True)),
+            {"ids": sub_ids}
+        )
+        hits += [SearchHit("subscription", tid, name, uuid, scores[-sid]) for sid, tid, name, uuid in result.all()]
+
+    hits.sort(key=lambda hit: (-hit.score, hit.username or ""))
+    return hits
+
+
+@read_only
+async def search_users(
+    session: AsyncSession,
+    query: str,
+    limit: int = SEARCH_RESULT_LIMIT
+) -> List[SearchHit]:
+    """
+    Поиск по username пользователей и подписок: подстрока от SEARCH_MIN_SUBSTRING
+    символов, короче - по началу имени. Число - еще и точное совпадение telegram_id.
+    Результаты отсортированы по релевантности, не больше limit
+    """
+    query = query.strip().lstrip("@")
+    if not query:
+        return []
+    limit = max(1, min(limit, SEARCH_RESULT_LIMIT))
+    prefix_only = len(query) < SEARCH_MIN_SUBSTRING
+
+    try:
+        hits: List[SearchHit] = []
+        if query.isdigit():
+            result = await session.execute(
+                text("SELECT telegram_id, username FROM users WHERE telegram_id = :id"),
+                {"id": int(query)}
+            )
+            hits += [SearchHit("user", tid, name, None, float("inf")) for tid, name in result.all()]
+
+        dialect = session.get_bind().dialect.name
+        if dialect == "postgresql":
+            hits += await _search_postgres(session, query, limit, prefix_only)
+        elif dialect == "sqlite":
+            hits += await _search_sqlite(session, query, limit, prefix_only)
+
+        # Точное совпадение telegram_id может повториться в результатах по имени
+        seen = set()
+        unique = []
+        for hit in hits:
+            key = (hit.kind, hit.telegram_id, hit.sub_uuid)
+            if key not in seen:
+                seen.add(key)
+                unique.append(hit)
+        return unique[:limit]
+    except Exception as e:
+        logger.error(f"Error searching '{query}': {str(e)}", exc_info=True)
+        return []
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[[], Awaitable[Any]]
+
+
+class PeriodicJob:
+    def __init__(self, name: str, interval: float, func: JobFunc, initial_delay: float = 0):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.initial_delay = initial_delay
+        self.runs = 0
+        self.failures = 0
+        self.last_run: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_result: Any = None
+
+    async def run_forever(self) -> None:
+        await asyncio.sleep(self.initial_delay)
+        while True:
+            started = time.monotonic()
+            try:
+                self.last_result = await self.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Job {self.name} failed: {str(e)}", exc_info=True)
+            self.runs += 1
+            self.last_run = time.time()
+            self.last_duration = time.monotonic() - started
+            await asyncio.sleep(max(self.interval - self.last_duration, 0))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "last_duration": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "last_result": self.last_result if isinstance(self.last_result, (int, float, str)) else None
+        }
+
+
+class JobRunner:
+    """
+    Фоновые периодические задачи процесса (компактизация журналов, чистка и т.п.).
+    Запускаются в Application.startup главного процесса, останавливаются в shutdown
+    до закрытия соединений с БД.
+    """
+
+    def __init__(self):
+        self.jobs: List[PeriodicJob] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def add(self, name: str, interval: float, func: JobFunc, initial_delay: float = 0) -> None:
+        self.jobs.append(PeriodicJob(name, interval, func, initial_delay))
+
+    def start(self) -> None:
+        for job in self.jobs:
+            self._tasks.append(asyncio.create_task(job.run_forever(), name=f"job:{job.name}"))
+        if self.jobs:
+            logger.info(f"Background jobs started: {', '.join(job.name for job in self.jobs)}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {job.name: job.stats() for job in self.jobs}
+
+
+job_runner = JobRunner()
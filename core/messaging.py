@@ -0,0 +1,138 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram import Bot
+from aiogram.types import Message
+
+from core.config import EDIT_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+MessageKey = Tuple[int, int]
+
+
+class EditFingerprintCache:
+    """
+    Ограниченная карта (chat_id, message_id) -> отпечаток последнего отрисованного
+    текста и клавиатуры. Позволяет не отправлять editMessageText, если на экране
+    уже то же самое (каждый такой вызов - лишний запрос к Bot API и минус лимит).
+    """
+
+    def __init__(self, maxsize: int = EDIT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._fingerprints: "OrderedDict[MessageKey, bytes]" = OrderedDict()
+        self.sent = 0           # реально отправленные правки
+        self.skipped = 0        # пропущенные по совпавшему отпечатку
+        self.not_modified = 0   # правки, отклоненные Telegram как "message is not modified"
+
+    @staticmethod
+    def fingerprint(text: str, reply_markup: Any = None, parse_mode: Optional[str] = None) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update((parse_mode or "").encode("utf-8"))
+        digest.update(b"\x00")
+        if reply_markup is not None:
+            digest.update(reply_markup.model_dump_json(exclude_none=True).encode("utf-8"))
+        return digest.digest()
+
+    def matches(self, key: MessageKey, fingerprint: bytes) -> bool:
+        current = self._fingerprints.get(key)
+        if current is None:
+            return False
+        self._fingerprints.move_to_end(key)
+        return current == fingerprint
+
+    def remember(self, key: MessageKey, fingerprint: bytes) -> None:
+        self._fingerprints[key] = fingerprint
+        self._fingerprints.move_to_end(key)
+        while len(self._fingerprints) > self.maxsize:
+            self._fingerprints.popitem(last=False)
+
+    def forget(self, key: MessageKey) -> None:
+        self._fingerprints.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sent": self.sent,
+            "not_modified": self.not_modified,
+            "api_calls_saved": self.skipped,
+            "tracked_messages": len(self._fingerprints)
+        }
+
+
+edit_cache = EditFingerprintCache()
+
+
+async def edit_message(
+    message: Message,
+    text: str,
+    reply_markup: Any = None,
+    parse_mode: Optional[str] = None,
+    **kwargs: Any
+) -> bool:
+    """
+    Редактирование сообщения бота с пропуском правки, если содержимое не изменилось.
+    Возвращает True, если запрос к Bot API был отправлен и сообщение изменено.
+    """
+    return await _edit(
+        (message.chat.id, message.message_id), text, reply_markup, parse_mode,
+        lambda params: message.edit_text(text=text, reply_markup=reply_markup, **params),
+        kwargs
+    )
+
+
+async def edit_message_by_id(
+    bot: Bot,
+    chat_id: int,
+    message_id: int,
+    text: str,
+    reply_markup: Any = None,
+    parse_mode: Optional[str] = None,
+    **kwargs: Any
+) -> bool:
+    """То же, что edit_message, когда известны только chat_id и message_id (фоновые задачи)"""
+    return await _edit(
+        (chat_id, message_id), text, reply_markup, parse_mode,
+        lambda params: bot.edit_message_text(
+            text=text, chat_id=chat_id, message_id=message_id, reply_markup=reply_markup, **params
+        ),
+        kwargs
+    )
+
+
+async def _edit(
+    key: MessageKey,
+    text: str,
+    reply_markup: Any,
+    parse_mode: Optional[str],
+    send: Callable[[Dict[str, Any]], Awaitable[Any]],
+    kwargs: Dict[str, Any]
+) -> bool:
+    fingerprint = edit_cache.fingerprint(text, reply_markup, parse_mode)
+
+    if edit_cache.matches(key, fingerprint):
+        edit_cache.skipped += 1
+        logger.debug(f"Edit of message {key} skipped: content unchanged")
+        return False
+
+    params = dict(kwargs)
+    if parse_mode is not None:
+        params["parse_mode"] = parse_mode
+
+    try:
+        await send(params)
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            edit_cache.not_modified += 1
+            edit_cache.remember(key, fingerprint)
+            return False
+        edit_cache.forget(key)
+        raise
+
+    edit_cache.sent += 1
+    edit_cache.remember(key, fingerprint)
+    return True
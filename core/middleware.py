@@ -1,14 +1,28 @@
-from typing import Callable, Dict, Awaitable, Any, Union
+import asyncio
+from typing import Callable, Dict, Awaitable, Any, Union, List
 from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
 from aiogram.types import TelegramObject, Message, CallbackQuery, Update
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
-from core.database.crud import get_user_by_telegram_id, create_user
+from core.database.crud import upsert_user, mark_update_processed
 from core.database.model import User
 import logging
 
 logger = logging.getLogger(__name__)
 
 class RoleMiddleware(BaseMiddleware):
+    """
+    Пользователь и роль для хендлеров, плюс одна сессия БД на апдейт (data["session"]).
+    Сессия не берет соединение, пока к ней не обратились; после хендлера
+    незафиксированное коммитится, при исключении - откатывается.
+
+    data["user"] и все объекты, загруженные хендлером, принадлежат этой сессии.
+    Откат (в хендлере или в функции crud - они откатывают при ошибке и при отказе,
+    например debit_balance, create_paid_order, redeem_promocode, claim_next_ticket)
+    сбрасывает их атрибуты, а повторная загрузка в асинхронной сессии падает с
+    MissingGreenlet. Нужные после вызова crud значения сохраняйте до него или
+    загружайте объекты заново
+    """
     def __init__(self, session_pool: async_sessionmaker[AsyncSession]):
         super().__init__()
         self.session_pool = session_pool
@@ -22,51 +36,138 @@ class RoleMiddleware(BaseMiddleware):
         logger.debug(f"RoleMiddleware processing event: {type(event)}")
         data.update({"user": None, "role": "USER"})
 
+        async with self.session_pool() as session:
+            data["session"] = session
+            await self._load_user(session, event, data)
+            try:
+                result = await handler(event, data)
+            except Exception:
+                await session.rollback()
+                raise
+            if session.in_transaction():
+                await session.commit()
+            return result
+
+    async def _load_user(self, session: AsyncSession, event: TelegramObject, data: Dict[str, Any]) -> None:
         # Extract actual event from Update if needed
         actual_event = event
         if isinstance(event, Update):
             actual_event = event.message or event.callback_query
             if not actual_event:
                 logger.debug("Unsupported Update event type")
-                return await handler(event, data)
+                return
 
         # Check if we have a supported event with from_user
         if not isinstance(actual_event, (Message, CallbackQuery)) or not actual_event.from_user:
             logger.debug("Event doesn't have from_user, skipping user processing")
-            return await handler(event, data)
+            return
 
         user = actual_event.from_user
         telegram_id = user.id
         logger.debug(f"Processing user with telegram_id: {telegram_id}")
 
         try:
-            async with self.session_pool() as session:
-                async with session.begin():
-                    # Try to get existing user
-                    db_user = await get_user_by_telegram_id(session, telegram_id)
-                    
-                    # Create new user if doesn't exist
-                    if not db_user:
-                        logger.debug(f"Creating new user for telegram_id: {telegram_id}")
-                        db_user = await create_user(
-                            session=session,
-                            telegram_id=telegram_id,
-                            username=user.username
-                        )
-                        
-                        if not db_user:
-                            logger.error(f"Failed to create user for telegram_id: {telegram_id}")
-                            return await handler(event, data)
-
-                    # Update data for handler
-                    data.update({
-                        "user": db_user,
-                        "role": db_user.role.upper() if db_user else "USER"
-                    })
-                    logger.debug(f"User data updated: {data['role']}")
+            # Создание или обновление username - один запрос
+            db_user = await upsert_user(session, telegram_id, user.username)
+            if not db_user:
+                logger.error(f"Failed to upsert user for telegram_id: {telegram_id}")
+                return
+            # Фиксируем сразу: откат в хендлере не удалит нового пользователя,
+            # а блокировка строки не держится, пока работает хендлер
+            await session.commit()
+
+            # Update data for handler
+            data.update({
+                "user": db_user,
+                "role": db_user.role.upper() if db_user else "USER"
+            })
+            logger.debug(f"User data updated: {data['role']}")
 
         except Exception as e:
             logger.error(f"Error processing user {telegram_id}: {str(e)}", exc_info=True)
+            await session.rollback()
             # Continue with default data (user=None, role=USER)
-        
-        return await handler(event, data)
\ No newline at end of file
+
+class InFlightMiddleware(BaseMiddleware):
+    """
+    Учет апдейтов, которые сейчас обрабатываются.
+    Нужен для корректного завершения: после остановки polling
+    Application.shutdown дожидается этих задач (drain), а не обрывает их.
+    """
+    def __init__(self):
+        super().__init__()
+        self.in_flight: Dict[asyncio.Task, int] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        task = asyncio.current_task()
+        self.in_flight[task] = getattr(event, "update_id", 0)
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight.pop(task, None)
+
+    async def drain(self, timeout: float, report_interval: float = 2.0) -> List[int]:
+        """
+        Ожидание завершения обрабатываемых апдейтов не дольше timeout секунд.
+        Возвращает update_id апдейтов, которые не успели завершиться (их задачи отменяются).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while self.in_flight:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            logger.info(
+                f"Waiting for {len(self.in_flight)} in-flight updates "
+                f"({remaining:.1f}s left)"
+            )
+            await asyncio.wait(set(self.in_flight), timeout=min(report_interval, remaining))
+
+        unfinished = dict(self.in_flight)
+        for task, update_id in unfinished.items():
+            logger.warning(f"Update {update_id} did not finish before shutdown deadline, cancelling")
+            task.cancel()
+        if unfinished:
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+        return sorted(unfinished.values())
+
+class UpdateDeduplicationMiddleware(BaseMiddleware):
+    """
+    Отбрасывает апдейты, которые уже взял в обработку другой (или этот же) воркер.
+    Используется в многопроцессном режиме для повторной доставки одного update_id.
+
+    Апдейт отмечается до обработки, поэтому гарантия - не больше одного раза, пока
+    таблица дедупликации доступна: если хендлер упал, повтора не будет. При ошибке БД
+    отметка пропускается и апдейт обрабатывается (лучше повтор, чем потерянный апдейт),
+    то есть в этом случае доставка - at-least-once
+    """
+    def __init__(self, session_pool: async_sessionmaker[AsyncSession], worker_id: int):
+        super().__init__()
+        self.session_pool = session_pool
+        self.worker_id = worker_id
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_id = getattr(event, "update_id", None)
+        if update_id is None:
+            return await handler(event, data)
+
+        async with self.session_pool() as session:
+            is_new = await mark_update_processed(session, update_id, self.worker_id)
+
+        if not is_new:
+            logger.info(f"Update {update_id} already processed, skipping")
+            return UNHANDLED
+
+        return await handler(event, data)
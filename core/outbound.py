@@ -0,0 +1,319 @@
+import asyncio
+import itertools
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from core.config import (
+    OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_GROUP_RATE,
+    OUTBOUND_CHAT_BURST, OUTBOUND_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Чем меньше значение, тем раньше уходит запрос"""
+    INTERACTIVE = 0     # ответы на действия пользователя
+    NOTIFICATION = 1    # уведомления другим пользователям
+    BULK = 2            # рассылки
+
+
+_current_priority: ContextVar[Priority] = ContextVar("outbound_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def outbound_priority(level: Priority) -> Iterator[None]:
+    """Приоритет для всех запросов к Bot API внутри блока"""
+    token = _current_priority.set(level)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class TokenBucket:
+    """Token bucket на времени event loop"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = asyncio.get_running_loop().time()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def ready_at(self, now: float) -> float:
+        """Момент, когда станет доступен токен"""
+        self._refill(now)
+        ready = now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+        return max(ready, self.paused_until)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float) -> None:
+        """Пауза после flood wait (retry_after)"""
+        self.paused_until = max(self.paused_until, until)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    make_request: Any = field(compare=False)
+    bot: Any = field(compare=False)
+    method: Any = field(compare=False)
+    chat_id: Union[int, str] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class _WaitStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "sent": self.count,
+            "avg_wait_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "max_wait_ms": round(self.max * 1000, 2)
+        }
+
+
+class OutboundSender(BaseRequestMiddleware):
+    """
+    Единая очередь исходящих запросов к Bot API (request-middleware сессии бота).
+
+    Все методы с chat_id (sendMessage, editMessageText, ...) проходят через очередь
+    с приоритетами: глобальный token bucket + отдельный bucket на каждый чат.
+    На TelegramRetryAfter запрос автоматически повторяется после retry_after.
+    Методы без chat_id (getUpdates, answerCallbackQuery) идут напрямую.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOUND_GLOBAL_RATE,
+        chat_rate: float = OUTBOUND_CHAT_RATE,
+        group_rate: float = OUTBOUND_GROUP_RATE,
+        chat_burst: float = OUTBOUND_CHAT_BURST,
+        max_retries: int = OUTBOUND_MAX_RETRIES
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._global: Optional[TokenBucket] = None
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._seq = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self._sending: set = set()
+        self._deferred: Dict[int, Tuple[_Job, asyncio.TimerHandle]] = {}
+        self._pending = 0
+
+        self.waits = {level: _WaitStats() for level in Priority}
+        self.flood_waits = 0
+        self.retries = 0
+        self.failed = 0
+
+    # ---------- жизненный цикл ----------
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._task = asyncio.create_task(self._dispatch())
+        logger.info(f"Outbound sender started ({self.global_rate}/s global)")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Отправка того, что уже в очереди, затем остановка"""
+        if not self.running:
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._pending and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self._pending:
+            logger.warning(f"Outbound sender stopped with {self._pending} unsent requests")
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        # Отложенные (занятый чат, flood wait) и оставшиеся в очереди запросы
+        # завершаются ошибкой, иначе ожидающие их хендлеры зависнут
+        stopped = RuntimeError("Outbound sender stopped")
+        for job, handle in self._deferred.values():
+            handle.cancel()
+            if not job.future.done():
+                job.future.set_exception(stopped)
+        self._deferred.clear()
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if not job.future.done():
+                job.future.set_exception(stopped)
+        logger.info("Outbound sender stopped")
+
+    # ---------- request middleware ----------
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not self.running:
+            return await make_request(bot, method)
+
+        loop = asyncio.get_running_loop()
+        job = _Job(
+            priority=int(_current_priority.get()),
+            seq=next(self._seq),
+            make_request=make_request,
+            bot=bot,
+            method=method,
+            chat_id=chat_id,
+            future=loop.create_future(),
+            enqueued_at=loop.time()
+        )
+        self._pending += 1
+        self._queue.put_nowait(job)
+        try:
+            return await job.future
+        finally:
+            self._pending -= 1
+
+    # ---------- диспетчер ----------
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._prune_chats()
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(self.group_rate if is_group else self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune_chats(self) -> None:
+        now = asyncio.get_running_loop().time()
+        for chat_id in [c for c, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_id]
+
+    def _defer(self, job: _Job, at: float) -> None:
+        """Вернуть запрос в очередь, когда чат снова сможет принимать сообщения"""
+        def requeue():
+            del self._deferred[job.seq]
+            self._queue.put_nowait(job)
+
+        self._deferred[job.seq] = (job, asyncio.get_running_loop().call_at(at, requeue))
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            if job.future.done():  # вызывающий хендлер уже отменен
+                continue
+
+            chat = self._chat_bucket(job.chat_id)
+            now = loop.time()
+            chat_ready = chat.ready_at(now)
+            if chat_ready > now:
+                # Чат занят - не держим очередь, пропускаем вперед запросы в другие чаты
+                self._defer(job, chat_ready)
+                continue
+
+            global_ready = self._global.ready_at(now)
+            if global_ready > now:
+                await asyncio.sleep(global_ready - now)
+                now = loop.time()
+
+            self._global.take(now)
+            chat.take(now)
+            if job.attempts == 0:
+                self.waits[Priority(job.priority)].add(now - job.enqueued_at)
+
+            task = asyncio.create_task(self._send(job))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, job: _Job) -> None:
+        try:
+            result = await job.make_request(job.bot, job.method)
+        except TelegramRetryAfter as e:
+            self.flood_waits += 1
+            loop = asyncio.get_running_loop()
+            resume_at = loop.time() + e.retry_after
+            # Flood control Telegram действует и на бота целиком, а не только на чат
+            self._chat_bucket(job.chat_id).pause(resume_at)
+            self._global.pause(resume_at)
+            if job.attempts >= self.max_retries:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            job.attempts += 1
+            self.retries += 1
+            logger.warning(
+                f"Flood wait {e.retry_after}s for chat {job.chat_id}, "
+                f"retry {job.attempts}/{self.max_retries}"
+            )
+            self._defer(job, resume_at)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    # ---------- метрики ----------
+
+    def stats(self) -> Dict[str, Any]:
+        depth = {level.name.lower(): 0 for level in Priority}
+        if self._queue is not None:
+            for job in list(self._queue._queue):
+                depth[Priority(job.priority).name.lower()] += 1
+        return {
+            "running": self.running,
+            "queue_depth": depth,
+            "deferred": len(self._deferred),
+            "in_flight": len(self._sending),
+            "pending": self._pending,
+            "wait": {level.name.lower(): stats.as_dict() for level, stats in self.waits.items()},
+            "flood_waits": self.flood_waits,
+            "retries": self.retries,
+            "failed": self.failed,
+            "tracked_chats": len(self._chats)
+        }
+
+
+outbound_sender = OutboundSender()
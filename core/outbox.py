@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import (
+    OUTBOX_POLL_INTERVAL, OUTBOX_BATCH_SIZE, OUTBOX_CONCURRENCY,
+    OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE, OUTBOX_RETRY_MAX
+)
+from core.database import crud
+from core.database.database import async_session
+from core.database.model import RemnawaveOutbox
+
+logger = logging.getLogger(__name__)
+
+# Пока пачка в работе, другие экземпляры диспетчера ее не трогают
+OUTBOX_LEASE = timedelta(seconds=120)
+
+
+def _coalesce(entries: List[RemnawaveOutbox]) -> List[Tuple[str, Dict[str, Any], List[int]]]:
+    """
+    Записи одной подписки -> список вызовов панели (операция, данные, ID записей).
+    Все update_user сливаются в один вызов (поздние значения перекрывают ранние),
+    повторное удаление одного и того же устройства - один вызов
+    """
+    update_payload: Dict[str, Any] = {}
+    update_ids: List[int] = []
+    removals: Dict[str, List[int]] = {}
+
+    for entry in entries:
+        if entry.operation == crud.OUTBOX_UPDATE_USER:
+            update_payload.update(entry.payload)
+            update_ids.append(entry.id)
+        elif entry.operation == crud.OUTBOX_REMOVE_DEVICE:
+            removals.setdefault(entry.payload["hwid"], []).append(entry.id)
+        else:
+            logger.error(f"Unknown outbox operation '{entry.operation}' (entry {entry.id})")
+
+    calls = [
+        (crud.OUTBOX_REMOVE_DEVICE, {"hwid": hwid}, ids)
+        for hwid, ids in removals.items()
+    ]
+    if update_ids:
+        calls.append((crud.OUTBOX_UPDATE_USER, update_payload, update_ids))
+    return calls
+
+
+class OutboxDispatcher:
+    """
+    Применение изменений из remnawave_outbox к панели.
+
+    Хендлеры записывают изменение в outbox в одной транзакции с локальным
+    и сразу отвечают пользователю; диспетчер забирает пачки (OUTBOX_BATCH_SIZE),
+    группирует по UUID подписки, сливает повторные изменения одной подписки
+    и выполняет вызовы параллельно (OUTBOX_CONCURRENCY подписок одновременно).
+    Неудачные вызовы повторяются с экспоненциальной задержкой.
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        retry_base: float = OUTBOX_RETRY_BASE,
+        retry_max: float = OUTBOX_RETRY_MAX
+    ):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.applied = 0
+        self.coalesced = 0
+        self.retried = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="remnawave-outbox")
+
+    async def stop(self) -> None:
+        """Недоставленное останется в таблице и уйдет после перезапуска"""
+        if not self.running:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def wake(self) -> None:
+        """Не ждать следующего опроса (в процессах без диспетчера ничего не делает)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {str(e)}", exc_info=True)
+                processed = 0
+            # Полная пачка - за следующей сразу, иначе ждем опроса или wake()
+            if processed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        async with async_session() as session:
+            entries = await crud.claim_outbox_batch(session, self.batch_size, OUTBOX_LEASE)
+        if not entries:
+            return 0
+
+        by_uuid: Dict[str, List[RemnawaveOutbox]] = {}
+        for entry in entries:
+            by_uuid.setdefault(entry.sub_uuid, []).append(entry)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def apply_subscription(sub_uuid: str, group: List[RemnawaveOutbox]):
+            async with semaphore:
+                await self._apply(sub_uuid, group)
+
+        await asyncio.gather(*(
+            apply_subscription(sub_uuid, group) for sub_uuid, group in by_uuid.items()
+        ))
+        self.batches += 1
+        return len(entries)
+
+    async def _apply(self, sub_uuid: str, entries: List[RemnawaveOutbox]) -> None:
+        from core.api.remnawave_client import remnawave_service
+
+        calls = _coalesce(entries)
+        self.coalesced += len(entries) - len(calls)
+        attempts = max(entry.attempts for entry in entries)
+
+        done: List[int] = []
+        for operation, payload, ids in calls:
+            if operation == crud.OUTBOX_REMOVE_DEVICE:
+                ok = await remnawave_service.remove_device(sub_uuid, payload["hwid"])
+                error = None if ok else "Device removal failed"
+            else:
+                result = await remnawave_service.update_user(sub_uuid, payload)
+                error = result.get("error")
+
+            if error is None:
+                done.extend(ids)
+                continue
+
+            delay = min(self.retry_base * 2 ** attempts, self.retry_max)
+            self.retried += len(ids)
+            logger.warning(
+                f"Outbox {operation} for {sub_uuid} failed ({error}), "
+                f"attempt {attempts + 1}/{self.max_attempts}, next in {delay:.0f}s"
+            )
+            async with async_session() as session:
+                await crud.retry_outbox_entries(
+                    session, ids, error, timedelta(seconds=delay), self.max_attempts
+                )
+
+        if done:
+            async with async_session() as session:
+                await crud.complete_outbox_entries(session, done)
+            self.applied += len(done)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "batches": self.batches,
+            "applied": self.applied,
+            "coalesced": self.coalesced,
+            "retried": self.retried
+        }
+
+
+outbox_dispatcher = OutboxDispatcher()
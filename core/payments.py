@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import PAYMENT_WEBHOOK_SECRET, PAYMENT_BATCH_WINDOW_MS, PAYMENT_BATCH_MAX_SIZE
+from core.database import crud
+from core.database.database import async_session
+
+logger = logging.getLogger(__name__)
+
+
+class CreditResult(str, Enum):
+    CREDITED = "credited"
+    DUPLICATE = "duplicate"
+    UNKNOWN_USER = "unknown_user"
+
+
+# Значение из старого .env.example - с ним вебхук не принимается, как и без секрета
+PLACEHOLDER_SECRET = "your_webhook_secret_here"
+
+
+def verify_signature(body: bytes, signature: Optional[str], secret: Optional[str] = PAYMENT_WEBHOOK_SECRET) -> bool:
+    """Проверка подписи вебхука: hex(HMAC-SHA256(secret, body))"""
+    if not secret or secret == PLACEHOLDER_SECRET or not signature:
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().lower())
+
+
+_Pending = Tuple[Dict[str, Any], asyncio.Future]
+
+
+class LedgerBatcher:
+    """
+    Группировка зачислений, пришедших почти одновременно, в одну транзакцию.
+
+    Первый запрос открывает окно в PAYMENT_BATCH_WINDOW_MS; все, что пришло за это
+    время (но не больше PAYMENT_BATCH_MAX_SIZE), вставляется одним INSERT ... ON CONFLICT
+    DO NOTHING и одним COMMIT. Каждый вызывающий получает свой результат:
+    зачислено / дубликат / неизвестный пользователь.
+    """
+
+    def __init__(self, window_ms: float = PAYMENT_BATCH_WINDOW_MS, max_size: int = PAYMENT_BATCH_MAX_SIZE):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.entries = 0
+        self.duplicates = 0
+        self.max_batch = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Записать то, что уже в очереди, и остановиться"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def credit(
+        self,
+        telegram_id: int,
+        amount: Decimal,
+        idempotency_key: str,
+        reference: Optional[str] = None,
+        reason: str = "topup"
+    ) -> CreditResult:
+        if not self.running:
+            raise RuntimeError("Ledger batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        entry = {
+            "telegram_id": telegram_id,
+            "amount": amount,
+            "reason": reason,
+            "reference": reference,
+            "idempotency_key": idempotency_key
+        }
+        await self._queue.put((entry, future))
+        return await future
+
+    async def _collect(self, first: _Pending) -> Tuple[List[_Pending], bool]:
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch, stopping = await self._collect(first)
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} ledger entries: {str(e)}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _flush(self, batch: List[_Pending]) -> None:
+        # Один ключ дважды в пачке (повтор в пределах окна) - вставляем один раз
+        by_key: Dict[str, List[asyncio.Future]] = {}
+        entries: List[Dict[str, Any]] = []
+        for entry, future in batch:
+            if entry["idempotency_key"] not in by_key:
+                by_key[entry["idempotency_key"]] = []
+                entries.append(entry)
+            by_key[entry["idempotency_key"]].append(future)
+
+        async with async_session() as session:
+            known_users = await crud.get_existing_telegram_ids(
+                session, list({entry["telegram_id"] for entry in entries})
+            )
+            if known_users is None:
+                # Не "неизвестный пользователь": 404 остановил бы повторы платежной системы
+                raise RuntimeError("Users were not checked")
+            valid = [entry for entry in entries if entry["telegram_id"] in known_users]
+            inserted = await crud.insert_balance_entries(session, valid) if valid else set()
+
+        if inserted is None:
+            raise RuntimeError("Balance entries were not saved")
+
+        self.batches += 1
+        self.entries += len(inserted)
+        self.max_batch = max(self.max_batch, len(batch))
+
+        for entry in entries:
+            futures = by_key[entry["idempotency_key"]]
+            if entry["telegram_id"] not in known_users:
+                results = [CreditResult.UNKNOWN_USER] * len(futures)
+            elif entry["idempotency_key"] in inserted:
+                results = [CreditResult.CREDITED] + [CreditResult.DUPLICATE] * (len(futures) - 1)
+            else:
+                results = [CreditResult.DUPLICATE] * len(futures)
+            for future, result in zip(futures, results):
+                if result == CreditResult.DUPLICATE:
+                    self.duplicates += 1
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "entries": self.entries,
+            "duplicates": self.duplicates,
+            "avg_batch": round(self.entries / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch
+        }
+
+
+ledger_batcher = LedgerBatcher()
@@ -0,0 +1,155 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+# Файл, в который дочерний процесс записывает замеры фаз инициализации
+PROFILE_OUTPUT_ENV = "STARTUP_PROFILE_OUTPUT"
+
+# Формат строк `python -X importtime`:
+# import time:       412 |        933 |   encodings
+IMPORT_TIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+@dataclass
+class PhaseTiming:
+    name: str
+    seconds: float
+    error: Optional[str] = None
+
+
+class StartupProfiler:
+    """Замеры фаз инициализации приложения (Application.startup)"""
+
+    def __init__(self):
+        self.phases: List[PhaseTiming] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.phases.append(PhaseTiming(name, time.perf_counter() - started, error))
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([phase.__dict__ for phase in self.phases], f)
+
+    @staticmethod
+    def load(path: str) -> List[PhaseTiming]:
+        with open(path, encoding="utf-8") as f:
+            return [PhaseTiming(**item) for item in json.load(f)]
+
+
+def parse_import_times(stderr: str) -> List[ImportTiming]:
+    """Разбор вывода -X importtime"""
+    timings = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        timings.append(ImportTiming(
+            module=module,
+            self_us=int(self_us),
+            cumulative_us=int(cumulative_us),
+            depth=len(indent) // 2
+        ))
+    return timings
+
+
+def top_level_packages(timings: List[ImportTiming]) -> Dict[str, int]:
+    """Суммарное собственное время импорта по пакетам верхнего уровня (aiogram, sqlalchemy, ...)"""
+    totals: Dict[str, int] = {}
+    for timing in timings:
+        package = timing.module.split(".")[0]
+        totals[package] = totals.get(package, 0) + timing.self_us
+    return totals
+
+
+def format_report(
+    imports: List[ImportTiming],
+    phases: List[PhaseTiming],
+    top: int = 25
+) -> str:
+    lines = ["", "=== Startup profile ===", ""]
+
+    if imports:
+        total_us = sum(t.self_us for t in imports)
+        lines.append(f"Импорт модулей: {len(imports)} шт., {total_us / 1000:.1f} ms суммарно")
+        lines.append("")
+        lines.append(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for timing in sorted(imports, key=lambda t: t.cumulative_us, reverse=True)[:top]:
+            lines.append(
+                f"{timing.cumulative_us / 1000:>14.1f} {timing.self_us / 1000:>9.1f}  {timing.module}"
+            )
+        lines.append("")
+        lines.append(f"{'self ms':>14}  package")
+        packages = sorted(top_level_packages(imports).items(), key=lambda item: item[1], reverse=True)
+        for package, self_us in packages[:top]:
+            lines.append(f"{self_us / 1000:>14.1f}  {package}")
+        lines.append("")
+
+    if phases:
+        total = sum(p.seconds for p in phases)
+        lines.append(f"Инициализация: {total * 1000:.1f} ms")
+        lines.append("")
+        lines.append(f"{'ms':>14}  phase")
+        for phase in sorted(phases, key=lambda p: p.seconds, reverse=True):
+            suffix = f"  [ошибка: {phase.error}]" if phase.error else ""
+            lines.append(f"{phase.seconds * 1000:>14.1f}  {phase.name}{suffix}")
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+def run_with_importtime(script: str, args: List[str], top: int = 25) -> int:
+    """
+    Перезапуск скрипта с -X importtime: время импортов можно снять только
+    с момента старта интерпретатора. Дочерний процесс пишет замеры фаз
+    в временный файл, родитель печатает общий отсортированный отчет.
+    """
+    fd, output_path = tempfile.mkstemp(prefix="startup-profile-", suffix=".json")
+    os.close(fd)
+    env = dict(os.environ, **{PROFILE_OUTPUT_ENV: output_path})
+
+    try:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", script, *args],
+            env=env,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        imports = parse_import_times(result.stderr)
+        # Все, что не относится к importtime (логи, трейсбеки), пробрасываем как есть
+        passthrough = [
+            line for line in result.stderr.splitlines()
+            if not line.startswith("import time:")
+        ]
+        if passthrough:
+            print("\n".join(passthrough), file=sys.stderr)
+
+        phases = StartupProfiler.load(output_path) if os.path.getsize(output_path) else []
+        print(format_report(imports, phases, top=top))
+        return result.returncode
+    finally:
+        os.unlink(output_path)
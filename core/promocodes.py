@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import (
+    PROMO_CACHE_REFRESH_SECONDS, PROMO_CACHE_CHECK_SECONDS,
+    PROMO_NEGATIVE_CACHE_SIZE, PROMO_BLOOM_ERROR_RATE
+)
+from core.database import crud
+from core.database.crud import RedeemResult
+from core.database.model import Promocode, UsedPromocode
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Bloom filter на bytearray (double hashing поверх одного blake2b)"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str) -> Iterable[int]:
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+@dataclass(frozen=True)
+class CachedPromocode:
+    """Неизменяемые поля промокода, нужные для применения"""
+    id: int
+    code: str
+    uses_per_user: int
+    discount_value: Decimal
+    valid_until: datetime
+
+
+class PromocodeCache:
+    """
+    Кеш перед поиском промокодов:
+
+    * Bloom filter всех действующих кодов - неверные коды (опечатки, перебор)
+      отсекаются без запроса к БД;
+    * отрицательный LRU - коды, прошедшие Bloom filter (ложное срабатывание),
+      но отсутствующие в БД, и исчерпанные коды;
+    * положительный кеш - найденные коды живут до valid_until или до исчерпания.
+
+    Промокоды создаются и включаются и вне бота (админка, SQL), поэтому не чаще
+    раза в PROMO_CACHE_CHECK_SECONDS набор действующих кодов сверяется с БД
+    одним агрегатом (число и сумма id); если он изменился, фильтр пересобирается.
+    Кроме того, фильтр пересобирается при invalidate() и не реже раза
+    в PROMO_CACHE_REFRESH_SECONDS. Если фильтр собрать не удалось, поиск идет
+    в БД (fail open).
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: float = PROMO_CACHE_REFRESH_SECONDS,
+        check_seconds: float = PROMO_CACHE_CHECK_SECONDS,
+        negative_size: int = PROMO_NEGATIVE_CACHE_SIZE,
+        error_rate: float = PROMO_BLOOM_ERROR_RATE
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.check_seconds = check_seconds
+        self.negative_size = negative_size
+        self.error_rate = error_rate
+
+        self._bloom: Optional[BloomFilter] = None
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        self._signature: Optional[Tuple[int, int]] = None
+        self._stale = True
+        self._lock = asyncio.Lock()
+        self._positive: Dict[str, CachedPromocode] = {}
+        self._negative: "OrderedDict[str, None]" = OrderedDict()
+
+        self.bloom_rejects = 0
+        self.negative_hits = 0
+        self.positive_hits = 0
+        self.db_lookups = 0
+        self.rebuilds = 0
+
+    # ---------- сборка ----------
+
+    def invalidate(self) -> None:
+        """Промокоды изменились: пересобрать фильтр при следующем обращении"""
+        self._stale = True
+
+    def _needs_rebuild(self) -> bool:
+        return self._stale or time.monotonic() - self._built_at > self.refresh_seconds
+
+    @staticmethod
+    def _active(query, now: datetime):
+        return (
+            query
+            .where(Promocode.is_active == True)
+            .where(Promocode.valid_until >= now)
+            .where(Promocode.remaining_uses > 0)
+        )
+
+    async def _changed(self, session: AsyncSession) -> bool:
+        """Изменился ли набор действующих кодов с последней сборки (не чаще check_seconds)"""
+        if time.monotonic() - self._checked_at < self.check_seconds:
+            return False
+        self._checked_at = time.monotonic()
+        try:
+            count, id_sum = (await session.execute(
+                self._active(select(func.count(Promocode.id), func.coalesce(func.sum(Promocode.id), 0)), datetime.now())
+            )).one()
+        except Exception as e:
+            logger.error(f"Error checking promocode changes: {str(e)}", exc_info=True)
+            return False
+        return (count, int(id_sum)) != self._signature
+
+    async def rebuild(self, session: AsyncSession) -> None:
+        result = await session.stream(self._active(select(Promocode.id, Promocode.code), datetime.now()))
+        rows = [row async for row in result]
+
+        bloom = BloomFilter(len(rows), self.error_rate)
+        for row in rows:
+            bloom.add(row.code)
+
+        self._bloom = bloom
+        self._positive.clear()
+        self._negative.clear()
+        self._built_at = self._checked_at = time.monotonic()
+        self._signature = (len(rows), sum(row.id for row in rows))
+        self._stale = False
+        self.rebuilds += 1
+        logger.info(f"Promocode filter rebuilt: {len(rows)} codes, {bloom.size} bits, {bloom.hashes} hashes")
+
+    async def _ensure_fresh(self, session: AsyncSession) -> None:
+        if not self._needs_rebuild() and not await self._changed(session):
+            return
+        built_at = self._built_at
+        async with self._lock:
+            if self._built_at != built_at:
+                return  # уже пересобран параллельным вызовом, пока ждали блокировку
+            try:
+                await self.rebuild(session)
+            except Exception as e:
+                logger.error(f"Error rebuilding promocode filter: {str(e)}", exc_info=True)
+                self._bloom = None
+                # Повторная попытка не раньше следующего интервала
+                self._built_at = self._checked_at = time.monotonic()
+                self._stale = False
+
+    # ---------- отрицательный кеш ----------
+
+    def _remember_missing(self, code: str) -> None:
+        self._negative[code] = None
+        self._negative.move_to_end(code)
+        while len(self._negative) > self.negative_size:
+            self._negative.popitem(last=False)
+
+    def mark_exhausted(self, code: str) -> None:
+        """Код исчерпан или выключен - до пересборки фильтра отвечаем без БД"""
+        self._positive.pop(code, None)
+        self._remember_missing(code)
+
+    # ---------- поиск ----------
+
+    async def get(self, session: AsyncSession, code: str) -> Optional[CachedPromocode]:
+        """Действующий промокод или None"""
+        await self._ensure_fresh(session)
+
+        cached = self._positive.get(code)
+        if cached is not None:
+            if cached.valid_until >= datetime.now():
+                self.positive_hits += 1
+                return cached
+            self.mark_exhausted(code)
+
+        if code in self._negative:
+            self._negative.move_to_end(code)
+            self.negative_hits += 1
+            return None
+
+        if self._bloom is not None and code not in self._bloom:
+            self.bloom_rejects += 1
+            return None
+
+        self.db_lookups += 1
+        promo = await crud.get_active_promocode(session, code)
+        if promo is None or promo.remaining_uses <= 0:
+            self._remember_missing(code)
+            return None
+
+        cached = CachedPromocode(
+            id=promo.id,
+            code=promo.code,
+            uses_per_user=promo.uses_per_user,
+            discount_value=promo.discount_value,
+            valid_until=promo.valid_until
+        )
+        self._positive[code] = cached
+        return cached
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "positive_hits": self.positive_hits,
+            "negative_hits": self.negative_hits,
+            "bloom_rejects": self.bloom_rejects,
+            "db_lookups": self.db_lookups,
+            "rebuilds": self.rebuilds,
+            "cached_codes": len(self._positive),
+            "negative_codes": len(self._negative),
+            "bloom_bits": self._bloom.size if self._bloom else 0
+        }
+
+
+promocode_cache = PromocodeCache()
+
+
+async def redeem(
+    session: AsyncSession,
+    telegram_id: int,
+    code: str
+) -> Tuple[RedeemResult, Optional[UsedPromocode], Optional[CachedPromocode]]:
+    """Применение промокода: неверные коды отсекаются кешем, верные идут в redeem_promocode"""
+    promo = await promocode_cache.get(session, code)
+    if promo is None:
+        return RedeemResult.NOT_FOUND, None, None
+
+    result, used_promo = await crud.redeem_promocode(session, telegram_id, code, promo=promo)
+    if result in (RedeemResult.EXHAUSTED, RedeemResult.NOT_FOUND):
+        promocode_cache.mark_exhausted(code)
+    return result, used_promo, promo
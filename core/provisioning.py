@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from core.config import (
+    PLANS_CACHE_SECONDS, PROVISIONING_CONCURRENCY,
+    PROVISIONING_MAX_ATTEMPTS, PROVISIONING_RETRY_DELAY
+)
+from core.database import crud
+from core.database.database import async_session
+from core.database.model import SubscriptionPlan, SubscriptionOrder
+from core.messaging import edit_message_by_id
+
+logger = logging.getLogger(__name__)
+
+
+class PlanCache:
+    """Список тарифов с TTL: меню покупки не ходит в БД на каждое нажатие"""
+
+    def __init__(self, ttl: float = PLANS_CACHE_SECONDS):
+        self.ttl = ttl
+        self._plans: Optional[List[SubscriptionPlan]] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._plans = None
+
+    async def get_all(self, session) -> List[SubscriptionPlan]:
+        if self._plans is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self._plans
+        async with self._lock:
+            if self._plans is None or time.monotonic() - self._loaded_at >= self.ttl:
+                plans = await crud.get_available_plans(session)
+                # Отсоединяем объекты: они живут дольше сессии и используются только для чтения
+                for plan in plans:
+                    session.expunge(plan)
+                self._plans = plans
+                self._loaded_at = time.monotonic()
+        return self._plans
+
+    async def get(self, session, plan_id: int) -> Optional[SubscriptionPlan]:
+        now = datetime.now()
+        for plan in await self.get_all(session):
+            if plan.id == plan_id and plan.end_date > now:
+                return plan
+        return None
+
+
+plan_cache = PlanCache()
+
+
+def panel_username(order: SubscriptionOrder) -> str:
+    """Имя пользователя в панели: детерминировано по заказу, чтобы повтор не создал дубль"""
+    return f"breeze_{order.telegram_id}_{order.id}"
+
+
+class Provisioner:
+    """
+    Фоновое создание подписок по оплаченным заказам.
+
+    Хендлер покупки только списывает баланс и создает заказ, а ID заказа
+    кладет в очередь; исполнители создают пользователя в Remnawave, запись
+    PurchasedSubscription и редактируют сообщение покупателя. Ошибки панели
+    повторяются с задержкой, после PROVISIONING_MAX_ATTEMPTS заказ отменяется
+    с возвратом средств. Незавершенные заказы подхватываются при старте.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = PROVISIONING_CONCURRENCY,
+        max_attempts: int = PROVISIONING_MAX_ATTEMPTS,
+        retry_delay: float = PROVISIONING_RETRY_DELAY
+    ):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.bot = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._retries: set = set()
+
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self, bot, recover: bool = True) -> None:
+        if self.running:
+            return
+        self.bot = bot
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"provisioning:{i}")
+            for i in range(self.concurrency)
+        ]
+        if recover:
+            # Заказы, прерванные прошлым запуском (обновлялись больше 5 минут назад)
+            async with async_session() as session:
+                order_ids = await crud.get_unfinished_order_ids(
+                    session, stale_before=datetime.now() - timedelta(minutes=5)
+                )
+            for order_id in order_ids:
+                self.enqueue(order_id)
+            if order_ids:
+                logger.info(f"Recovered {len(order_ids)} unfinished orders")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дождаться текущих заказов; оставшиеся в очереди подхватит следующий запуск"""
+        if not self.running:
+            return
+        for handle in self._retries:
+            handle.cancel()
+        self._retries.clear()
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+        for _ in self._workers:
+            self._queue.put_nowait(None)
+        done, pending = await asyncio.wait(self._workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        self._workers = []
+
+    def enqueue(self, order_id: int) -> None:
+        self._queue.put_nowait(order_id)
+
+    def _retry_later(self, order_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        delay = self.retry_delay
+
+        def requeue():
+            self._retries.discard(handle)
+            self.enqueue(order_id)
+
+        handle = loop.call_later(delay, requeue)
+        self._retries.add(handle)
+
+    async def _worker(self) -> None:
+        while True:
+            order_id = await self._queue.get()
+            try:
+                if order_id is None:
+                    return
+                await self._process(order_id)
+            except Exception as e:
+                logger.error(f"Provisioning of order {order_id} failed: {str(e)}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, order_id: int) -> None:
+        from core.api.remnawave_client import remnawave_service
+
+        async with async_session() as session:
+            order = await crud.claim_order(session, order_id)
+            if order is None:
+                return  # уже обработан другим исполнителем
+
+            username = panel_username(order)
+            created = await remnawave_service.create_user(
+                username=username,
+                expire_at=order.expires_at,
+                telegram_id=order.telegram_id
+            )
+
+            if "error" in created:
+                if order.attempts < self.max_attempts:
+                    await crud.release_order(session, order.id, created["error"])
+                    self.retried += 1
+                    logger.warning(
+                        f"Order {order.id}: panel error '{created['error']}', "
+                        f"retry {order.attempts}/{self.max_attempts} in {self.retry_delay}s"
+                    )
+                    self._retry_later(order.id)
+                    return
+
+                await crud.fail_order(session, order, created["error"])
+                self.failed += 1
+                logger.error(f"Order {order.id} failed after {order.attempts} attempts, refunded")
+                await self._notify(order, succeeded=False)
+                return
+
+            if not await crud.complete_order(session, order, created["uuid"], created["username"]):
+                # Пользователь в панели уже есть: повтор найдет его по username (ConflictError)
+                await crud.release_order(session, order.id, "Local save failed")
+                self._retry_later(order.id)
+                return
+
+        self.completed += 1
+        logger.info(f"Order {order.id} provisioned: {created['uuid']}")
+        await self._notify(order, succeeded=True, subscription=created)
+
+    async def _notify(self, order: SubscriptionOrder, succeeded: bool, subscription: Dict[str, Any] = None) -> None:
+        """Редактирование сообщения "подписка создается" итоговым результатом"""
+        if self.bot is None or order.chat_id is None:
+            return
+
+        from modules.user.purchase.texts import (
+            PURCHASE_SUCCESS_TEXT, PURCHASE_FAILED_TEXT
+        )
+        from modules.user.purchase.keyboards import get_purchase_result_kb
+
+        if succeeded:
+            text = PURCHASE_SUCCESS_TEXT.format(
+                username=subscription["username"],
+                expire=order.expires_at.strftime('%d.%m.%Y')
+            )
+            markup = get_purchase_result_kb(subscription.get("subscription_url"))
+        else:
+            text = PURCHASE_FAILED_TEXT.format(amount=float(order.price))
+            markup = get_purchase_result_kb(None)
+
+        try:
+            if order.message_id:
+                # Через кеш правок: иначе его отпечаток для этого сообщения устареет
+                await edit_message_by_id(
+                    self.bot, order.chat_id, order.message_id, text,
+                    reply_markup=markup, parse_mode="HTML"
+                )
+            else:
+                await self.bot.send_message(order.chat_id, text, reply_markup=markup, parse_mode="HTML")
+        except Exception as e:
+            logger.warning(f"Could not notify about order {order.id}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "retry_scheduled": len(self._retries),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried
+        }
+
+
+provisioner = Provisioner()
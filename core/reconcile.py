@@ -0,0 +1,211 @@
+"""
+Сверка подписок с панелью Remnawave одним проходом по списку пользователей.
+
+    python -m core.reconcile            # только отчет
+    python -m core.reconcile --fix      # + исправление расхождений через outbox
+
+Локальная БД - источник истины для владельца и даты окончания (оплата и передачи
+проходят через бота), поэтому исправление - это update_user в панели.
+Подписки, которых нет на одной из сторон, только попадают в отчет.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from core.config import (
+    RECONCILE_PAGE_SIZE, REMNAWAVE_PAGE_CONCURRENCY,
+    RECONCILE_EXPIRY_TOLERANCE, RECONCILE_AUTOFIX
+)
+from core.database import crud
+from core.database.database import async_session
+
+logger = logging.getLogger(__name__)
+
+# Сколько UUID каждого вида сохранять в отчете
+SAMPLE_SIZE = 20
+
+
+@dataclass
+class ReconcileReport:
+    started_at: datetime = field(default_factory=datetime.now)
+    duration: float = 0.0
+    panel_users: int = 0
+    local_subscriptions: int = 0
+    matched: int = 0
+    panel_orphans: List[str] = field(default_factory=list)   # есть в панели, нет в БД
+    local_orphans: List[str] = field(default_factory=list)   # есть в БД, нет в панели
+    expiry_mismatches: List[str] = field(default_factory=list)
+    owner_mismatches: List[str] = field(default_factory=list)
+    skipped_pending: int = 0                                  # ждут применения в outbox
+    skipped_changed: int = 0                                  # изменились в БД во время прохода
+    fixed: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "duration": round(self.duration, 2),
+            "panel_users": self.panel_users,
+            "local_subscriptions": self.local_subscriptions,
+            "matched": self.matched,
+            "panel_orphans": len(self.panel_orphans),
+            "local_orphans": len(self.local_orphans),
+            "expiry_mismatches": len(self.expiry_mismatches),
+            "owner_mismatches": len(self.owner_mismatches),
+            "skipped_pending": self.skipped_pending,
+            "skipped_changed": self.skipped_changed,
+            "fixed": self.fixed,
+            "samples": {
+                "panel_orphans": self.panel_orphans[:SAMPLE_SIZE],
+                "local_orphans": self.local_orphans[:SAMPLE_SIZE],
+                "expiry_mismatches": self.expiry_mismatches[:SAMPLE_SIZE],
+                "owner_mismatches": self.owner_mismatches[:SAMPLE_SIZE]
+            }
+        }
+
+
+# Последний отчет фоновой сверки (для /api/metrics)
+last_report: Optional[ReconcileReport] = None
+
+
+def _as_local(moment: Optional[datetime]) -> Optional[datetime]:
+    """Дата панели (UTC с зоной) -> наивное локальное время, как в purchased_subscriptions"""
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone().replace(tzinfo=None)
+
+
+async def reconcile(
+    fix: bool = False,
+    page_size: int = RECONCILE_PAGE_SIZE,
+    concurrency: int = REMNAWAVE_PAGE_CONCURRENCY
+) -> ReconcileReport:
+    from core.api.remnawave_client import remnawave_service
+
+    report = ReconcileReport()
+    started = time.monotonic()
+
+    async with async_session() as session:
+        index = await crud.get_subscription_index(session)
+        pending = await crud.get_pending_outbox_uuids(session)
+    report.local_subscriptions = len(index)
+
+    seen = set()
+    fixes: Dict[str, Dict[str, Any]] = {}
+
+    async for users in remnawave_service.iter_user_pages(page_size, concurrency):
+        for user in users:
+            sub_uuid = user["uuid"]
+            if sub_uuid in seen:
+                continue  # сдвиг страниц из-за пользователей, созданных во время прохода
+            seen.add(sub_uuid)
+            report.panel_users += 1
+
+            local = index.get(sub_uuid)
+            if local is None:
+                report.panel_orphans.append(sub_uuid)
+                continue
+            if sub_uuid in pending:
+                report.skipped_pending += 1
+                continue
+
+            telegram_id, expired_at = local
+            update: Dict[str, Any] = {}
+            panel_expire = _as_local(user["expire_at"])
+            if panel_expire is None or abs((panel_expire - expired_at).total_seconds()) > RECONCILE_EXPIRY_TOLERANCE:
+                report.expiry_mismatches.append(sub_uuid)
+                update["expire_at"] = expired_at.isoformat()
+            if user["telegram_id"] != telegram_id:
+                report.owner_mismatches.append(sub_uuid)
+                update["telegram_id"] = telegram_id
+
+            if update:
+                fixes[sub_uuid] = update
+            else:
+                report.matched += 1
+
+    report.local_orphans = [sub_uuid for sub_uuid in index if sub_uuid not in seen]
+
+    async with async_session() as session:
+        # Подписки, созданные после загрузки индекса, сиротами не считаются
+        if report.panel_orphans:
+            created = await crud.get_existing_subscription_uuids(session, report.panel_orphans)
+            report.panel_orphans = [sub_uuid for sub_uuid in report.panel_orphans if sub_uuid not in created]
+
+        if fix and fixes:
+            # Индекс загружен в начале прохода: подписку могли изменить (и поставить
+            # в outbox) после этого - исправление со старыми значениями откатило бы
+            # изменение в панели. Такие подписки исправит следующая сверка
+            state = await crud.lock_subscriptions_for_fix(session, list(fixes))
+            if state is None:
+                fixes = {}
+            else:
+                current, pending_now = state
+                for sub_uuid in list(fixes):
+                    if sub_uuid in pending_now:
+                        report.skipped_pending += 1
+                        del fixes[sub_uuid]
+                    elif current.get(sub_uuid) != index[sub_uuid]:
+                        report.skipped_changed += 1
+                        del fixes[sub_uuid]
+            for sub_uuid, update in fixes.items():
+                crud.add_outbox_entry(session, sub_uuid, crud.OUTBOX_UPDATE_USER, update)
+            await session.commit()
+            report.fixed = len(fixes)
+
+    if report.fixed:
+        from core.outbox import outbox_dispatcher
+        outbox_dispatcher.wake()
+
+    report.duration = time.monotonic() - started
+    return report
+
+
+async def run_reconciliation() -> int:
+    """Фоновая сверка (core.jobs); возвращает число расхождений"""
+    global last_report
+    report = await reconcile(fix=RECONCILE_AUTOFIX)
+    last_report = report
+    problems = (
+        len(report.panel_orphans) + len(report.local_orphans)
+        + len(report.expiry_mismatches) + len(report.owner_mismatches)
+    )
+    log = logger.warning if problems else logger.info
+    log(
+        f"Reconciliation: {report.panel_users} panel users, {report.matched} matched, "
+        f"{len(report.expiry_mismatches)} expiry / {len(report.owner_mismatches)} owner mismatches, "
+        f"{len(report.panel_orphans)} panel / {len(report.local_orphans)} local orphans, "
+        f"{report.fixed} queued for fix ({report.duration:.1f}s)"
+    )
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fix", action="store_true", help="исправить расхождения (записи в outbox)")
+    parser.add_argument("--page-size", type=int, default=RECONCILE_PAGE_SIZE)
+    parser.add_argument("--concurrency", type=int, default=REMNAWAVE_PAGE_CONCURRENCY)
+    args = parser.parse_args()
+
+    async def run():
+        from core.api.remnawave_client import remnawave_service
+        from core.database.database import init_engine, dispose_engine
+
+        init_engine()
+        remnawave_service.start()
+        try:
+            report = await reconcile(args.fix, args.page_size, args.concurrency)
+        finally:
+            await remnawave_service.close()
+            await dispose_engine()
+        print(json.dumps(report.as_dict(), ensure_ascii=False, indent=2))
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict
+
+from aiogram.types import InlineKeyboardMarkup
+
+# Размер LRU для клавиатур, параметризованных UUID подписки и т.п.
+DEFAULT_MAXSIZE = 4096
+
+# Все закешированные клавиатуры (для статистики и сброса)
+_registry: Dict[str, Callable[..., InlineKeyboardMarkup]] = {}
+
+
+def _name(build: Callable) -> str:
+    return f"{build.__module__}.{build.__qualname__}"
+
+
+def static_markup(build: Callable[[], InlineKeyboardMarkup]) -> Callable[[], InlineKeyboardMarkup]:
+    """
+    Клавиатура без параметров: собирается один раз при импорте модуля,
+    дальше возвращается один и тот же объект.
+    Готовые разметки считаются неизменяемыми - их нельзя модифицировать после получения.
+    """
+    markup = build()
+
+    @wraps(build)
+    def get() -> InlineKeyboardMarkup:
+        return markup
+
+    _registry[_name(build)] = get
+    return get
+
+
+def cached_markup(maxsize: int = DEFAULT_MAXSIZE):
+    """
+    Клавиатура, зависящая только от хешируемых аргументов (роль, UUID, hwid):
+    результат кешируется в ограниченном LRU.
+    """
+    def decorator(build: Callable[..., InlineKeyboardMarkup]) -> Callable[..., InlineKeyboardMarkup]:
+        cached = lru_cache(maxsize=maxsize)(build)
+        _registry[_name(build)] = cached
+        return cached
+    return decorator
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Статистика попаданий по всем кешированным клавиатурам"""
+    stats = {}
+    for name, func in _registry.items():
+        info = getattr(func, "cache_info", None)
+        if info is None:
+            stats[name] = {"type": "static"}
+            continue
+        info = info()
+        stats[name] = {
+            "type": "lru",
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize
+        }
+    return stats
+
+
+def clear_caches() -> None:
+    for func in _registry.values():
+        cache_clear = getattr(func, "cache_clear", None)
+        if cache_clear:
+            cache_clear()
@@ -0,0 +1,108 @@
+import asyncio
+import importlib.util
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from core.config import RUN_PROFILE, API_BACKLOG, API_KEEPALIVE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Профили запуска (RUN_PROFILE).
+#
+# production: цикл событий uvloop для всего процесса (aiogram, uvicorn, SQLAlchemy),
+#   HTTP-парсер httptools, увеличенный backlog и keep-alive дольше простоя
+#   соединений у reverse proxy, без access-лога и без освобождения порта.
+# development: стандартный asyncio и h11, access-лог, занятый порт освобождается
+#   через fuser (остался процесс от прошлого запуска).
+#
+# uvloop и httptools есть в requirements.txt (uvloop - кроме Windows). Если их нет,
+# production работает на asyncio / h11, в лог пишется ошибка.
+
+
+@dataclass(frozen=True)
+class RunProfile:
+    name: str
+    loop: str               # uvloop / asyncio
+    http: str               # httptools / h11
+    backlog: int
+    keep_alive: int         # сек
+    access_log: bool
+    free_port: bool         # fuser -k на порт API перед запуском
+
+
+PROFILES: Dict[str, RunProfile] = {
+    "production": RunProfile(
+        name="production",
+        loop="uvloop",
+        http="httptools",
+        backlog=API_BACKLOG,
+        keep_alive=API_KEEPALIVE_TIMEOUT,
+        access_log=False,
+        free_port=False
+    ),
+    "development": RunProfile(
+        name="development",
+        loop="asyncio",
+        http="h11",
+        backlog=2048,
+        keep_alive=5,
+        access_log=True,
+        free_port=True
+    ),
+}
+
+
+def get_run_profile(name: Optional[str] = None) -> RunProfile:
+    name = (name or RUN_PROFILE).lower()
+    if name not in PROFILES:
+        raise ValueError(f"Unknown run profile '{name}', expected one of: {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+def _installed(module: str, purpose: str, profile: RunProfile) -> bool:
+    if importlib.util.find_spec(module) is None:
+        log = logger.error if profile.name == "production" else logger.warning
+        log(f"{module} не установлен - {purpose} (профиль {profile.name})")
+        return False
+    return True
+
+
+def loop_factory(profile: RunProfile) -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """Фабрика цикла событий профиля (None - стандартный asyncio)"""
+    if profile.loop == "uvloop" and _installed("uvloop", "используется стандартный цикл asyncio", profile):
+        import uvloop
+        return uvloop.new_event_loop
+    return None
+
+
+def loop_name(profile: RunProfile) -> str:
+    return "uvloop" if loop_factory(profile) is not None else "asyncio"
+
+
+def http_implementation(profile: RunProfile) -> str:
+    if profile.http == "httptools" and _installed("httptools", "uvicorn использует h11", profile):
+        return "httptools"
+    return "h11"
+
+
+def uvicorn_options(profile: RunProfile) -> Dict[str, Any]:
+    """
+    Параметры uvicorn.Config. Цикл событий здесь не задается: сервер запускается
+    через Server.serve() внутри уже работающего цикла (см. run)
+    """
+    return {
+        "http": http_implementation(profile),
+        "backlog": profile.backlog,
+        "timeout_keep_alive": profile.keep_alive,
+        "access_log": profile.access_log,
+        "server_header": False,
+    }
+
+
+def run(main: Awaitable[T], profile: RunProfile) -> T:
+    """asyncio.run с циклом событий профиля (в главном процессе и в воркерах)"""
+    with asyncio.Runner(loop_factory=loop_factory(profile)) as runner:
+        return runner.run(main)
@@ -0,0 +1,199 @@
+import logging
+import sys
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from core.config import (
+    TRAFFIC_PAGE_SIZE, REMNAWAVE_PAGE_CONCURRENCY, TRAFFIC_RAW_RETENTION_DAYS,
+    TRAFFIC_HOURLY_RETENTION_DAYS, TRAFFIC_DAILY_RETENTION_DAYS
+)
+from core.database import crud
+from core.database.database import async_session
+from core.database.model import TrafficSeries
+
+logger = logging.getLogger(__name__)
+
+# Разрешения рядов и число ячеек в строке
+RAW = "5m"      # сутки по 5 минут
+HOURLY = "1h"   # сутки по часам
+DAILY = "1d"    # месяц по дням
+SLOTS = {RAW: 288, HOURLY: 24, DAILY: 31}
+SLOT_SECONDS = 24 * 3600 // SLOTS[RAW]
+
+
+def pack(values: Iterable[int]) -> bytes:
+    """Массив приращений -> uint64 little-endian (288 ячеек = 2.3 КБ на подписку в сутки)"""
+    data = array("Q", values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def unpack(raw: bytes) -> array:
+    data = array("Q")
+    data.frombytes(raw)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data
+
+
+def day_start(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def month_start(moment: datetime) -> datetime:
+    return day_start(moment).replace(day=1)
+
+
+def _new_row(sub_uuid: str, resolution: str, period_start: datetime, **kwargs) -> TrafficSeries:
+    return TrafficSeries(
+        sub_uuid=sub_uuid,
+        resolution=resolution,
+        period_start=period_start,
+        data=pack([0] * SLOTS[resolution]),
+        **kwargs
+    )
+
+
+async def _panel_totals(active: set) -> Dict[str, int]:
+    """Счетчики трафика активных подписок из постраничного списка пользователей панели"""
+    from core.api.remnawave_client import remnawave_service
+
+    totals: Dict[str, int] = {}
+    async for users in remnawave_service.iter_user_pages(TRAFFIC_PAGE_SIZE, REMNAWAVE_PAGE_CONCURRENCY):
+        for user in users:
+            if user["uuid"] in active:
+                # lifetime не сбрасывается при сбросе трафика по стратегии подписки
+                totals[user["uuid"]] = max(user["lifetime_used_traffic_bytes"], user["used_traffic_bytes"])
+    return totals
+
+
+async def collect_traffic() -> int:
+    """
+    Снятие показаний: приращение счетчика с прошлого замера добавляется
+    в 5-минутную ячейку суточной строки подписки. Пропущенный замер не теряет
+    трафик - он попадет в следующую ячейку
+    """
+    now = datetime.now()
+    today = day_start(now)
+    slot = int((now - today).total_seconds()) // SLOT_SECONDS
+
+    async with async_session() as session:
+        active = await crud.get_active_subscription_uuids(session)
+    if not active:
+        return 0
+    totals = await _panel_totals(active)
+    if not totals:
+        return 0
+
+    async with async_session() as session:
+        uuids = list(totals)
+        rows = await crud.get_traffic_rows(session, RAW, today, uuids)
+        missing = [sub_uuid for sub_uuid in uuids if sub_uuid not in rows]
+        # Новые сутки: последнее значение счетчика берем из вчерашней строки
+        previous = await crud.get_traffic_rows(session, RAW, today - timedelta(days=1), missing) if missing else {}
+
+        for sub_uuid, total in totals.items():
+            row = rows.get(sub_uuid)
+            if row is None:
+                last = previous.get(sub_uuid)
+                row = _new_row(sub_uuid, RAW, today, last_total=last.last_total if last else None)
+                session.add(row)
+
+            if row.last_total is not None:
+                delta = total - row.last_total
+                if delta < 0:  # счетчик сброшен в панели
+                    delta = total
+                if delta:
+                    values = unpack(row.data)
+                    values[slot] += delta
+                    row.data = pack(values)
+            row.last_total = total
+        await session.commit()
+    return len(totals)
+
+
+async def _downsample_day(day: datetime) -> int:
+    """Свертка завершенных суток: 5m -> 1h (строка суток) и итог суток -> ячейка месячной 1d строки"""
+    async with async_session() as session:
+        raw = await crud.get_traffic_rows(session, RAW, day)
+        hourly = await crud.get_traffic_rows(session, HOURLY, day)
+        # Наличие часовой строки = сутки уже свернуты
+        pending = {sub_uuid: row for sub_uuid, row in raw.items() if sub_uuid not in hourly}
+        if not pending:
+            return 0
+
+        monthly = await crud.get_traffic_rows(session, DAILY, month_start(day), list(pending))
+        per_hour = SLOTS[RAW] // SLOTS[HOURLY]
+        for sub_uuid, row in pending.items():
+            values = unpack(row.data)
+            hours = [sum(values[h * per_hour:(h + 1) * per_hour]) for h in range(SLOTS[HOURLY])]
+            session.add(TrafficSeries(
+                sub_uuid=sub_uuid, resolution=HOURLY, period_start=day, data=pack(hours)
+            ))
+
+            month = monthly.get(sub_uuid)
+            if month is None:
+                month = _new_row(sub_uuid, DAILY, month_start(day))
+                session.add(month)
+            days = unpack(month.data)
+            days[day.day - 1] += sum(hours)
+            month.data = pack(days)
+        await session.commit()
+        return len(pending)
+
+
+async def downsample_traffic() -> int:
+    """Прореживание завершенных суток и удаление данных старше сроков хранения"""
+    today = day_start(datetime.now())
+    async with async_session() as session:
+        days = await crud.get_traffic_periods(session, RAW, before=today)
+
+    total = 0
+    for day in days:
+        total += await _downsample_day(day)
+
+    async with async_session() as session:
+        for resolution, retention in (
+            (RAW, TRAFFIC_RAW_RETENTION_DAYS),
+            (HOURLY, TRAFFIC_HOURLY_RETENTION_DAYS),
+            (DAILY, TRAFFIC_DAILY_RETENTION_DAYS)
+        ):
+            # Вчерашняя 5m строка нужна как база для первого замера суток
+            retention = max(retention, 1) if resolution == RAW else retention
+            cutoff = today - timedelta(days=retention)
+            await crud.delete_traffic_before(
+                session, resolution, month_start(cutoff) if resolution == DAILY else cutoff
+            )
+
+    if total:
+        logger.info(f"Traffic downsampled for {total} subscription-days")
+    return total
+
+
+async def daily_usage(session, sub_uuid: str, days: int = 30) -> List[Tuple[date, int]]:
+    """Трафик по дням за последние days суток (включая текущие)"""
+    today = day_start(datetime.now())
+    first = today - timedelta(days=days - 1)
+    rows = await crud.get_subscription_traffic(
+        session,
+        sub_uuid,
+        monthly_since=month_start(first),
+        recent_since=today - timedelta(days=TRAFFIC_RAW_RETENTION_DAYS)
+    )
+
+    per_day: Dict[datetime, int] = {}
+    folded = {row.period_start for row in rows if row.resolution == HOURLY}
+    for row in rows:
+        if row.resolution == DAILY:
+            for index, value in enumerate(unpack(row.data)):
+                if value:
+                    per_day[row.period_start + timedelta(days=index)] = value
+        elif row.resolution == RAW and row.period_start not in folded:
+            per_day[row.period_start] = sum(unpack(row.data))
+
+    return [
+        ((first + timedelta(days=i)).date(), per_day.get(first + timedelta(days=i), 0))
+        for i in range(days)
+    ]
@@ -1,81 +1,178 @@
+import argparse
 import asyncio
 import logging
 import os
 import signal
-from dotenv import load_dotenv
-from fastapi import FastAPI
-import uvicorn
-from fastapi.middleware.cors import CORSMiddleware
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+import sys
 from contextlib import asynccontextmanager
 
-# Импорт компонентов
-from core.api.bot_api import router as api_router
-from core.middleware import RoleMiddleware
-from core.database.model import Base
-from core.database.database import engine
-
-load_dotenv()
-
-# Конфигурация
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-API_PORT = int(os.getenv("API_PORT", 8899))
-SSL_CERT_PATH = os.getenv("SSL_CERT_PATH")
+# Конфигурация (load_dotenv вызывается один раз внутри core.config)
+from core.config import (
+    BOT_TOKEN, API_PORT, SSL_CERT_PATH, LOG_LEVEL, LOG_FORMAT,
+    SHUTDOWN_DRAIN_TIMEOUT, SHUTDOWN_REPORT_INTERVAL, BOT_WORKERS,
+    OUTBOUND_GLOBAL_RATE, BALANCE_COMPACTION_INTERVAL, TRAFFIC_SAMPLE_INTERVAL,
+    RECONCILE_INTERVAL, SUBSCRIPTION_ARCHIVE_INTERVAL
+)
+from core.profiling import StartupProfiler, PROFILE_OUTPUT_ENV, run_with_importtime
+from core import runtime
 
 # Настройка логгера
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
 class Application:
-    def __init__(self):
+    def __init__(self, profiler: StartupProfiler = None, worker_id: int = None, cluster=None, workers: int = 1):
+        """
+        :param worker_id: номер воркера, если приложение запущено внутри процесса-воркера
+        :param cluster: Cluster, если это ingress-процесс многопроцессного режима
+        :param workers: общее число воркеров (делят между собой лимит исходящих запросов)
+        """
+        self.worker_id = worker_id
+        self.workers = workers
+        self.cluster = cluster
         self.bot = None
         self.dp = None
         self.server = None
-        self._shutdown = False
+        self.engine = None
+        self.polling = False
+        self.in_flight = None
+        self.jobs = None
+        self.profiler = profiler or StartupProfiler()
+        self._shutdown_task = None
 
     async def startup(self):
-        """Инициализация приложения"""
-        self.bot = Bot(token=BOT_TOKEN)
-        self.dp = Dispatcher(storage=MemoryStorage())
-        
-        session_pool = async_sessionmaker(
-            bind=engine,
-            expire_on_commit=False,
-            class_=AsyncSession
-        )
+        """Инициализация приложения: все сервисы создаются здесь, а не при импорте"""
+        phase = self.profiler.phase
+
+        with phase("import aiogram"):
+            from aiogram import Bot, Dispatcher
+            from aiogram.fsm.storage.memory import MemoryStorage
+
+        with phase("bot + dispatcher"):
+            self.bot = Bot(token=BOT_TOKEN)
+            # Все исходящие запросы к Bot API идут через общую очередь с лимитами
+            from core.outbound import outbound_sender
+            outbound_sender.global_rate = OUTBOUND_GLOBAL_RATE / max(self.workers, 1)
+            self.bot.session.middleware(outbound_sender)
+            outbound_sender.start()
+            # ingress только раздает апдейты воркерам, Dispatcher ему не нужен
+            if self.cluster is None:
+                self.dp = Dispatcher(storage=MemoryStorage())
+
+        with phase("database engine"):
+            from core.database.database import init_engine, async_session
+            self.engine = init_engine()
+
+        if self.dp:
+            with phase("middlewares"):
+                from core.middleware import RoleMiddleware, InFlightMiddleware, UpdateDeduplicationMiddleware
+                # InFlightMiddleware первым: учитываем апдейт до любых обращений к БД
+                self.in_flight = InFlightMiddleware()
+                self.dp.update.outer_middleware(self.in_flight)
+                if self.worker_id is not None:
+                    self.dp.update.outer_middleware(
+                        UpdateDeduplicationMiddleware(session_pool=async_session, worker_id=self.worker_id)
+                    )
+                self.dp.update.outer_middleware(RoleMiddleware(session_pool=async_session))
+
+            with phase("routers"):
+                from modules.common.router import main_menu_router
+                self.dp.include_router(main_menu_router)
+
+        with phase("remnawave client"):
+            from core.api.remnawave_client import remnawave_service
+            remnawave_service.start()
+            # ingress в панель не ходит - прогрев только там, где обрабатываются апдейты
+            if self.dp:
+                await remnawave_service.warm_up()
+
+        # Схему создает только главный процесс, воркеры стартуют после него
+        if self.worker_id is None:
+            with phase("database schema"):
+                from core.database.model import Base
+                from core.database.schema import upgrade_schema
+                from core.database.search import ensure_search_indexes
+                async with self.engine.begin() as conn:
+                    # create_all не меняет существующие таблицы - столбцы и индексы
+                    # новых версий добавляет upgrade_schema
+                    await conn.run_sync(Base.metadata.create_all)
+                    await upgrade_schema(conn)
+                    await ensure_search_indexes(conn)
 
-        self.dp.update.outer_middleware(RoleMiddleware(session_pool=session_pool))
+        # Реплики для чтения: каждый процесс сам проверяет отставание своих реплик
+        with phase("database replicas"):
+            from core.database.replicas import replica_monitor
+            await replica_monitor.start()
 
-        from modules.common.router import main_menu_router
-        self.dp.include_router(main_menu_router)
+        # Фоновые задачи обслуживания - только в главном процессе
+        if self.worker_id is None:
+            with phase("background jobs"):
+                from core.jobs import job_runner
+                from core.database import maintenance
+                job_runner.add("balance_compaction", BALANCE_COMPACTION_INTERVAL, maintenance.compact_balances)
+                job_runner.add("outbox_cleanup", 3600, maintenance.cleanup_outbox, initial_delay=60)
+                job_runner.add(
+                    "subscription_archive", SUBSCRIPTION_ARCHIVE_INTERVAL,
+                    maintenance.archive_subscriptions, initial_delay=180
+                )
+                from core import traffic
+                job_runner.add("traffic_collect", TRAFFIC_SAMPLE_INTERVAL, traffic.collect_traffic)
+                job_runner.add("traffic_downsample", 3600, traffic.downsample_traffic, initial_delay=120)
+                from core import reconcile
+                job_runner.add("reconcile", RECONCILE_INTERVAL, reconcile.run_reconciliation, initial_delay=300)
+                job_runner.start()
+                self.jobs = job_runner
 
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+            with phase("payments"):
+                from core.payments import ledger_batcher
+                ledger_batcher.start()
+
+            with phase("remnawave outbox"):
+                from core.outbox import outbox_dispatcher
+                outbox_dispatcher.start()
+
+        # Фоновое создание подписок там, где обрабатываются апдейты
+        if self.dp:
+            with phase("provisioning"):
+                from core.provisioning import provisioner
+                await provisioner.start(self.bot)
+
+        if self.cluster:
+            with phase("workers"):
+                self.cluster.start()
 
     async def run_bot(self):
         """Запуск бота с обработкой остановки"""
+        if self.cluster:
+            await self.cluster.run_ingress(self.bot)
+            return
+
         try:
             logger.info("Starting Telegram bot polling...")
-            await self.dp.start_polling(self.bot)
+            self.polling = True
+            # Сигналы и закрытие сессии бота обрабатывает shutdown(),
+            # иначе сессия закроется раньше, чем доработают текущие хендлеры
+            await self.dp.start_polling(
+                self.bot,
+                handle_signals=False,
+                close_bot_session=False
+            )
         except asyncio.CancelledError:
             logger.info("Bot polling cancelled")
             await self.dp.stop_polling()
         except Exception as e:
             logger.error(f"Bot error: {str(e)}")
         finally:
+            self.polling = False
             logger.info("Bot fully stopped")
 
     async def shutdown(self):
-        """Корректное завершение работы"""
-        if self._shutdown:
-            return
-        self._shutdown = True
-        
+        """Корректное завершение работы (повторные вызовы ждут уже начатое завершение)"""
+        if self._shutdown_task is None:
+            self._shutdown_task = asyncio.ensure_future(self._shutdown_sequence())
+        await asyncio.shield(self._shutdown_task)
+
+    async def _shutdown_sequence(self):
         logger.info("Starting graceful shutdown...")
         
         # 1. Останавливаем сервер
@@ -83,24 +180,70 @@ class Application:
             self.server.should_exit = True
             logger.info("Uvicorn server shutdown initiated")
         
-        # 2. Останавливаем бота
-        if hasattr(self.dp, '_polling'):
+        # 2. Перестаем принимать апдейты
+        if self.cluster:
+            # Апдейты последнего запроса, не дошедшие до воркеров, не подтверждены
+            # в Telegram (offset) и придут повторно при следующем запуске
+            self.cluster.stop_ingress()
+            await self.cluster.stop()
+            logger.info("Workers stopped")
+
+        if self.dp and self.polling:
             await self.dp.stop_polling()
             logger.info("Bot polling stopped")
         
-        # 3. Закрываем соединения
+        # 3. Дожидаемся хендлеров, которые уже в работе
+        if self.in_flight:
+            unfinished = await self.in_flight.drain(
+                timeout=SHUTDOWN_DRAIN_TIMEOUT,
+                report_interval=SHUTDOWN_REPORT_INTERVAL
+            )
+            if unfinished:
+                logger.error(f"Updates interrupted by shutdown: {unfinished}")
+            else:
+                logger.info("All in-flight updates finished")
+        
+        if self.jobs:
+            await self.jobs.stop()
+            logger.info("Background jobs stopped")
+
+        # Зачисления, уже принятые вебхуком, записываем до закрытия БД
+        from core.payments import ledger_batcher
+        await ledger_batcher.stop()
+
+        from core.provisioning import provisioner
+        await provisioner.stop(timeout=SHUTDOWN_REPORT_INTERVAL * 5)
+
+        from core.outbox import outbox_dispatcher
+        await outbox_dispatcher.stop()
+
+        from core.database.replicas import replica_monitor
+        await replica_monitor.stop()
+
+        # 4. Закрываем соединения: Remnawave -> Telegram -> БД
+        from core.api.remnawave_client import remnawave_service
+        await remnawave_service.close()
+
         if self.bot:
+            # Сначала отправляем то, что еще стоит в исходящей очереди
+            from core.outbound import outbound_sender
+            await outbound_sender.stop(timeout=SHUTDOWN_REPORT_INTERVAL * 5)
             await self.bot.session.close()
             logger.info("Bot session closed")
         
-        if engine:
-            await engine.dispose()
+        if self.engine:
+            from core.database.database import dispose_engine
+            await dispose_engine()
             logger.info("Database connections closed")
 
-def create_app():
+def create_app(cluster=None):
     """Фабрика приложения"""
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from core.api.bot_api import router as api_router
+
     app = FastAPI()
-    app.state.application = Application()
+    app.state.application = Application(cluster=cluster)
     
     @asynccontextmanager
     async def lifespan(app: FastAPI):
@@ -111,14 +254,9 @@ def create_app():
         
         yield
         
-        # Завершаем работу
-        bot_task.cancel()
-        try:
-            await bot_task
-        except asyncio.CancelledError:
-            pass
-        
+        # Завершаем работу: shutdown сам останавливает polling и дожидается хендлеров
         await app.state.application.shutdown()
+        await bot_task
 
     app.router.lifespan_context = lifespan
     
@@ -134,13 +272,24 @@ def create_app():
     
     @app.get("/health")
     async def health_check():
-        return {"status": "ok", "services": ["bot", "api"]}
+        health = {"status": "ok", "services": ["bot", "api"]}
+        if cluster:
+            health["workers"] = cluster.worker_states()
+        return health
     
     return app
 
-async def run_server():
+async def run_server(profile: runtime.RunProfile, workers: int = 1):
     """Запуск сервера"""
-    app = create_app()
+    import uvicorn
+
+    cluster = None
+    if workers > 1:
+        from core.cluster import Cluster
+        cluster = Cluster(workers)
+        logger.info(f"Multi-worker mode: {workers} worker processes")
+
+    app = create_app(cluster=cluster)
     
     # Настройка SSL
     ssl_params = {}
@@ -158,30 +307,88 @@ async def run_server():
     else:
         logger.warning("SSL_CERT_PATH not set, using HTTP")
 
+    # Без reload: Server.serve() запускается внутри уже работающего цикла событий
+    # (его выбирает runtime.run по профилю), поэтому loop в Config не передается
     config = uvicorn.Config(
         app,
         host="0.0.0.0",
         port=API_PORT,
-        reload=True,
+        **runtime.uvicorn_options(profile),
         **ssl_params
     )
+    logger.info(
+        f"Run profile '{profile.name}': loop {type(asyncio.get_running_loop()).__module__}, "
+        f"http {config.http}, backlog {config.backlog}, keep-alive {config.timeout_keep_alive}s"
+    )
     
     server = uvicorn.Server(config)
     app.state.application.server = server
     
     # Обработка сигналов
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
     for sig in (signal.SIGINT, signal.SIGTERM):
         loop.add_signal_handler(sig, lambda: asyncio.create_task(app.state.application.shutdown()))
     
     await server.serve()
 
+async def profile_startup():
+    """Замер инициализации без запуска polling и HTTP-сервера"""
+    application = Application()
+    try:
+        await application.startup()
+    except Exception as e:
+        logger.error(f"Startup failed during profiling: {str(e)}")
+    finally:
+        await application.shutdown()
+
+    output_path = os.getenv(PROFILE_OUTPUT_ENV)
+    if output_path:
+        application.profiler.dump(output_path)
+    else:
+        from core.profiling import format_report
+        print(format_report([], application.profiler.phases))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="BREEZEBOT")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Вывести отчет о времени импортов и инициализации и выйти"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=BOT_WORKERS,
+        help="Количество процессов-воркеров для обработки апдейтов (1 = без воркеров)"
+    )
+    parser.add_argument(
+        "--run-profile",
+        choices=sorted(runtime.PROFILES),
+        default=None,
+        help="Профиль запуска (по умолчанию RUN_PROFILE из окружения)"
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    # Очистка порта перед запуском
-    os.system(f"fuser -k {API_PORT}/tcp >/dev/null 2>&1")
+    args = parse_args()
+
+    if args.profile_startup:
+        if "importtime" not in sys._xoptions:
+            sys.exit(run_with_importtime(__file__, sys.argv[1:]))
+        asyncio.run(profile_startup())
+        sys.exit(0)
+
+    if args.run_profile:
+        # Процессы-воркеры (spawn) читают профиль из окружения
+        os.environ["RUN_PROFILE"] = args.run_profile
+    profile = runtime.get_run_profile(args.run_profile)
+
+    if profile.free_port:
+        # Очистка порта перед запуском (остался процесс от прошлого запуска)
+        os.system(f"fuser -k {API_PORT}/tcp >/dev/null 2>&1")
     
     try:
-        asyncio.run(run_server())
+        runtime.run(run_server(profile, workers=args.workers), profile)
     except KeyboardInterrupt:
         logger.info("Application stopped by keyboard interrupt")
     except Exception as e:
@@ -4,6 +4,7 @@ from .texts import MAIN_MENU_TEXT
 from .keyboards import get_main_menu
 from typing import Union
 import logging
+from core.messaging import edit_message
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +19,8 @@ async def start_command(event: Union[Message, CallbackQuery], role: str):
             )
         else:
             # Для callback-запросов
-            await event.message.edit_text(
+            await edit_message(
+                event.message,
                 text=MAIN_MENU_TEXT,
                 reply_markup=get_main_menu(role)
             )
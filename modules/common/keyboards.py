@@ -1,5 +1,6 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
+from core.render_cache import cached_markup
 from .texts import (
     PROFILE_BUTTON, SUBSCRIPTION_BUTTON, HELP_BUTTON,
     SUPPORT_BUTTON, ADMIN_BUTTON,
@@ -7,6 +8,7 @@ from .texts import (
     SUPPORT_CALLBACK, ADMIN_CALLBACK
 )
 
+@cached_markup(maxsize=16)
 def get_main_menu(role: str) -> InlineKeyboardBuilder:
     builder = InlineKeyboardBuilder()
     
@@ -5,6 +5,9 @@ from core.filters import IsNotBanned
 from modules.user.profile.router import profile_router
 from modules.user.subscription.router import subscriptions_router
 from modules.user.control_subscription.router import router as control_subscription_router
+from modules.user.help.router import help_router
+from modules.user.purchase.router import purchase_router
+from modules.support.main_menu.router import support_router
 from .texts import MAIN_MENU_CALLBACK
 
 main_menu_router = Router()
@@ -12,6 +15,9 @@ main_menu_router.callback_query.filter(IsNotBanned)
 main_menu_router.include_router(profile_router)
 main_menu_router.include_router(subscriptions_router)
 main_menu_router.include_router(control_subscription_router)
+main_menu_router.include_router(purchase_router)
+main_menu_router.include_router(help_router)
+main_menu_router.include_router(support_router)
 # Обработка команды /start
 main_menu_router.message.register(
     start_command,
@@ -0,0 +1,30 @@
+from aiogram.types import CallbackQuery
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import crud
+from core.messaging import edit_message
+from .keyboards import get_support_menu_kb
+from .texts import SUPPORT_MENU_TEXT
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def show_support_menu(callback: CallbackQuery, session: AsyncSession) -> None:
+    """Главное меню сотрудника поддержки"""
+    try:
+        await callback.answer()
+
+        totals = await crud.count_tickets_by_status(session)
+        mine = await crud.count_tickets_by_status(session, assigned_to=callback.from_user.id)
+
+        await edit_message(
+            callback.message,
+            text=SUPPORT_MENU_TEXT.format(
+                open_count=totals.get(crud.TICKET_OPEN, 0),
+                my_count=mine.get(crud.TICKET_IN_PROGRESS, 0)
+            ),
+            reply_markup=get_support_menu_kb(),
+            parse_mode="HTML"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в show_support_menu: {str(e)}", exc_info=True)
+        await callback.answer("⚠️ Ошибка загрузки меню поддержки", show_alert=True)
@@ -0,0 +1,19 @@
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from modules.common.texts import MAIN_MENU_CALLBACK
+from modules.support.tickets.texts import (
+    CLAIM_NEXT_CALLBACK, INBOX_CALLBACK, INBOX_OPEN, INBOX_MINE
+)
+from modules.support.search.texts import SEARCH_CALLBACK, SEARCH_BUTTON
+from core.render_cache import static_markup
+from .texts import CLAIM_NEXT_BUTTON, OPEN_TICKETS_BUTTON, MY_TICKETS_BUTTON, BACK_BUTTON
+
+@static_markup
+def get_support_menu_kb() -> InlineKeyboardBuilder:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=CLAIM_NEXT_BUTTON, callback_data=CLAIM_NEXT_CALLBACK)
+    builder.button(text=OPEN_TICKETS_BUTTON, callback_data=f"{INBOX_CALLBACK}:{INBOX_OPEN}:0")
+    builder.button(text=MY_TICKETS_BUTTON, callback_data=f"{INBOX_CALLBACK}:{INBOX_MINE}:0")
+    builder.button(text=SEARCH_BUTTON, callback_data=SEARCH_CALLBACK)
+    builder.button(text=BACK_BUTTON, callback_data=MAIN_MENU_CALLBACK)
+    builder.adjust(1, 2, 1, 1)
+    return builder.as_markup()
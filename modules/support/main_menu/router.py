@@ -0,0 +1,18 @@
+from aiogram import Router, F
+from core.filters import IsStaff
+from modules.common.texts import SUPPORT_CALLBACK
+from modules.support.tickets.router import tickets_router
+from modules.support.search.router import search_router
+from .handlers import show_support_menu
+
+# Раздел поддержки доступен только ADMIN и SUPPORT
+support_router = Router()
+support_router.callback_query.filter(IsStaff)
+support_router.message.filter(IsStaff)
+support_router.include_router(tickets_router)
+support_router.include_router(search_router)
+
+support_router.callback_query.register(
+    show_support_menu,
+    F.data == SUPPORT_CALLBACK
+)
@@ -0,0 +1,11 @@
+SUPPORT_MENU_TEXT = (
+    "🛎 <b>Поддержка</b>\n\n"
+    "📥 Открытых обращений: {open_count}\n"
+    "🛠 У вас в работе: {my_count}"
+)
+
+# Тексты кнопок
+CLAIM_NEXT_BUTTON = "📥 Взять следующее"
+OPEN_TICKETS_BUTTON = "📋 Открытые"
+MY_TICKETS_BUTTON = "🗂 Мои в работе"
+BACK_BUTTON = "🔙 Назад"
@@ -0,0 +1,78 @@
+from html import escape
+from aiogram.types import CallbackQuery, Message
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database.search import search_users
+from .keyboards import get_cancel_search_kb, get_search_results_kb
+from .texts import (
+    SEARCH_REQUEST_TEXT,
+    SEARCH_RESULTS_TEXT,
+    SEARCH_EMPTY_TEXT,
+    SEARCH_QUERY_EMPTY_TEXT,
+    SEARCH_USER_LINE,
+    SEARCH_SUBSCRIPTION_LINE,
+    SEARCH_NO_USERNAME
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+class UserSearchStates(StatesGroup):
+    waiting_for_query = State()
+
+async def start_search(callback: CallbackQuery, state: FSMContext) -> None:
+    """Запрос строки поиска"""
+    try:
+        await callback.answer()
+        await state.set_state(UserSearchStates.waiting_for_query)
+        await callback.message.answer(SEARCH_REQUEST_TEXT, reply_markup=get_cancel_search_kb())
+    except Exception as e:
+        logger.error(f"Ошибка в start_search: {str(e)}", exc_info=True)
+        await state.clear()
+
+async def process_search(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    """Поиск по username пользователей и подписок"""
+    try:
+        if not message.text:
+            await message.answer(SEARCH_QUERY_EMPTY_TEXT)
+            return
+
+        query = message.text.strip()
+        hits = await search_users(session, query)
+        await state.clear()
+
+        if not hits:
+            await message.answer(
+                SEARCH_EMPTY_TEXT.format(query=escape(query)),
+                reply_markup=get_search_results_kb()
+            )
+            return
+
+        lines = []
+        for hit in hits:
+            username = escape(hit.username) if hit.username else SEARCH_NO_USERNAME
+            if hit.kind == "subscription":
+                lines.append(SEARCH_SUBSCRIPTION_LINE.format(
+                    username=username, telegram_id=hit.telegram_id, sub_uuid=hit.sub_uuid
+                ))
+            else:
+                lines.append(SEARCH_USER_LINE.format(username=username, telegram_id=hit.telegram_id))
+
+        await message.answer(
+            SEARCH_RESULTS_TEXT.format(query=escape(query), count=len(hits), results="\n".join(lines)),
+            reply_markup=get_search_results_kb(),
+            parse_mode="HTML"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в process_search: {str(e)}", exc_info=True)
+        await message.answer("⚠️ Ошибка поиска")
+        await state.clear()
+
+async def cancel_search(callback: CallbackQuery, state: FSMContext) -> None:
+    try:
+        await callback.answer()
+        await state.clear()
+        await callback.message.delete()
+    except Exception as e:
+        logger.error(f"Ошибка в cancel_search: {str(e)}")
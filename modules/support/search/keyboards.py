@@ -0,0 +1,19 @@
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.types import InlineKeyboardMarkup
+from modules.common.texts import SUPPORT_CALLBACK
+from core.render_cache import static_markup
+from .texts import SEARCH_AGAIN_BUTTON, CANCEL_BUTTON, BACK_BUTTON, SEARCH_CALLBACK, SEARCH_CANCEL_CALLBACK
+
+@static_markup
+def get_cancel_search_kb() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=CANCEL_BUTTON, callback_data=SEARCH_CANCEL_CALLBACK)
+    return builder.as_markup()
+
+@static_markup
+def get_search_results_kb() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=SEARCH_AGAIN_BUTTON, callback_data=SEARCH_CALLBACK)
+    builder.button(text=BACK_BUTTON, callback_data=SUPPORT_CALLBACK)
+    builder.adjust(1)
+    return builder.as_markup()
@@ -0,0 +1,21 @@
+from aiogram import Router, F
+from .handlers import start_search, process_search, cancel_search, UserSearchStates
+from .texts import SEARCH_CALLBACK, SEARCH_CANCEL_CALLBACK
+
+# Фильтр IsStaff задается родительским support_router
+search_router = Router()
+
+search_router.callback_query.register(
+    start_search,
+    F.data == SEARCH_CALLBACK
+)
+
+search_router.callback_query.register(
+    cancel_search,
+    F.data == SEARCH_CANCEL_CALLBACK
+)
+
+search_router.message.register(
+    process_search,
+    UserSearchStates.waiting_for_query
+)
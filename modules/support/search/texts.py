@@ -0,0 +1,17 @@
+SEARCH_REQUEST_TEXT = "🔍 Введите часть username, имя подписки или Telegram ID:"
+SEARCH_RESULTS_TEXT = "🔍 Результаты по «{query}» ({count}):\n\n{results}"
+SEARCH_EMPTY_TEXT = "🔍 По «{query}» ничего не найдено"
+SEARCH_QUERY_EMPTY_TEXT = "⚠️ Отправьте текстовый запрос"
+SEARCH_USER_LINE = "👤 {username} · <code>{telegram_id}</code>"
+SEARCH_SUBSCRIPTION_LINE = "💎 {username} · владелец <code>{telegram_id}</code>\n    <code>{sub_uuid}</code>"
+SEARCH_NO_USERNAME = "без username"
+
+# Тексты кнопок
+SEARCH_BUTTON = "🔍 Поиск пользователя"
+SEARCH_AGAIN_BUTTON = "🔍 Новый поиск"
+CANCEL_BUTTON = "❌ Отмена"
+BACK_BUTTON = "🔙 Назад"
+
+# Callback data
+SEARCH_CALLBACK = "support:search"
+SEARCH_CANCEL_CALLBACK = "support:search_cancel"
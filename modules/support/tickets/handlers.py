@@ -0,0 +1,245 @@
+from datetime import datetime
+from html import escape
+from aiogram.types import CallbackQuery, Message
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import crud
+from core.database.model import SupportTicket
+from core.messaging import edit_message
+from core.outbound import outbound_priority, Priority
+from .keyboards import get_inbox_kb, get_ticket_kb, get_cancel_reply_kb
+from .texts import (
+    TICKET_VIEW_TEXT,
+    TICKET_SUBSCRIPTION_LINE,
+    TICKET_NO_SUBSCRIPTIONS,
+    TICKET_MESSAGE_LINE,
+    TICKET_AUTHOR_USER,
+    TICKET_AUTHOR_STAFF,
+    TICKET_PRIORITY_MARK,
+    TICKET_STATUS_NAMES,
+    INBOX_OPEN_TEXT,
+    INBOX_MINE_TEXT,
+    INBOX_EMPTY_TEXT,
+    QUEUE_EMPTY_TEXT,
+    TICKET_NOT_FOUND_TEXT,
+    TICKET_REPLY_REQUEST_TEXT,
+    TICKET_REPLY_SENT_TEXT,
+    TICKET_REPLY_EMPTY_TEXT,
+    TICKET_CLOSED_TEXT,
+    TICKET_CLOSE_FAILED_TEXT,
+    TICKET_REPLY_CANCELLED_TEXT,
+    USER_REPLY_NOTIFICATION_TEXT,
+    USER_CLOSED_NOTIFICATION_TEXT,
+    INBOX_MINE,
+    TICKETS_PER_PAGE,
+    TICKET_VIEW_MESSAGES,
+    TICKET_VIEW_MESSAGE_LENGTH
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TicketReplyStates(StatesGroup):
+    waiting_for_reply = State()
+
+def format_ticket(ticket: SupportTicket) -> str:
+    """Карточка обращения: данные пользователя, подписки и последние сообщения"""
+    user = ticket.user
+    now = datetime.now()
+
+    subscriptions = "\n".join(
+        TICKET_SUBSCRIPTION_LINE.format(
+            emoji="🟢" if sub.expired_at > now else "🔴",
+            username=escape(sub.username),
+            expired_at=sub.expired_at.strftime('%d.%m.%Y')
+        )
+        for sub in sorted(user.purchased_subscriptions, key=lambda s: s.expired_at, reverse=True)
+    ) or TICKET_NO_SUBSCRIPTIONS
+
+    messages = "\n\n".join(
+        TICKET_MESSAGE_LINE.format(
+            author=TICKET_AUTHOR_STAFF if message.is_staff else TICKET_AUTHOR_USER,
+            created_at=message.created_at.strftime('%d.%m %H:%M'),
+            text=escape(message.text[:TICKET_VIEW_MESSAGE_LENGTH])
+        )
+        for message in ticket.messages[-TICKET_VIEW_MESSAGES:]
+    )
+
+    return TICKET_VIEW_TEXT.format(
+        ticket_id=ticket.id,
+        priority_mark=TICKET_PRIORITY_MARK if ticket.priority > 0 else "",
+        status=TICKET_STATUS_NAMES.get(ticket.status, ticket.status),
+        created_at=ticket.created_at.strftime('%d.%m.%Y %H:%M'),
+        username=f"@{escape(user.username)}" if user.username else "Не установлен",
+        telegram_id=user.telegram_id,
+        balance=float(user.current_balance or 0),
+        subscriptions=subscriptions,
+        messages=messages
+    )
+
+async def render_ticket(callback: CallbackQuery, session: AsyncSession, ticket_id: int) -> None:
+    ticket = await crud.get_ticket_view(session, ticket_id)
+
+    if not ticket:
+        await callback.answer(TICKET_NOT_FOUND_TEXT, show_alert=True)
+        return
+
+    await edit_message(
+        callback.message,
+        text=format_ticket(ticket),
+        reply_markup=get_ticket_kb(ticket.id, ticket.status == crud.TICKET_CLOSED),
+        parse_mode="HTML"
+    )
+
+async def claim_next_ticket(callback: CallbackQuery, session: AsyncSession) -> None:
+    """Взять в работу следующее обращение из очереди"""
+    try:
+        ticket_id = await crud.claim_next_ticket(session, callback.from_user.id)
+
+        if ticket_id is None:
+            await callback.answer(QUEUE_EMPTY_TEXT, show_alert=True)
+            return
+
+        await callback.answer()
+        await render_ticket(callback, session, ticket_id)
+    except Exception as e:
+        logger.error(f"Ошибка в claim_next_ticket: {str(e)}", exc_info=True)
+        await callback.answer("⚠️ Ошибка при получении обращения", show_alert=True)
+
+async def show_inbox(callback: CallbackQuery, session: AsyncSession) -> None:
+    """Список открытых обращений или обращений сотрудника"""
+    try:
+        _, _, inbox, page = callback.data.split(":")
+        page = max(int(page), 0)
+
+        if inbox == INBOX_MINE:
+            tickets = await crud.get_ticket_inbox(
+                session,
+                status=crud.TICKET_IN_PROGRESS,
+                assigned_to=callback.from_user.id,
+                limit=TICKETS_PER_PAGE + 1,
+                offset=page * TICKETS_PER_PAGE
+            )
+        else:
+            tickets = await crud.get_ticket_inbox(
+                session,
+                status=crud.TICKET_OPEN,
+                limit=TICKETS_PER_PAGE + 1,
+                offset=page * TICKETS_PER_PAGE
+            )
+
+        if not tickets and page == 0:
+            await callback.answer(INBOX_EMPTY_TEXT, show_alert=True)
+            return
+
+        await callback.answer()
+        title = INBOX_MINE_TEXT if inbox == INBOX_MINE else INBOX_OPEN_TEXT
+        await edit_message(
+            callback.message,
+            text=title.format(page=page + 1),
+            reply_markup=get_inbox_kb(
+                tickets[:TICKETS_PER_PAGE],
+                inbox,
+                page,
+                has_next=len(tickets) > TICKETS_PER_PAGE
+            )
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в show_inbox: {str(e)}", exc_info=True)
+        await callback.answer("⚠️ Ошибка загрузки обращений", show_alert=True)
+
+async def show_ticket(callback: CallbackQuery, session: AsyncSession) -> None:
+    """Карточка обращения"""
+    try:
+        ticket_id = int(callback.data.split(":")[2])
+        await callback.answer()
+        await render_ticket(callback, session, ticket_id)
+    except Exception as e:
+        logger.error(f"Ошибка в show_ticket: {str(e)}", exc_info=True)
+        await callback.answer("⚠️ Ошибка загрузки обращения", show_alert=True)
+
+async def start_reply(callback: CallbackQuery, state: FSMContext) -> None:
+    """Запрос текста ответа"""
+    try:
+        ticket_id = int(callback.data.split(":")[2])
+        await callback.answer()
+        await state.update_data(ticket_id=ticket_id)
+        await state.set_state(TicketReplyStates.waiting_for_reply)
+        await callback.message.answer(
+            TICKET_REPLY_REQUEST_TEXT.format(ticket_id=ticket_id),
+            reply_markup=get_cancel_reply_kb(ticket_id)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в start_reply: {str(e)}", exc_info=True)
+        await state.clear()
+
+async def process_reply(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    """Сохранение ответа сотрудника и отправка его пользователю"""
+    try:
+        if not message.text:
+            await message.answer(TICKET_REPLY_EMPTY_TEXT)
+            return
+
+        data = await state.get_data()
+        ticket_id = data.get("ticket_id")
+
+        ticket = await crud.get_ticket_by_id(session, ticket_id)
+        if not ticket or ticket.status == crud.TICKET_CLOSED:
+            await message.answer(TICKET_NOT_FOUND_TEXT)
+            await state.clear()
+            return
+
+        added = await crud.add_ticket_message(
+            session, ticket_id, message.from_user.id, message.text, is_staff=True
+        )
+        if not added:
+            await message.answer("⚠️ Ошибка при сохранении ответа")
+            return
+
+        await state.clear()
+        with outbound_priority(Priority.NOTIFICATION):
+            await message.bot.send_message(
+                ticket.telegram_id,
+                USER_REPLY_NOTIFICATION_TEXT.format(ticket_id=ticket_id, text=escape(message.text)),
+                parse_mode="HTML"
+            )
+        await message.answer(TICKET_REPLY_SENT_TEXT.format(ticket_id=ticket_id))
+    except Exception as e:
+        logger.error(f"Ошибка в process_reply: {str(e)}", exc_info=True)
+        await message.answer("⚠️ Ошибка при отправке ответа")
+        await state.clear()
+
+async def cancel_reply(callback: CallbackQuery, state: FSMContext) -> None:
+    """Отмена ответа"""
+    try:
+        await state.clear()
+        await callback.answer()
+        await edit_message(callback.message, text=TICKET_REPLY_CANCELLED_TEXT)
+    except Exception as e:
+        logger.error(f"Ошибка в cancel_reply: {str(e)}", exc_info=True)
+
+async def close_ticket(callback: CallbackQuery, session: AsyncSession) -> None:
+    """Закрытие обращения с уведомлением пользователя"""
+    try:
+        ticket_id = int(callback.data.split(":")[2])
+
+        closed = await crud.close_ticket(session, ticket_id, callback.from_user.id)
+        ticket = await crud.get_ticket_by_id(session, ticket_id) if closed else None
+
+        if not closed:
+            await callback.answer(TICKET_CLOSE_FAILED_TEXT, show_alert=True)
+            return
+
+        await callback.answer(TICKET_CLOSED_TEXT.format(ticket_id=ticket_id))
+        await render_ticket(callback, session, ticket_id)
+
+        if ticket:
+            with outbound_priority(Priority.NOTIFICATION):
+                await callback.bot.send_message(
+                    ticket.telegram_id,
+                    USER_CLOSED_NOTIFICATION_TEXT.format(ticket_id=ticket_id)
+                )
+    except Exception as e:
+        logger.error(f"Ошибка в close_ticket: {str(e)}", exc_info=True)
+        await callback.answer("⚠️ Ошибка при закрытии обращения", show_alert=True)
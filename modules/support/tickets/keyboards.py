@@ -0,0 +1,58 @@
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.types import InlineKeyboardMarkup
+from typing import List
+from modules.common.texts import SUPPORT_CALLBACK
+from core.database.model import SupportTicket
+from core.render_cache import cached_markup
+from .texts import (
+    REPLY_BUTTON, CLOSE_BUTTON, CANCEL_BUTTON, BACK_BUTTON,
+    PREV_PAGE_BUTTON, NEXT_PAGE_BUTTON, TICKET_PRIORITY_MARK,
+    INBOX_CALLBACK, TICKET_VIEW_CALLBACK, TICKET_REPLY_CALLBACK,
+    TICKET_CLOSE_CALLBACK, TICKET_CANCEL_REPLY_CALLBACK
+)
+
+def get_inbox_kb(tickets: List[SupportTicket], inbox: str, page: int, has_next: bool) -> InlineKeyboardMarkup:
+    """Список обращений с пагинацией"""
+    builder = InlineKeyboardBuilder()
+
+    for ticket in tickets:
+        mark = f" {TICKET_PRIORITY_MARK}" if ticket.priority > 0 else ""
+        builder.button(
+            text=f"#{ticket.id} · {ticket.created_at.strftime('%d.%m %H:%M')}{mark}",
+            callback_data=f"{TICKET_VIEW_CALLBACK}:{ticket.id}"
+        )
+
+    pagination = 0
+    if page > 0:
+        builder.button(text=PREV_PAGE_BUTTON, callback_data=f"{INBOX_CALLBACK}:{inbox}:{page - 1}")
+        pagination += 1
+    if has_next:
+        builder.button(text=NEXT_PAGE_BUTTON, callback_data=f"{INBOX_CALLBACK}:{inbox}:{page + 1}")
+        pagination += 1
+
+    builder.button(text=BACK_BUTTON, callback_data=SUPPORT_CALLBACK)
+
+    sizes = [1] * len(tickets)
+    if pagination:
+        sizes.append(pagination)
+    builder.adjust(*sizes, 1)
+    return builder.as_markup()
+
+@cached_markup()
+def get_ticket_kb(ticket_id: int, is_closed: bool) -> InlineKeyboardMarkup:
+    """Действия с обращением"""
+    builder = InlineKeyboardBuilder()
+
+    if not is_closed:
+        builder.button(text=REPLY_BUTTON, callback_data=f"{TICKET_REPLY_CALLBACK}:{ticket_id}")
+        builder.button(text=CLOSE_BUTTON, callback_data=f"{TICKET_CLOSE_CALLBACK}:{ticket_id}")
+    builder.button(text=BACK_BUTTON, callback_data=SUPPORT_CALLBACK)
+
+    builder.adjust(2, 1)
+    return builder.as_markup()
+
+@cached_markup()
+def get_cancel_reply_kb(ticket_id: int) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=CANCEL_BUTTON, callback_data=f"{TICKET_CANCEL_REPLY_CALLBACK}:{ticket_id}")
+    return builder.as_markup()
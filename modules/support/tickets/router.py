@@ -0,0 +1,58 @@
+from aiogram import Router, F
+from .handlers import (
+    claim_next_ticket,
+    show_inbox,
+    show_ticket,
+    start_reply,
+    process_reply,
+    cancel_reply,
+    close_ticket,
+    TicketReplyStates
+)
+from .texts import (
+    CLAIM_NEXT_CALLBACK,
+    INBOX_CALLBACK,
+    TICKET_VIEW_CALLBACK,
+    TICKET_REPLY_CALLBACK,
+    TICKET_CLOSE_CALLBACK,
+    TICKET_CANCEL_REPLY_CALLBACK
+)
+
+# Фильтр IsStaff задается родительским support_router
+tickets_router = Router()
+
+tickets_router.callback_query.register(
+    claim_next_ticket,
+    F.data == CLAIM_NEXT_CALLBACK
+)
+
+tickets_router.callback_query.register(
+    show_inbox,
+    F.data.startswith(f"{INBOX_CALLBACK}:")
+)
+
+tickets_router.callback_query.register(
+    show_ticket,
+    F.data.startswith(f"{TICKET_VIEW_CALLBACK}:")
+)
+
+tickets_router.callback_query.register(
+    start_reply,
+    F.data.startswith(f"{TICKET_REPLY_CALLBACK}:")
+)
+
+tickets_router.callback_query.register(
+    cancel_reply,
+    F.data.startswith(f"{TICKET_CANCEL_REPLY_CALLBACK}:")
+)
+
+tickets_router.callback_query.register(
+    close_ticket,
+    F.data.startswith(f"{TICKET_CLOSE_CALLBACK}:")
+)
+
+# Текст ответа сотрудника
+tickets_router.message.register(
+    process_reply,
+    TicketReplyStates.waiting_for_reply
+)
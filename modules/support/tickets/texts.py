@@ -0,0 +1,60 @@
+TICKET_VIEW_TEXT = (
+    "🎫 <b>Обращение #{ticket_id}</b> {priority_mark}\n"
+    "📌 Статус: {status}\n"
+    "🕒 Создано: {created_at}\n\n"
+    "👤 <b>Пользователь:</b> {username} (<code>{telegram_id}</code>)\n"
+    "💰 Баланс: {balance:.2f} ₽\n"
+    "💎 Подписки:\n{subscriptions}\n\n"
+    "💬 <b>Переписка:</b>\n{messages}"
+)
+TICKET_SUBSCRIPTION_LINE = "{emoji} {username} - до {expired_at}"
+TICKET_NO_SUBSCRIPTIONS = "—"
+TICKET_MESSAGE_LINE = "{author} <i>{created_at}</i>\n{text}"
+TICKET_AUTHOR_USER = "👤"
+TICKET_AUTHOR_STAFF = "🛎"
+TICKET_PRIORITY_MARK = "⭐"
+
+TICKET_STATUS_NAMES = {
+    "OPEN": "🟢 Открыто",
+    "IN_PROGRESS": "🟡 В работе",
+    "CLOSED": "⚪️ Закрыто",
+}
+
+INBOX_OPEN_TEXT = "📋 Открытые обращения (стр. {page}):"
+INBOX_MINE_TEXT = "🗂 Ваши обращения в работе (стр. {page}):"
+INBOX_EMPTY_TEXT = "📭 Обращений нет"
+QUEUE_EMPTY_TEXT = "📭 Очередь пуста"
+TICKET_NOT_FOUND_TEXT = "⚠️ Обращение не найдено"
+TICKET_REPLY_REQUEST_TEXT = "✍️ Введите ответ на обращение #{ticket_id}:"
+TICKET_REPLY_SENT_TEXT = "✅ Ответ по обращению #{ticket_id} отправлен"
+TICKET_REPLY_EMPTY_TEXT = "⚠️ Отправьте текстовое сообщение"
+TICKET_CLOSED_TEXT = "✅ Обращение #{ticket_id} закрыто"
+TICKET_CLOSE_FAILED_TEXT = "⚠️ Обращение уже закрыто или взято другим сотрудником"
+TICKET_REPLY_CANCELLED_TEXT = "❌ Ответ отменен"
+
+# Уведомления пользователю
+USER_REPLY_NOTIFICATION_TEXT = "🛎 <b>Ответ поддержки</b> по обращению #{ticket_id}:\n\n{text}"
+USER_CLOSED_NOTIFICATION_TEXT = "✅ Обращение #{ticket_id} закрыто. Если вопрос остался - напишите нам снова через «Помощь»."
+
+# Тексты кнопок
+REPLY_BUTTON = "✍️ Ответить"
+CLOSE_BUTTON = "✅ Закрыть"
+CANCEL_BUTTON = "❌ Отмена"
+BACK_BUTTON = "🔙 Назад"
+PREV_PAGE_BUTTON = "◀️"
+NEXT_PAGE_BUTTON = "▶️"
+
+# Callback data
+CLAIM_NEXT_CALLBACK = "support:claim"
+INBOX_CALLBACK = "support:inbox"
+INBOX_OPEN = "open"
+INBOX_MINE = "mine"
+TICKET_VIEW_CALLBACK = "ticket:view"
+TICKET_REPLY_CALLBACK = "ticket:reply"
+TICKET_CLOSE_CALLBACK = "ticket:close"
+TICKET_CANCEL_REPLY_CALLBACK = "ticket:cancel_reply"
+
+# Обращений на странице и сообщений в карточке
+TICKETS_PER_PAGE = 10
+TICKET_VIEW_MESSAGES = 10
+TICKET_VIEW_MESSAGE_LENGTH = 400
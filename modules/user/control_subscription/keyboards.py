@@ -1,6 +1,7 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from typing import List, Dict, Optional
+from core.render_cache import static_markup, cached_markup
 
 # Константы для кнопок
 BACK_BUTTON = "⬅️ Назад"
@@ -8,6 +9,7 @@ MANAGE_BUTTON = "⚙️ Управление"
 DEVICES_BUTTON = "📱 Устройства"
 RENEW_BUTTON = "🔄 Продлить"
 TRANSFER_BUTTON = "👤 Передать"
+TRAFFIC_BUTTON = "📊 Трафик за 30 дней"
 REMOVE_BUTTON = "🗑 Удалить"
 CANCEL_BUTTON = "❌ Отмена"
 PREV_PAGE_BUTTON = "◀️"
@@ -17,6 +19,7 @@ HELP_BUTTON = "❓ Помощь"
 # Количество устройств на странице
 DEVICES_PER_PAGE = 5
 
+@cached_markup(maxsize=16)
 def get_main_menu_kb(role: str = "USER") -> InlineKeyboardMarkup:
     """Главное меню с учетом роли пользователя"""
     builder = InlineKeyboardBuilder()
@@ -51,6 +54,7 @@ def get_subscriptions_list_kb(subscriptions: List[Dict]) -> InlineKeyboardMarkup
     builder.adjust(1, 2)
     return builder.as_markup()
 
+@cached_markup()
 def get_subscription_detail_kb(subscription_uuid: str, subscription_url: str) -> InlineKeyboardMarkup:
     """Детали подписки"""
     builder = InlineKeyboardBuilder()
@@ -62,6 +66,7 @@ def get_subscription_detail_kb(subscription_uuid: str, subscription_url: str) ->
     builder.adjust(1, 1, 1)
     return builder.as_markup()
 
+@cached_markup()
 def get_manage_subscription_kb(subscription_uuid: str) -> InlineKeyboardMarkup:
     """Меню управления подпиской"""
     builder = InlineKeyboardBuilder()
@@ -69,9 +74,10 @@ def get_manage_subscription_kb(subscription_uuid: str) -> InlineKeyboardMarkup:
     builder.button(text=RENEW_BUTTON, callback_data=f"renew_subscription:{subscription_uuid}")
     builder.button(text=DEVICES_BUTTON, callback_data=f"view_devices:{subscription_uuid}:0")
     builder.button(text=TRANSFER_BUTTON, callback_data=f"transfer_subscription:{subscription_uuid}")
+    builder.button(text=TRAFFIC_BUTTON, callback_data=f"traffic_stats:{subscription_uuid}")
     builder.button(text=BACK_BUTTON, callback_data=f"subscription_detail:{subscription_uuid}")
     
-    builder.adjust(1, 2, 1)
+    builder.adjust(1, 2, 1, 1)
     return builder.as_markup()
 
 def get_device_list_kb(
@@ -115,6 +121,7 @@ def get_device_list_kb(
     builder.adjust(1, *[1]*len(devices), len(pagination_row), 1)
     return builder.as_markup()
 
+@cached_markup()
 def get_device_details_kb(subscription_uuid: str, hwid: str) -> InlineKeyboardMarkup:
     """Детали устройства"""
     builder = InlineKeyboardBuilder()
@@ -131,6 +138,7 @@ def get_device_details_kb(subscription_uuid: str, hwid: str) -> InlineKeyboardMa
     builder.adjust(1, 1)
     return builder.as_markup()
 
+@cached_markup()
 def get_cancel_transfer_kb(subscription_uuid: str) -> InlineKeyboardMarkup:
     """Клавиатура отмены передачи"""
     builder = InlineKeyboardBuilder()
@@ -140,6 +148,7 @@ def get_cancel_transfer_kb(subscription_uuid: str) -> InlineKeyboardMarkup:
     )
     return builder.as_markup()
 
+@cached_markup()
 def get_back_to_devices_kb(subscription_uuid: str) -> InlineKeyboardMarkup:
     """Кнопка возврата к списку устройств"""
     builder = InlineKeyboardBuilder()
@@ -149,6 +158,7 @@ def get_back_to_devices_kb(subscription_uuid: str) -> InlineKeyboardMarkup:
     )
     return builder.as_markup()
 
+@cached_markup()
 def get_back_to_manage_kb(subscription_uuid: str) -> InlineKeyboardMarkup:
     """Кнопка возврата к управлению подпиской"""
     builder = InlineKeyboardBuilder()
@@ -158,6 +168,7 @@ def get_back_to_manage_kb(subscription_uuid: str) -> InlineKeyboardMarkup:
     )
     return builder.as_markup()
 
+@static_markup
 def get_no_subscriptions_kb() -> InlineKeyboardMarkup:
     """Клавиатура при отсутствии подписок"""
     builder = InlineKeyboardBuilder()
@@ -7,6 +7,7 @@ from .handlers import (
     view_devices,  
     show_device_details,  
     remove_device_callback,  
+    show_traffic_stats,  
     initiate_transfer_subscription,  
     process_transfer_contact,  
     cancel_transfer,  
@@ -43,10 +44,18 @@ router.callback_query.register(
 
 router.callback_query.register(  
     remove_device_callback,  
+    show_traffic_stats,  
     F.data.startswith("remove_device:"),  
     IsNotBanned  
 )  
 
+# Статистика трафика  
+router.callback_query.register(  
+    show_traffic_stats,  
+    F.data.startswith("traffic_stats:"),  
+    IsNotBanned  
+)  
+
 # Обработчики передачи подписки  
 router.callback_query.register(  
     initiate_transfer_subscription,  
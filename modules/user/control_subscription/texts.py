@@ -28,6 +28,14 @@ DEVICE_DETAILS_TEXT = (
 )
 LAST_DEVICE_TEXT = "⚠️ Нельзя удалить последнее устройство"
 DEVICE_REMOVED_TEXT = "✅ Устройство {hwid} удалено"
+
+# Статистика трафика
+TRAFFIC_STATS_TEXT = (
+    "📊 Трафик подписки <b>{username}</b> за {days} дней\n"
+    "Всего: {total}\n\n"
+    "<code>{chart}</code>"
+)
+NO_TRAFFIC_TEXT = "📊 Данных о трафике пока нет - статистика собирается каждые несколько минут"
 DEVICE_REMOVAL_LIMIT_TEXT = "⚠️ Достигнут лимит удаления устройств (4 в месяц). Попробуйте снова через {days_left} дней"
 
 # Тексты для передачи подписки
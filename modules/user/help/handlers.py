@@ -0,0 +1,88 @@
+from aiogram.types import CallbackQuery, Message
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import crud
+from core.messaging import edit_message
+from .keyboards import get_help_kb, get_cancel_ticket_kb
+from .texts import (
+    HELP_TEXT,
+    TICKET_REQUEST_TEXT,
+    TICKET_CREATED_TEXT,
+    TICKET_MESSAGE_ADDED_TEXT,
+    TICKET_EMPTY_TEXT,
+    TICKET_CANCELLED_TEXT,
+    TICKET_ERROR_TEXT,
+    TICKET_MESSAGE_MAX_LENGTH
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SupportTicketStates(StatesGroup):
+    waiting_for_message = State()
+
+async def show_help(callback: CallbackQuery) -> None:
+    """Раздел помощи"""
+    try:
+        await callback.answer()
+        await edit_message(
+            callback.message,
+            text=HELP_TEXT,
+            reply_markup=get_help_kb(),
+            parse_mode="HTML"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в show_help: {str(e)}", exc_info=True)
+        await callback.answer("⚠️ Ошибка загрузки раздела", show_alert=True)
+
+async def start_ticket(callback: CallbackQuery, state: FSMContext) -> None:
+    """Запрос текста обращения"""
+    try:
+        await callback.answer()
+        await state.set_state(SupportTicketStates.waiting_for_message)
+        await callback.message.answer(TICKET_REQUEST_TEXT, reply_markup=get_cancel_ticket_kb())
+    except Exception as e:
+        logger.error(f"Ошибка в start_ticket: {str(e)}", exc_info=True)
+        await state.clear()
+
+async def process_ticket_message(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    """Создание обращения или добавление сообщения в уже открытое"""
+    try:
+        if not message.text:
+            await message.answer(TICKET_EMPTY_TEXT)
+            return
+
+        text = message.text[:TICKET_MESSAGE_MAX_LENGTH]
+        ticket = await crud.get_user_active_ticket(session, message.from_user.id)
+        if not ticket:
+            ticket = await crud.create_ticket(session, message.from_user.id, text)
+            if ticket:
+                await message.answer(TICKET_CREATED_TEXT.format(ticket_id=ticket.id))
+                await state.clear()
+                return
+            # Обращение могла открыть параллельная отправка - дописываем в него
+            ticket = await crud.get_user_active_ticket(session, message.from_user.id)
+            if not ticket:
+                await message.answer(TICKET_ERROR_TEXT)
+                return
+
+        added = await crud.add_ticket_message(session, ticket.id, message.from_user.id, text)
+        if not added:
+            await message.answer(TICKET_ERROR_TEXT)
+            return
+        await message.answer(TICKET_MESSAGE_ADDED_TEXT.format(ticket_id=ticket.id))
+        await state.clear()
+    except Exception as e:
+        logger.error(f"Ошибка в process_ticket_message: {str(e)}", exc_info=True)
+        await message.answer(TICKET_ERROR_TEXT)
+        await state.clear()
+
+async def cancel_ticket(callback: CallbackQuery, state: FSMContext) -> None:
+    """Отмена обращения"""
+    try:
+        await state.clear()
+        await callback.answer()
+        await edit_message(callback.message, text=TICKET_CANCELLED_TEXT)
+    except Exception as e:
+        logger.error(f"Ошибка в cancel_ticket: {str(e)}", exc_info=True)
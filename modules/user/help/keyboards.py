@@ -0,0 +1,21 @@
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from modules.common.texts import MAIN_MENU_CALLBACK
+from core.render_cache import static_markup
+from .texts import (
+    WRITE_SUPPORT_BUTTON, CANCEL_BUTTON, BACK_BUTTON,
+    HELP_TICKET_CALLBACK, HELP_CANCEL_CALLBACK
+)
+
+@static_markup
+def get_help_kb() -> InlineKeyboardBuilder:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=WRITE_SUPPORT_BUTTON, callback_data=HELP_TICKET_CALLBACK)
+    builder.button(text=BACK_BUTTON, callback_data=MAIN_MENU_CALLBACK)
+    builder.adjust(1)
+    return builder.as_markup()
+
+@static_markup
+def get_cancel_ticket_kb() -> InlineKeyboardBuilder:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=CANCEL_BUTTON, callback_data=HELP_CANCEL_CALLBACK)
+    return builder.as_markup()
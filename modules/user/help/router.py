@@ -0,0 +1,38 @@
+from aiogram import Router, F
+from core.filters import IsNotBanned
+from modules.common.texts import HELP_CALLBACK
+from .handlers import (
+    show_help,
+    start_ticket,
+    process_ticket_message,
+    cancel_ticket,
+    SupportTicketStates
+)
+from .texts import HELP_TICKET_CALLBACK, HELP_CANCEL_CALLBACK
+
+help_router = Router()
+
+help_router.callback_query.register(
+    show_help,
+    F.data == HELP_CALLBACK,
+    IsNotBanned
+)
+
+help_router.callback_query.register(
+    start_ticket,
+    F.data == HELP_TICKET_CALLBACK,
+    IsNotBanned
+)
+
+help_router.callback_query.register(
+    cancel_ticket,
+    F.data == HELP_CANCEL_CALLBACK,
+    IsNotBanned
+)
+
+# Текст обращения
+help_router.message.register(
+    process_ticket_message,
+    SupportTicketStates.waiting_for_message,
+    IsNotBanned
+)
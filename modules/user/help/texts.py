@@ -0,0 +1,24 @@
+HELP_TEXT = (
+    "❓ <b>Помощь</b>\n\n"
+    "Если у вас возник вопрос или проблема с подпиской, напишите в поддержку - "
+    "сотрудник ответит в этом чате."
+)
+
+TICKET_REQUEST_TEXT = "✍️ Опишите вопрос одним сообщением:"
+TICKET_CREATED_TEXT = "✅ Обращение #{ticket_id} создано. Мы ответим в ближайшее время."
+TICKET_MESSAGE_ADDED_TEXT = "✅ Сообщение добавлено в обращение #{ticket_id}"
+TICKET_EMPTY_TEXT = "⚠️ Отправьте текстовое сообщение"
+TICKET_CANCELLED_TEXT = "❌ Обращение не отправлено"
+TICKET_ERROR_TEXT = "⚠️ Не удалось отправить обращение, попробуйте позже"
+
+# Тексты кнопок
+WRITE_SUPPORT_BUTTON = "✉️ Написать в поддержку"
+CANCEL_BUTTON = "❌ Отмена"
+BACK_BUTTON = "🔙 Назад"
+
+# Callback data
+HELP_TICKET_CALLBACK = "help:ticket"
+HELP_CANCEL_CALLBACK = "help:cancel"
+
+# Максимальная длина сообщения в обращении
+TICKET_MESSAGE_MAX_LENGTH = 2000
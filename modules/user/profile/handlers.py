@@ -1,46 +1,98 @@
 from aiogram import F
-from aiogram.types import CallbackQuery
-from aiogram.exceptions import TelegramBadRequest
-from core.database.crud import get_user_full_data
-from .texts import PROFILE_TEXT
-from .keyboards import get_profile_kb
-from core.database.database import async_session
+from aiogram.types import CallbackQuery, Message
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database.crud import get_profile_summary, RedeemResult
+from core import promocodes
+from .texts import (
+    PROFILE_TEXT,
+    NO_EXPIRY_TEXT,
+    PROMOCODE_REQUEST_TEXT,
+    PROMOCODE_CANCELLED_TEXT,
+    PROMOCODE_SUCCESS_TEXT,
+    PROMOCODE_RESULT_TEXTS,
+    PROMOCODE_MAX_LENGTH
+)
+from .keyboards import get_profile_kb, get_cancel_promocode_kb, get_back_to_profile_kb
 import logging
 from datetime import datetime
 from core.database.model import User
+from core.messaging import edit_message
 
 logger = logging.getLogger(__name__)
 
-async def show_profile(callback: CallbackQuery):
+class PromocodeStates(StatesGroup):
+    waiting_for_code = State()
+
+async def show_profile(callback: CallbackQuery, session: AsyncSession, user: User):
     """Обработчик показа профиля пользователя с данными только из локальной БД"""
     try:
         await callback.answer()
 
-        async with async_session() as session:
-            # Получаем данные пользователя из локальной БД
-            user_data = await get_user_full_data(session, callback.from_user.id)
-            
-            if not user_data or not isinstance(user_data.get("user"), User):
-                return await callback.answer("❌ Ошибка загрузки профиля", show_alert=True)
-            
-            user = user_data["user"]
-            
-            # Формируем текст профиля
-            profile_text = PROFILE_TEXT.format(
-                username=f"@{user.username}" if user.username else "Не установлен",
-                balance=float(user.balance) if user.balance else 0.0,
-                subscriptions_count=user_data.get("subscriptions_count", 0)
-            )
-            
-            try:
-                await callback.message.edit_text(
-                    text=profile_text,
-                    reply_markup=get_profile_kb()
-                )
-            except TelegramBadRequest:
-                # Если сообщение не изменилось, игнорируем
-                pass
-                
+        # Пользователь уже загружен RoleMiddleware, остальное - одной агрегирующей строкой
+        summary = await get_profile_summary(session, callback.from_user.id)
+
+        if not summary or not isinstance(user, User):
+            return await callback.answer("❌ Ошибка загрузки профиля", show_alert=True)
+
+        # Формируем текст профиля
+        next_expiry = summary["next_expiry"]
+        profile_text = PROFILE_TEXT.format(
+            username=f"@{user.username}" if user.username else "Не установлен",
+            balance=float(summary["balance"]),
+            subscriptions_count=summary["active_count"],
+            next_expiry=next_expiry.strftime('%d.%m.%Y') if next_expiry else NO_EXPIRY_TEXT,
+            total_spent=float(summary["total_spent"])
+        )
+
+        # Если профиль не изменился, edit_message не отправляет запрос
+        await edit_message(
+            callback.message,
+            text=profile_text,
+            reply_markup=get_profile_kb()
+        )
+
     except Exception as e:
         logger.error(f"Ошибка в show_profile: {str(e)}", exc_info=True)
         await callback.answer("⚠️ Произошла ошибка при загрузке профиля", show_alert=True)
+
+async def start_promocode(callback: CallbackQuery, state: FSMContext):
+    """Запрос промокода"""
+    try:
+        await callback.answer()
+        await state.set_state(PromocodeStates.waiting_for_code)
+        await callback.message.answer(PROMOCODE_REQUEST_TEXT, reply_markup=get_cancel_promocode_kb())
+    except Exception as e:
+        logger.error(f"Ошибка в start_promocode: {str(e)}", exc_info=True)
+        await state.clear()
+
+async def process_promocode(message: Message, state: FSMContext, session: AsyncSession):
+    """Применение введенного промокода"""
+    try:
+        code = (message.text or "").strip()
+        if not code or len(code) > PROMOCODE_MAX_LENGTH:
+            await message.answer(PROMOCODE_RESULT_TEXTS[RedeemResult.NOT_FOUND.value])
+            return
+
+        result, used_promo, promo = await promocodes.redeem(session, message.from_user.id, code)
+        if result == RedeemResult.SUCCESS:
+            text = PROMOCODE_SUCCESS_TEXT.format(code=promo.code, amount=float(promo.discount_value))
+        else:
+            text = PROMOCODE_RESULT_TEXTS[result.value]
+
+        await state.clear()
+        await message.answer(text, reply_markup=get_back_to_profile_kb())
+    except Exception as e:
+        logger.error(f"Ошибка в process_promocode: {str(e)}", exc_info=True)
+        await message.answer(PROMOCODE_RESULT_TEXTS[RedeemResult.ERROR.value])
+        await state.clear()
+
+async def cancel_promocode(callback: CallbackQuery, state: FSMContext):
+    """Отмена ввода промокода"""
+    try:
+        await state.clear()
+        await callback.answer()
+        await edit_message(callback.message, text=PROMOCODE_CANCELLED_TEXT, reply_markup=get_back_to_profile_kb())
+    except Exception as e:
+        logger.error(f"Ошибка в cancel_promocode: {str(e)}", exc_info=True)
@@ -1,9 +1,26 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
-from .texts import BACK_BUTTON
-from modules.common.texts import MAIN_MENU_CALLBACK
+from .texts import BACK_BUTTON, PROMOCODE_BUTTON, CANCEL_BUTTON
+from modules.common.texts import MAIN_MENU_CALLBACK, PROFILE_CALLBACK
+from modules.common.callbacks import ProfileActions
+from core.render_cache import static_markup
 
+@static_markup
 def get_profile_kb() -> InlineKeyboardBuilder:
     builder = InlineKeyboardBuilder()
+    builder.button(text=PROMOCODE_BUTTON, callback_data=ProfileActions(action="promocode"))
     builder.button(text=BACK_BUTTON, callback_data=MAIN_MENU_CALLBACK)
+    builder.adjust(1)
+    return builder.as_markup()
+
+@static_markup
+def get_cancel_promocode_kb() -> InlineKeyboardBuilder:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=CANCEL_BUTTON, callback_data=ProfileActions(action="cancel_promocode"))
+    return builder.as_markup()
+
+@static_markup
+def get_back_to_profile_kb() -> InlineKeyboardBuilder:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=BACK_BUTTON, callback_data=PROFILE_CALLBACK)
     return builder.as_markup()
@@ -1,6 +1,13 @@
 from aiogram import Router, F
-from .handlers import show_profile
+from .handlers import (
+    show_profile,
+    start_promocode,
+    process_promocode,
+    cancel_promocode,
+    PromocodeStates
+)
 from modules.common.texts import PROFILE_CALLBACK
+from modules.common.callbacks import ProfileActions
 
 profile_router = Router()
 
@@ -8,3 +15,19 @@ profile_router.callback_query.register(
     show_profile,
     F.data.startswith(PROFILE_CALLBACK)
 )
+
+profile_router.callback_query.register(
+    start_promocode,
+    ProfileActions.filter(F.action == "promocode")
+)
+
+profile_router.callback_query.register(
+    cancel_promocode,
+    ProfileActions.filter(F.action == "cancel_promocode")
+)
+
+# Ввод промокода
+profile_router.message.register(
+    process_promocode,
+    PromocodeStates.waiting_for_code
+)
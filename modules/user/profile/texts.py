@@ -4,6 +4,25 @@ PROFILE_TEXT = """
 ▫️ *Никнейм:* {username}
 ▫️ *Баланс:* {balance} ₽
 ▫️ *Активных подписок:* {subscriptions_count}
+▫️ *Ближайшее окончание:* {next_expiry}
+▫️ *Потрачено всего:* {total_spent} ₽
 """
 
+NO_EXPIRY_TEXT = "—"
+
 BACK_BUTTON = "🔙 Назад"
+PROMOCODE_BUTTON = "🎟 Ввести промокод"
+CANCEL_BUTTON = "❌ Отмена"
+
+PROMOCODE_REQUEST_TEXT = "🎟 Введите промокод:"
+PROMOCODE_CANCELLED_TEXT = "❌ Ввод промокода отменен"
+PROMOCODE_SUCCESS_TEXT = "✅ Промокод {code} активирован! На баланс зачислено {amount:.2f} ₽"
+PROMOCODE_RESULT_TEXTS = {
+    "not_found": "⚠️ Промокод не найден или срок его действия истек",
+    "exhausted": "⚠️ Активации промокода закончились",
+    "limit_reached": "⚠️ Вы уже использовали этот промокод максимальное количество раз",
+    "error": "⚠️ Не удалось применить промокод, попробуйте позже",
+}
+
+# Максимальная длина промокода (Promocode.code)
+PROMOCODE_MAX_LENGTH = 50
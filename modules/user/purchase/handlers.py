@@ -0,0 +1,100 @@
+from aiogram.types import CallbackQuery
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import crud
+from core.messaging import edit_message
+from core.provisioning import plan_cache, provisioner
+from .keyboards import get_plans_kb, get_confirm_plan_kb
+from .texts import (
+    PLANS_TEXT,
+    NO_PLANS_TEXT,
+    CONFIRM_PURCHASE_TEXT,
+    PLAN_NOT_FOUND_TEXT,
+    INSUFFICIENT_FUNDS_TEXT,
+    PURCHASE_PROVISIONING_TEXT,
+    PURCHASE_ERROR_TEXT,
+    BUY_PLAN_CALLBACK,
+    CONFIRM_PLAN_CALLBACK
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def show_plans(callback: CallbackQuery, session: AsyncSession) -> None:
+    """Список тарифов (из кеша)"""
+    try:
+        plans = await plan_cache.get_all(session)
+        if not plans:
+            await callback.answer(NO_PLANS_TEXT, show_alert=True)
+            return
+        balance = await crud.get_balance(session, callback.from_user.id)
+
+        await callback.answer()
+        await edit_message(
+            callback.message,
+            text=PLANS_TEXT.format(balance=float(balance)),
+            reply_markup=get_plans_kb(plans),
+            parse_mode="HTML"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в show_plans: {str(e)}", exc_info=True)
+        await callback.answer("⚠️ Ошибка загрузки тарифов", show_alert=True)
+
+async def show_plan(callback: CallbackQuery, session: AsyncSession) -> None:
+    """Подтверждение покупки тарифа"""
+    try:
+        plan_id = int(callback.data[len(BUY_PLAN_CALLBACK):])
+        plan = await plan_cache.get(session, plan_id)
+        if not plan:
+            await callback.answer(PLAN_NOT_FOUND_TEXT, show_alert=True)
+            return
+        balance = await crud.get_balance(session, callback.from_user.id)
+
+        await callback.answer()
+        await edit_message(
+            callback.message,
+            text=CONFIRM_PURCHASE_TEXT.format(
+                name=plan.name,
+                end_date=plan.end_date.strftime('%d.%m.%Y'),
+                price=float(plan.price),
+                balance=float(balance)
+            ),
+            reply_markup=get_confirm_plan_kb(plan.id),
+            parse_mode="HTML"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в show_plan: {str(e)}", exc_info=True)
+        await callback.answer("⚠️ Ошибка загрузки тарифа", show_alert=True)
+
+async def confirm_plan(callback: CallbackQuery, session: AsyncSession) -> None:
+    """
+    Оплата: списание и заказ в одной транзакции, создание подписки в панели -
+    в фоне (core/provisioning.py). Сообщение обновится, когда подписка будет готова
+    """
+    try:
+        plan_id = int(callback.data[len(CONFIRM_PLAN_CALLBACK):])
+        plan = await plan_cache.get(session, plan_id)
+        if not plan:
+            await callback.answer(PLAN_NOT_FOUND_TEXT, show_alert=True)
+            return
+
+        order = await crud.create_paid_order(
+            session,
+            callback.from_user.id,
+            plan,
+            chat_id=callback.message.chat.id,
+            message_id=callback.message.message_id
+        )
+        if order is None:
+            balance = await crud.get_balance(session, callback.from_user.id)
+            await callback.answer(
+                INSUFFICIENT_FUNDS_TEXT.format(price=float(plan.price), balance=float(balance)),
+                show_alert=True
+            )
+            return
+
+        await callback.answer()
+        await edit_message(callback.message, text=PURCHASE_PROVISIONING_TEXT)
+        provisioner.enqueue(order.id)
+    except Exception as e:
+        logger.error(f"Ошибка в confirm_plan: {str(e)}", exc_info=True)
+        await callback.answer(PURCHASE_ERROR_TEXT, show_alert=True)
@@ -0,0 +1,42 @@
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.types import InlineKeyboardMarkup
+from typing import List, Optional
+from core.database.model import SubscriptionPlan
+from core.render_cache import cached_markup
+from modules.user.subscription.texts import SUBSCRIPTIONS_CALLBACK, BUY_SUBSCRIPTION_CALLBACK
+from .texts import (
+    PLAN_BUTTON_TEXT, CONFIRM_BUTTON, BACK_BUTTON,
+    SUBSCRIPTION_LINK_BUTTON, MY_SUBSCRIPTIONS_BUTTON,
+    BUY_PLAN_CALLBACK, CONFIRM_PLAN_CALLBACK
+)
+
+def get_plans_kb(plans: List[SubscriptionPlan]) -> InlineKeyboardMarkup:
+    """Список тарифов"""
+    builder = InlineKeyboardBuilder()
+
+    for plan in plans:
+        builder.button(
+            text=PLAN_BUTTON_TEXT.format(name=plan.name, price=float(plan.price)),
+            callback_data=f"{BUY_PLAN_CALLBACK}{plan.id}"
+        )
+    builder.button(text=BACK_BUTTON, callback_data=SUBSCRIPTIONS_CALLBACK)
+
+    builder.adjust(1)
+    return builder.as_markup()
+
+@cached_markup(maxsize=64)
+def get_confirm_plan_kb(plan_id: int) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=CONFIRM_BUTTON, callback_data=f"{CONFIRM_PLAN_CALLBACK}{plan_id}")
+    builder.button(text=BACK_BUTTON, callback_data=BUY_SUBSCRIPTION_CALLBACK)
+    builder.adjust(1)
+    return builder.as_markup()
+
+@cached_markup()
+def get_purchase_result_kb(subscription_url: Optional[str]) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    if subscription_url:
+        builder.button(text=SUBSCRIPTION_LINK_BUTTON, url=subscription_url)
+    builder.button(text=MY_SUBSCRIPTIONS_BUTTON, callback_data=SUBSCRIPTIONS_CALLBACK)
+    builder.adjust(1)
+    return builder.as_markup()
@@ -0,0 +1,25 @@
+from aiogram import Router, F
+from core.filters import IsNotBanned
+from modules.user.subscription.texts import BUY_SUBSCRIPTION_CALLBACK
+from .handlers import show_plans, show_plan, confirm_plan
+from .texts import BUY_PLAN_CALLBACK, CONFIRM_PLAN_CALLBACK
+
+purchase_router = Router()
+
+purchase_router.callback_query.register(
+    show_plans,
+    F.data == BUY_SUBSCRIPTION_CALLBACK,
+    IsNotBanned
+)
+
+purchase_router.callback_query.register(
+    show_plan,
+    F.data.startswith(BUY_PLAN_CALLBACK),
+    IsNotBanned
+)
+
+purchase_router.callback_query.register(
+    confirm_plan,
+    F.data.startswith(CONFIRM_PLAN_CALLBACK),
+    IsNotBanned
+)
@@ -0,0 +1,30 @@
+PLANS_TEXT = "🛒 <b>Выберите тариф</b>\n\n💰 Ваш баланс: {balance:.2f} ₽"
+NO_PLANS_TEXT = "😔 Сейчас нет доступных тарифов"
+PLAN_BUTTON_TEXT = "{name} - {price:.2f} ₽"
+CONFIRM_PURCHASE_TEXT = (
+    "🧾 <b>{name}</b>\n\n"
+    "⏳ Действует до: {end_date}\n"
+    "💰 Стоимость: {price:.2f} ₽\n"
+    "💳 Ваш баланс: {balance:.2f} ₽\n\n"
+    "Подтвердите покупку:"
+)
+PLAN_NOT_FOUND_TEXT = "⚠️ Тариф недоступен"
+INSUFFICIENT_FUNDS_TEXT = "⚠️ Недостаточно средств. Стоимость: {price:.2f} ₽, баланс: {balance:.2f} ₽"
+PURCHASE_PROVISIONING_TEXT = "⏳ Оплата принята, подписка создается…\nСообщение обновится автоматически."
+PURCHASE_SUCCESS_TEXT = (
+    "✅ <b>Подписка {username} готова!</b>\n\n"
+    "⏳ Действует до: {expire}\n"
+    "Ссылка для подключения - по кнопке ниже."
+)
+PURCHASE_FAILED_TEXT = "⚠️ Не удалось создать подписку. {amount:.2f} ₽ возвращены на баланс, попробуйте позже."
+PURCHASE_ERROR_TEXT = "⚠️ Ошибка при оформлении заказа"
+
+# Тексты кнопок
+CONFIRM_BUTTON = "✅ Оплатить"
+BACK_BUTTON = "🔙 Назад"
+SUBSCRIPTION_LINK_BUTTON = "🔗 Ссылка подключения"
+MY_SUBSCRIPTIONS_BUTTON = "📋 Мои подписки"
+
+# Callback data
+BUY_PLAN_CALLBACK = "buy_plan:"
+CONFIRM_PLAN_CALLBACK = "confirm_plan:"
@@ -1,12 +1,14 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
+from core.render_cache import static_markup, cached_markup
 from .texts import (
     BUY_SUBSCRIPTION_TEXT, BUY_ANOTHER_TEXT, 
     BACK_TO_LIST_TEXT, REFRESH_TEXT,
     SUBSCRIPTION_DETAIL_CALLBACK, BUY_SUBSCRIPTION_CALLBACK,
     SUBSCRIPTIONS_CALLBACK, SUBSCRIPTION_LINK_TEXT,
     MANAGE_SUBSCRIPTION_TEXT, MANAGE_SUBSCRIPTION_CALLBACK,
-    MAIN_MENU_TEXT, MAIN_MENU_CALLBACK
+    MAIN_MENU_TEXT, MAIN_MENU_CALLBACK,
+    SUBSCRIPTION_HISTORY_BUTTON_TEXT, SUBSCRIPTION_HISTORY_CALLBACK
 )
 
 def get_subscriptions_list_kb(subscriptions: list) -> InlineKeyboardBuilder:
@@ -21,6 +23,12 @@ def get_subscriptions_list_kb(subscriptions: list) -> InlineKeyboardBuilder:
         )
     
     builder.adjust(1)
+    builder.row(
+        InlineKeyboardButton(
+            text=SUBSCRIPTION_HISTORY_BUTTON_TEXT,
+            callback_data=SUBSCRIPTION_HISTORY_CALLBACK
+        )
+    )
     builder.row(
         InlineKeyboardButton(
             text=BUY_ANOTHER_TEXT,
@@ -34,9 +42,15 @@ def get_subscriptions_list_kb(subscriptions: list) -> InlineKeyboardBuilder:
     
     return builder.as_markup()
 
-# Остальные функции без изменений
+@static_markup
 def get_no_subscriptions_kb() -> InlineKeyboardBuilder:
     builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(
+            text=SUBSCRIPTION_HISTORY_BUTTON_TEXT,
+            callback_data=SUBSCRIPTION_HISTORY_CALLBACK
+        )
+    )
     builder.row(
         InlineKeyboardButton(
             text=BUY_SUBSCRIPTION_TEXT,
@@ -49,6 +63,22 @@ def get_no_subscriptions_kb() -> InlineKeyboardBuilder:
     )
     return builder.as_markup()
 
+@static_markup
+def get_subscription_history_kb() -> InlineKeyboardBuilder:
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(
+            text=BACK_TO_LIST_TEXT,
+            callback_data=SUBSCRIPTIONS_CALLBACK
+        ),
+        InlineKeyboardButton(
+            text=MAIN_MENU_TEXT,
+            callback_data=MAIN_MENU_CALLBACK
+        )
+    )
+    return builder.as_markup()
+
+@cached_markup()
 def get_subscription_detail_kb(subscription_uuid: str, subscription_url: str) -> InlineKeyboardBuilder:
     builder = InlineKeyboardBuilder()
     builder.row(
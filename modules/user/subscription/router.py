@@ -1,6 +1,6 @@
 from aiogram import Router, F
-from .handlers import show_subscriptions, show_subscription_detail
-from .texts import SUBSCRIPTIONS_CALLBACK, SUBSCRIPTION_DETAIL_CALLBACK
+from .handlers import show_subscriptions, show_subscription_detail, show_subscription_history
+from .texts import SUBSCRIPTIONS_CALLBACK, SUBSCRIPTION_DETAIL_CALLBACK, SUBSCRIPTION_HISTORY_CALLBACK
 
 # Создаем роутер модуля подписок
 subscriptions_router = Router()
@@ -15,3 +15,8 @@ subscriptions_router.callback_query.register(
     show_subscription_detail,
     F.data.startswith(SUBSCRIPTION_DETAIL_CALLBACK)
 )
+
+subscriptions_router.callback_query.register(
+    show_subscription_history,
+    F.data == SUBSCRIPTION_HISTORY_CALLBACK
+)
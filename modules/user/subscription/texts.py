@@ -18,6 +18,11 @@ SUBSCRIPTION_DETAIL_TEMPLATE = (
 
 SUBSCRIPTION_ERROR_TEXT = "⚠️ Ошибка при получении данных подписки:\n{error}"
 
+# История (архив давно истекших подписок)
+SUBSCRIPTION_HISTORY_TEXT = "🗂 Завершившиеся подписки:\n\n{items}"
+SUBSCRIPTION_HISTORY_ITEM = "• {username} — до {expired_at:%d.%m.%Y}, {purchase_price:.2f} ₽"
+NO_SUBSCRIPTION_HISTORY_TEXT = "🗂 История подписок пуста."
+
 # Тексты кнопок
 BUY_SUBSCRIPTION_TEXT = "🛒 Купить"
 BUY_ANOTHER_TEXT = "🛒 Купить"
@@ -26,10 +31,12 @@ REFRESH_TEXT = "🔄 Обновить"
 MANAGE_SUBSCRIPTION_TEXT = "⚙️ Управление подпиской"
 SUBSCRIPTION_LINK_TEXT = "🔗 Ссылка для подключения"
 MAIN_MENU_TEXT = "🏠 Меню"
+SUBSCRIPTION_HISTORY_BUTTON_TEXT = "🗂 История"
 
 # Callback data
 SUBSCRIPTIONS_CALLBACK = "subscriptions"
 SUBSCRIPTION_DETAIL_CALLBACK = "subscription_detail:"
 BUY_SUBSCRIPTION_CALLBACK = "buy_subscription"
 MANAGE_SUBSCRIPTION_CALLBACK = "manage_subscription:"
+SUBSCRIPTION_HISTORY_CALLBACK = "subscriptions:history"
 MAIN_MENU_CALLBACK = "menu:main"
\ No newline at end of file